@@ -4,15 +4,37 @@ Step 1: Scrape Google Maps via Outscraper API
 Searches for roundnet/spikeball clubs across Europe.
 """
 
+import argparse
+import copy
+import gzip
+import hashlib
 import json
+import math
 import os
+import random
+import socket
+import threading
 import time
 import urllib.request
 import urllib.parse
 import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterable, Optional
+
+from pipeline_io import input_exists, load_records, stage_path, write_records
+from raw_archive import archive_snapshot, project_record
+from scrape_metrics import METRICS
 
 API_KEY = os.environ.get("OUTSCRAPER_API_KEY", "")
-BASE_URL = "https://api.app.outscraper.com/maps/search-v3"
+# Override to point at a local stand-in server when testing
+API_URL = os.environ.get("OUTSCRAPER_API_URL", "https://api.app.outscraper.com").rstrip("/")
+BASE_URL = f"{API_URL}/maps/search-v3"
+REQUESTS_URL = f"{API_URL}/requests"
+
+# Rate limit — ~1 req/sec to stay within free tier. Raise with --rps on paid plans.
+DEFAULT_RPS = float(os.environ.get("OUTSCRAPER_RPS", 1 / 1.5))
+# Requests allowed in flight at once. 1 = serial (the old behaviour).
+DEFAULT_MAX_IN_FLIGHT = int(os.environ.get("OUTSCRAPER_MAX_IN_FLIGHT", 1))
 
 # Search queries — localized per region
 SEARCHES = [
@@ -43,74 +65,1071 @@ SEARCHES = [
 ]
 
 OUTPUT_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-results.json")
+# In-flight async job IDs, so a restart re-polls instead of re-submitting
+JOBS_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-jobs.json")
+# Per-search bookkeeping (last success, failures, place IDs) for incremental runs
+STATE_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-state.json")
+# Added/changed/removed places from the last incremental run
+DELTA_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-delta.json")
+DEFAULT_STALE_HOURS = float(os.environ.get("OUTSCRAPER_STALE_HOURS", 7 * 24))
+# Fields that make an upserted place count as changed in the delta. The query
+# tag, review count and photo sample vary between runs on their own.
+DELTA_FIELDS = (
+    "name", "full_address", "address", "street", "postal_code", "city", "country", "country_code",
+    "latitude", "longitude", "site", "website", "email", "phone",
+    "description", "category", "type", "subtypes", "business_status", "rating", "working_hours",
+)
 
+# Query planner: prune searches whose recent runs found (almost) nothing unique
+YIELD_HISTORY = 10  # yield entries kept per search
+PLAN_WINDOW = 5     # most recent runs the planner averages over
+PLAN_MIN_RUNS = 2   # searches with less history are never pruned
+DEFAULT_MIN_YIELD = 0.5
 
-def search_outscraper(query: str, region: str, limit: int = 50) -> list:
-    """Call Outscraper Google Maps Search API."""
-    full_query = f"{query}, {region}"
-    params = urllib.parse.urlencode({
-        "query": full_query,
-        "limit": limit,
-        "async": "false",
-    })
-    url = f"{BASE_URL}?{params}"
+# Tiling search (--tiles): config searches anchored to country bounding boxes
+CONFIG_FILE = os.path.join(os.path.dirname(__file__), "01-outscraper-config.json")
+TILE_MAX_DEPTH = 5
+TILE_SKIP_AFTER_EMPTY = 2  # consecutive empty runs before a tile is skipped
+TILE_RECHECK_DAYS = 30     # skipped tiles are re-checked after this long anyway
+
+# Mainland bounding boxes: (min_lat, min_lon, max_lat, max_lon)
+COUNTRY_BBOXES = {
+    "DE": (47.27, 5.87, 55.06, 15.04), "FR": (41.33, -5.14, 51.09, 9.56),
+    "IT": (36.62, 6.63, 47.09, 18.52), "ES": (35.95, -9.39, 43.79, 4.33),
+    "NL": (50.75, 3.36, 53.55, 7.23), "BE": (49.50, 2.54, 51.50, 6.41),
+    "AT": (46.37, 9.53, 49.02, 17.16), "CH": (45.82, 5.96, 47.81, 10.49),
+    "PL": (49.00, 14.12, 54.84, 24.15), "CZ": (48.55, 12.09, 51.06, 18.86),
+    "GB": (49.96, -8.17, 58.64, 1.76), "IE": (51.42, -10.48, 55.39, -5.99),
+    "SE": (55.34, 11.11, 69.06, 24.17), "DK": (54.56, 8.07, 57.75, 12.69),
+    "NO": (57.96, 4.99, 71.19, 31.17), "FI": (59.81, 20.55, 70.09, 31.59),
+    "PT": (36.96, -9.50, 42.15, -6.19), "HU": (45.74, 16.11, 48.59, 22.90),
+    "HR": (42.39, 13.49, 46.55, 19.45), "SI": (45.42, 13.38, 46.88, 16.61),
+}
+
+# Cached responses, one gzipped blob per (query, region, limit, API version)
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "cache", "outscraper")
+API_VERSION = "search-v3"
+DEFAULT_CACHE_TTL_HOURS = float(os.environ.get("OUTSCRAPER_CACHE_TTL_HOURS", 7 * 24))
+
+# Append-only log of completed searches, replayed by --resume
+CHECKPOINT_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-checkpoint.jsonl")
+# Append-only ledger of failed requests across runs
+FAILURES_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-failures.jsonl")
+# Per-run metrics report (.prom and -history.jsonl are written next to it)
+METRICS_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-metrics.json")
+
+# Retries for transient failures (429, 5xx, timeouts), exponential backoff with full jitter
+MAX_RETRIES = 4
+BACKOFF_BASE = 2.0
+BACKOFF_MAX = 60.0
+# Circuit breaker: after this many consecutive transient failures, fail fast for a while
+BREAKER_THRESHOLD = 10
+BREAKER_COOLDOWN = 120.0
 
+# Async job polling backoff (seconds)
+POLL_INITIAL = 2.0
+POLL_MAX = 60.0
+# Stop collecting after this long; unfinished jobs are collected by the next run
+COLLECT_TIMEOUT = 2 * 3600.0
+JOB_DONE_STATUSES = {"Success", "Finished"}
+JOB_FAILED_STATUSES = {"Failed", "Error", "Canceled", "Cancelled"}
+
+
+def _get_json(url: str, timeout: float, endpoint: str = "search",
+              label: str = "", region: str = "") -> dict:
+    """GET an Outscraper endpoint and decode the JSON body.
+
+    Every attempt is recorded in METRICS, failed ones included.
+    """
     req = urllib.request.Request(url, headers={
         "X-API-KEY": API_KEY,
         "Accept": "application/json",
     })
+    started, t0 = time.time(), time.perf_counter()
+    status, body = "error", b""
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            body = resp.read()
+            status = resp.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+        raise
+    except (socket.timeout, TimeoutError):
+        status = "timeout"
+        raise
+    finally:
+        METRICS.observe_request(endpoint, label, region, status, started,
+                                time.perf_counter() - t0, len(body))
+    return json.loads(body.decode())
+
+
+def _extract_results(data: dict) -> list:
+    """Pull the place list out of an Outscraper response."""
+    # Outscraper v3 returns {"id":..., "status":..., "data": [[...]]}
+    if "data" in data and data["data"]:
+        return data["data"][0] if isinstance(data["data"][0], list) else data["data"]
+    return []
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Stops hammering Outscraper once it is failing consistently.
+
+    Opens after `threshold` consecutive transient failures; while open every
+    request fails fast. After `cooldown` seconds one trial request is let
+    through (half-open): a success closes the breaker again, any failure
+    reopens it. Callers must call end_trial() once a trial is over, however
+    it ended.
+    """
+
+    def __init__(self, threshold: int = BREAKER_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_request(self) -> bool:
+        """Raise CircuitOpenError while open. Returns True if this request is the half-open trial."""
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                raise CircuitOpenError("circuit open after repeated upstream failures")
+            self._trial_in_flight = True
+            return True
+
+    def end_trial(self):
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self._failures >= self.threshold:
+                if self._opened_at is None:
+                    print(f"  🔌 Circuit open: {self._failures} consecutive failures, "
+                          f"pausing requests for {self.cooldown:.0f}s")
+                self._opened_at = time.monotonic()
+
+
+BREAKER = CircuitBreaker()
+_ledger_lock = threading.Lock()
+
+
+def _is_transient(error: Exception) -> bool:
+    """Rate limits, server errors and network trouble are worth retrying."""
+    if isinstance(error, CircuitOpenError):
+        return True
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (urllib.error.URLError, socket.timeout, ConnectionError, TimeoutError))
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    if isinstance(error, urllib.error.HTTPError) and error.headers:
+        retry_after = error.headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX)
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+def _log_failure(label: str, error: Exception, attempts: int):
+    entry = {
+        "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "search": label,
+        "error": str(error)[:500],
+        "status": getattr(error, "code", None),
+        "transient": _is_transient(error),
+        "attempts": attempts,
+    }
+    with _ledger_lock:
+        os.makedirs(os.path.dirname(FAILURES_FILE), exist_ok=True)
+        with open(FAILURES_FILE, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def request_json(url: str, timeout: float, label: str,
+                 endpoint: str = "search", region: str = "",
+                 bucket: Optional["TokenBucket"] = None) -> dict:
+    """GET with classified retries and the shared circuit breaker.
+
+    Transient failures are retried with exponential backoff and jitter
+    (honouring Retry-After); anything else fails immediately. The final
+    error is re-raised after being written to the failure ledger. With
+    `bucket`, every attempt (retries included) waits for a token.
+    """
+    attempt = 0
+    while True:
+        try:
+            trial = BREAKER.before_request()
+        except CircuitOpenError as e:
+            _log_failure(label, e, attempt)
+            raise
+        try:
+            if bucket:
+                bucket.acquire()
+            data = _get_json(url, timeout, endpoint, label, region)
+            BREAKER.record_success()
+            return data
+        except Exception as e:
+            transient = _is_transient(e)
+            if transient or trial:
+                # A failed half-open trial reopens the breaker, whatever the error
+                BREAKER.record_failure()
+            if not transient or attempt >= MAX_RETRIES:
+                _log_failure(label, e, attempt + 1)
+                raise
+            delay = _retry_delay(e, attempt)
+            attempt += 1
+            METRICS.observe_retry(endpoint, label)
+            print(f"  🔁 '{label}' → {e}; retry {attempt}/{MAX_RETRIES} in {delay:.1f}s")
+        finally:
+            if trial:
+                BREAKER.end_trial()
+        time.sleep(delay)
+
+
+def search_outscraper(query: str, region: str, limit: int = 50,
+                      coordinates: Optional[str] = None,
+                      language: Optional[str] = None,
+                      bucket: Optional["TokenBucket"] = None) -> Optional[list]:
+    """Call Outscraper Google Maps Search API (rate-limited by `bucket`, if given).
+
+    With `coordinates` ("@lat,lon,zoomz") the query is anchored to that map
+    viewport and `region` is sent as Outscraper's country-code filter;
+    otherwise `region` is appended to the query text.
+
+    Returns None when the request failed, so callers can tell a failure
+    apart from a search that genuinely found nothing.
+    """
+    full_query = f"{query}, {region}"
+    query_params = {"query": full_query, "limit": limit, "async": "false"}
+    if coordinates:
+        query_params.update({"query": query, "coordinates": coordinates, "region": region})
+        full_query = f"{query}, {region} {coordinates}"
+    if language:
+        query_params["language"] = language
+    params = urllib.parse.urlencode(query_params)
+    url = f"{BASE_URL}?{params}"
 
     try:
-        with urllib.request.urlopen(req, timeout=120) as resp:
-            data = json.loads(resp.read().decode())
-            # Outscraper v3 returns {"id":..., "status":..., "data": [[...]]}
-            if "data" in data and data["data"]:
-                results = data["data"][0] if isinstance(data["data"][0], list) else data["data"]
-                print(f"  ✅ '{full_query}' → {len(results)} results")
-                return results
-            else:
-                print(f"  ⚠️  '{full_query}' → 0 results")
-                return []
+        results = _extract_results(request_json(url, timeout=120, label=full_query, region=region,
+                                                   bucket=bucket))
+        if results:
+            print(f"  ✅ '{full_query}' → {len(results)} results")
+        else:
+            print(f"  ⚠️  '{full_query}' → 0 results")
+        return results
     except urllib.error.HTTPError as e:
         body = e.read().decode() if e.fp else ""
         print(f"  ❌ '{full_query}' → HTTP {e.code}: {body[:200]}")
-        return []
+        return None
     except Exception as e:
         print(f"  ❌ '{full_query}' → Error: {e}")
-        return []
+        return None
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of search results with a TTL.
+
+    Each entry is a gzipped JSON blob named after the SHA-256 of
+    (query, region, limit, API version). Regions listed in `refresh`
+    (or "all") always miss, forcing a fresh fetch that overwrites the entry.
+    `served` collects the search keys answered from the cache this run.
+    """
+
+    def __init__(self, cache_dir: str = CACHE_DIR, ttl_hours: float = DEFAULT_CACHE_TTL_HOURS,
+                 refresh: tuple = ()):
+        self.cache_dir = cache_dir
+        self.ttl = ttl_hours * 3600
+        self.refresh = {r.lower() for r in refresh}
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "refreshed": 0, "stored": 0}
+        self.served = set()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(s: dict) -> str:
+        ident = {
+            "query": s["query"],
+            "region": s["region"],
+            "limit": s.get("limit", 50),
+            "api": API_VERSION,
+        }
+        # Only tile searches carry these, so plain search keys stay stable
+        for extra in ("coordinates", "language"):
+            if s.get(extra):
+                ident[extra] = s[extra]
+        ident = json.dumps(ident, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(ident.encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json.gz")
+
+    def _count(self, stat: str):
+        with self._lock:
+            self.stats[stat] += 1
+
+    def get(self, s: dict) -> Optional[list]:
+        """Return cached results for a search, or None on a miss."""
+        regions = {s["region"].lower(), s.get("country", "").lower()}
+        if "all" in self.refresh or regions & self.refresh:
+            self._count("refreshed")
+            return None
+        path = self._path(self.key(s))
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+        if time.time() - entry.get("fetched_at", 0) > self.ttl:
+            self._count("expired")
+            return None
+        self._count("hits")
+        with self._lock:
+            self.served.add(search_key(s))
+        return entry["results"]
+
+    def put(self, s: dict, results: list):
+        key = self.key(s)
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {
+            "query": s["query"],
+            "region": s["region"],
+            "limit": s.get("limit", 50),
+            "api": API_VERSION,
+            "fetched_at": time.time(),
+            "results": results,
+        }
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        self._count("stored")
+
+    def summary(self) -> str:
+        st = self.stats
+        lookups = st["hits"] + st["misses"] + st["expired"] + st["refreshed"]
+        rate = st["hits"] / lookups * 100 if lookups else 0.0
+        return (f"{st['hits']}/{lookups} hits ({rate:.0f}%), {st['misses']} misses, "
+                f"{st['expired']} expired, {st['refreshed']} refreshed, {st['stored']} stored")
+
+
+class CheckpointLog:
+    """Append-only JSONL log of completed searches.
+
+    Every successful search is appended (and flushed) as soon as it
+    finishes, so a crash loses at most the searches still in flight.
+    With `resume=True` the existing log is replayed; otherwise it is
+    started afresh.
+    """
+
+    def __init__(self, path: str = CHECKPOINT_FILE, resume: bool = False):
+        self.path = path
+        self.completed = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if resume and os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn final line from a crash
+                    self.completed[entry["key"]] = entry["results"]
+        else:
+            open(path, "w").close()
+
+    def get(self, s: dict) -> Optional[list]:
+        return self.completed.get(ResponseCache.key(s))
+
+    def record(self, s: dict, results: list):
+        key = ResponseCache.key(s)
+        line = json.dumps({"key": key, "search": search_key(s), "at": time.time(),
+                           "results": results}, ensure_ascii=False)
+        with self._lock:
+            self.completed[key] = results
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _replay(s: dict, checkpoint: Optional[CheckpointLog], cache: Optional[ResponseCache]) -> Optional[list]:
+    """Results for a search from the checkpoint log or cache, if available."""
+    if checkpoint:
+        done = checkpoint.get(s)
+        if done is not None:
+            print(f"  ⏩ '{search_key(s)}' → {len(done)} results (checkpoint)")
+            METRICS.observe_replay(search_key(s), "checkpoint")
+            return done
+    if cache:
+        cached = cache.get(s)
+        if cached is not None:
+            print(f"  💾 '{search_key(s)}' → {len(cached)} results (cached)")
+            METRICS.observe_replay(search_key(s), "cache")
+            if checkpoint:
+                checkpoint.record(s, cached)
+            return cached
+    return None
+
+
+def _store(s: dict, results: list, checkpoint: Optional[CheckpointLog], cache: Optional[ResponseCache]):
+    if checkpoint:
+        checkpoint.record(s, results)
+    if cache:
+        cache.put(s, results)
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` requests/sec with bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            # Reserve the token up front (balance may go negative) so waiters
+            # are released in arrival order instead of racing for refills.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def run_searches(searches: list, rps: float = DEFAULT_RPS,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 cache: Optional[ResponseCache] = None,
+                 checkpoint: Optional[CheckpointLog] = None) -> list:
+    """Run searches on a thread pool, throttled by a token bucket.
+
+    Returns one result list per search (None where the request failed),
+    in the same order as `searches`, regardless of completion order.
+    Checkpointed and cached searches skip both the rate limiter and the API.
+    """
+    bucket = TokenBucket(rps)
+    results = [None] * len(searches)
+
+    def worker(s: dict) -> Optional[list]:
+        replayed = _replay(s, checkpoint, cache)
+        if replayed is not None:
+            return replayed
+        fetched = search_outscraper(s["query"], s.get("country") or s["region"], s.get("limit", 50),
+                                    s.get("coordinates"), s.get("language"), bucket)
+        if fetched is not None:
+            _store(s, fetched, checkpoint, cache)
+        return fetched
+
+    with ThreadPoolExecutor(max_workers=max(1, max_in_flight)) as pool:
+        futures = {pool.submit(worker, s): i for i, s in enumerate(searches)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i = futures[future]
+            results[i] = future.result()
+            s = searches[i]
+            print(f"[{done}/{len(searches)}] Finished: {s['query']} in {s['region']}")
+
+    return results
+
+
+def submit_job(query: str, region: str, limit: int = 50,
+               bucket: Optional["TokenBucket"] = None) -> str:
+    """Submit a search as an async Outscraper job and return its job ID."""
+    params = urllib.parse.urlencode({
+        "query": f"{query}, {region}",
+        "limit": limit,
+        "async": "true",
+    })
+    data = request_json(f"{BASE_URL}?{params}", timeout=30, label=f"{query}, {region}",
+                        endpoint="submit", region=region, bucket=bucket)
+    if not data.get("id"):
+        raise ValueError(f"no job id in response: {str(data)[:200]}")
+    return data["id"]
+
+
+def poll_job(job_id: str, label: str = "", region: str = "") -> tuple:
+    """Fetch an async job. Returns (status, results)."""
+    data = _get_json(f"{REQUESTS_URL}/{urllib.parse.quote(job_id)}", timeout=30,
+                     endpoint="poll", label=label, region=region)
+    status = data.get("status", "Pending")
+    return status, _extract_results(data) if status in JOB_DONE_STATUSES else []
+
+
+def search_key(s: dict) -> str:
+    """Identify a search the same way Outscraper tags results ("query, region")."""
+    return f"{s['query']}, {s['region']}"
+
+
+def place_key(r: dict) -> str:
+    return r.get("place_id") or r.get("google_id") or r.get("name", "")
+
+
+def _load_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save_json(path: str, data, indent: Optional[int] = 2):
+    """Write JSON atomically so an interrupted run never leaves a torn file."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f, indent=indent, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+def load_jobs() -> dict:
+    return _load_json(JOBS_FILE, {})
+
+
+def save_jobs(jobs: dict):
+    _save_json(JOBS_FILE, jobs)
+
+
+def run_async_jobs(searches: list, rps: float = DEFAULT_RPS,
+                   cache: Optional[ResponseCache] = None,
+                   checkpoint: Optional[CheckpointLog] = None,
+                   collect_timeout: float = COLLECT_TIMEOUT) -> list:
+    """Submit every search as an async job up front, then poll until all finish.
+
+    Job IDs are persisted to JOBS_FILE as soon as they are issued, so an
+    interrupted run resumes polling the same jobs instead of paying again.
+    Collected jobs are cleared by main() once the merged results are saved;
+    jobs still running after `collect_timeout` seconds stay for the next run.
+    Returns one result list per search (None where the job failed or is
+    still running), in the same order as `searches`. Checkpointed and cached
+    searches are never submitted.
+    """
+    bucket = TokenBucket(rps)
+    jobs = load_jobs()
+    results = [None] * len(searches)
+
+    # ── Submit phase ──
+    resumed = sum(1 for s in searches if search_key(s) in jobs)
+    if resumed:
+        print(f"♻️  Resuming {resumed} in-flight jobs from {JOBS_FILE}")
+    for i, s in enumerate(searches, 1):
+        key = search_key(s)
+        if key in jobs:
+            continue
+        replayed = _replay(s, checkpoint, cache)
+        if replayed is not None:
+            results[i - 1] = replayed
+            continue
+        try:
+            job_id = submit_job(s["query"], s["region"], s.get("limit", 50), bucket)
+        except Exception as e:
+            print(f"  ❌ [{i}/{len(searches)}] Submit failed: {s['query']} in {s['region']} → {e}")
+            continue
+        jobs[key] = {"id": job_id, "submitted_at": time.time()}
+        save_jobs(jobs)
+        print(f"  📤 [{i}/{len(searches)}] Submitted: {s['query']} in {s['region']} → {job_id}")
+
+    # ── Collect phase ──
+    pending = {i: POLL_INITIAL for i, s in enumerate(searches) if search_key(s) in jobs}
+    next_poll = {i: time.monotonic() for i in pending}
+    deadline = time.monotonic() + collect_timeout
+    finished = 0
+
+    while pending:
+        i = min(pending, key=lambda j: next_poll[j])
+        if next_poll[i] > deadline:
+            break
+        delay = next_poll[i] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        s = searches[i]
+        full_query = f"{s['query']}, {s['region']}"
+        job_id = jobs[search_key(s)]["id"]
+        bucket.acquire()
+        try:
+            status, job_results = poll_job(job_id, full_query, s["region"])
+        except Exception as e:
+            if _is_transient(e):
+                status, job_results = "Pending", []
+                print(f"  ⚠️  '{full_query}' → poll error, will retry: {e}")
+            else:
+                # e.g. 404 once Outscraper has expired the job: submit it again next run
+                status, job_results = "Error", []
+                print(f"  ⚠️  '{full_query}' → poll failed: {e}")
+
+        if status in JOB_DONE_STATUSES or status in JOB_FAILED_STATUSES:
+            finished += 1
+            del pending[i]
+            if status in JOB_DONE_STATUSES:
+                results[i] = job_results
+                _store(s, job_results, checkpoint, cache)
+                print(f"  ✅ [{finished}/{len(searches)}] '{full_query}' → {len(job_results)} results")
+            else:
+                print(f"  ❌ [{finished}/{len(searches)}] '{full_query}' → job {status}")
+                # Failed jobs get re-submitted on the next run
+                del jobs[search_key(s)]
+                save_jobs(jobs)
+        else:
+            # Exponential backoff per job
+            next_poll[i] = time.monotonic() + pending[i]
+            pending[i] = min(pending[i] * 2, POLL_MAX)
+
+    if pending:
+        print(f"  ⏳ {len(pending)} jobs still running after {collect_timeout:.0f}s; "
+              f"re-run to collect them from {JOBS_FILE}")
+    return results
+
+
+def clear_collected_jobs(searches: list, result_lists: list):
+    """Forget the jobs whose results are saved, keeping any still running."""
+    jobs = load_jobs()
+    for s, results in zip(searches, result_lists):
+        if results is not None:
+            jobs.pop(search_key(s), None)
+    if jobs:
+        save_jobs(jobs)
+    elif os.path.exists(JOBS_FILE):
+        os.remove(JOBS_FILE)
+
+
+def merge_results(result_lists: list) -> list:
+    """Merge per-search results in order, keeping the first copy of each place."""
+    all_results = []
+    seen_place_ids = set()
+
+    for results in result_lists:
+        for r in results or []:
+            pid = place_key(r)
+            if pid not in seen_place_ids:
+                seen_place_ids.add(pid)
+                all_results.append(r)
+
+    return all_results
+
+
+def load_config(path: str = CONFIG_FILE) -> dict:
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def tile_zoom(tile: tuple) -> int:
+    """Google Maps zoom level whose ~1024px viewport just covers the tile."""
+    min_lat, min_lon, max_lat, max_lon = tile
+    center_lat = math.radians((min_lat + max_lat) / 2)
+    span = max(max_lon - min_lon, (max_lat - min_lat) / math.cos(center_lat))
+    return max(3, min(17, int(math.log2(1440 / span))))
+
+
+def split_tile(tile: tuple) -> list:
+    """Split a bounding box into four quadrants."""
+    min_lat, min_lon, max_lat, max_lon = tile
+    mid_lat, mid_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    return [
+        (min_lat, min_lon, mid_lat, mid_lon), (min_lat, mid_lon, mid_lat, max_lon),
+        (mid_lat, min_lon, max_lat, mid_lon), (mid_lat, mid_lon, max_lat, max_lon),
+    ]
+
+
+def tile_search(cfg: dict, country_code: str, tile: tuple, depth: int) -> dict:
+    """Build a coordinate-anchored search for one tile."""
+    lat = (tile[0] + tile[2]) / 2
+    lon = (tile[1] + tile[3]) / 2
+    coordinates = f"@{lat:.4f},{lon:.4f},{tile_zoom(tile)}z"
+    return {
+        "query": cfg["query"],
+        "region": f"{country_code} {coordinates}",
+        "country": country_code,
+        "coordinates": coordinates,
+        "language": cfg.get("language"),
+        "limit": cfg.get("limit", 50),
+        "tile": tile,
+        "depth": depth,
+    }
+
+
+def _skip_tile(history: Optional[dict]) -> bool:
+    if not history or history.get("empty_runs", 0) < TILE_SKIP_AFTER_EMPTY:
+        return False
+    return time.time() - history.get("last_checked", 0) < TILE_RECHECK_DAYS * 86400
+
+
+def run_tiled(config: dict, state: dict, rps: float = DEFAULT_RPS,
+              max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+              cache: Optional[ResponseCache] = None,
+              checkpoint: Optional[CheckpointLog] = None) -> tuple:
+    """Adaptive quadtree search over each configured country's bounding box.
+
+    Every (query, country) starts as one tile covering the whole country.
+    A tile whose result count reaches the query limit was probably
+    truncated, so it is split into four and searched again one level
+    deeper. Tiles that came back empty on recent runs are skipped.
+    Returns (searches, result_lists) for every tile actually searched.
+    """
+    history = state.setdefault("tiles", {})
+    level = []
+    for cfg in config["searches"]:
+        for cc in cfg["countries"]:
+            if cc not in COUNTRY_BBOXES:
+                print(f"  ⚠️  No bounding box for {cc}, skipping '{cfg['query']}'")
+                continue
+            level.append(tile_search(cfg, cc, COUNTRY_BBOXES[cc], 0))
+
+    searched, result_lists = [], []
+    depth = 0
+    while level:
+        to_run = [t for t in level if not _skip_tile(history.get(search_key(t)))]
+        print(f"\n🗺️  Depth {depth}: {len(to_run)} tiles ({len(level) - len(to_run)} skipped as empty)")
+        level_results = run_searches(to_run, rps, max_in_flight, cache, checkpoint)
+
+        next_level = []
+        now = time.time()
+        for t, results in zip(to_run, level_results):
+            if results is None:
+                continue
+            # A cached response is an earlier run's answer, not another empty run
+            if not (cache and search_key(t) in cache.served):
+                entry = history.setdefault(search_key(t), {"empty_runs": 0})
+                entry["empty_runs"] = 0 if results else entry["empty_runs"] + 1
+                entry["last_count"] = len(results)
+                entry["last_checked"] = now
+            if len(results) >= t["limit"] and t["depth"] < TILE_MAX_DEPTH:
+                next_level += [tile_search({"query": t["query"], "language": t["language"],
+                                            "limit": t["limit"]}, t["country"], child, t["depth"] + 1)
+                               for child in split_tile(t["tile"])]
+
+        searched += to_run
+        result_lists += level_results
+        level = next_level
+        depth += 1
+
+    return searched, result_lists
+
+
+def load_state() -> dict:
+    return _load_json(STATE_FILE, {"searches": {}})
+
+
+def save_state(state: dict):
+    _save_json(STATE_FILE, state)
+
+
+def stale_searches(searches: list, state: dict, stale_hours: float) -> list:
+    """Searches that never ran, failed last time, or last succeeded too long ago."""
+    cutoff = time.time() - stale_hours * 3600
+    stale = []
+    for s in searches:
+        entry = state["searches"].get(search_key(s))
+        if not entry or entry.get("status") != "ok" or entry.get("last_success", 0) < cutoff:
+            stale.append(s)
+    return stale
+
+
+def update_state(state: dict, searches: list, result_lists: list, cached: Iterable[str] = ()):
+    """Record the outcome of each search that ran. Failures keep their old place IDs.
+
+    Successful searches also log a yield entry (places returned, and how
+    many of those no search had ever returned before) for the planner.
+    Searches answered from the response cache (keys in `cached`) replay an
+    earlier request, so they log no yield and don't count as fresh.
+    """
+    cached = set(cached)
+    now = time.time()
+    known = {pid for entry in state["searches"].values() for pid in entry.get("place_ids", [])}
+    for s, results in zip(searches, result_lists):
+        entry = state["searches"].setdefault(search_key(s), {"place_ids": []})
+        entry["last_attempt"] = now
+        if results is None:
+            entry["status"] = "failed"
+            continue
+        entry["status"] = "ok"
+        entry["place_ids"] = [place_key(r) for r in results]
+        if search_key(s) in cached:
+            continue
+        entry["last_success"] = now
+        entry.setdefault("yield", []).append({
+            "at": now,
+            "results": len(results),
+            "new": len(set(entry["place_ids"]) - known),
+        })
+        entry["yield"] = entry["yield"][-YIELD_HISTORY:]
+
+
+def plan_searches(searches: list, state: dict, min_yield: float = DEFAULT_MIN_YIELD) -> list:
+    """Rank searches by marginal yield per credit and mark redundant ones.
+
+    Outscraper bills per returned place, so a search's expected cost is its
+    average result count. Searches are picked greedily (set cover over
+    their last known place IDs): each step takes the search adding the most
+    not-yet-covered places per credit. A search is marked "drop" when its
+    marginal yield is below `min_yield` and it has not been discovering
+    brand-new places recently either. Searches with too little history are
+    always kept. Returns rows in plan order, kept searches first.
+    """
+    rows = []
+    for s in searches:
+        entry = state["searches"].get(search_key(s), {})
+        history = entry.get("yield", [])[-PLAN_WINDOW:]
+        runs = len(history)
+        rows.append({
+            "search": s,
+            "runs": runs,
+            "avg_results": sum(h["results"] for h in history) / runs if runs else None,
+            "avg_new": sum(h["new"] for h in history) / runs if runs else None,
+            "place_ids": set(entry.get("place_ids", [])),
+            "marginal": None,
+        })
+
+    fresh = [row for row in rows if row["runs"] < PLAN_MIN_RUNS]
+    remaining = [row for row in rows if row["runs"] >= PLAN_MIN_RUNS]
+    covered = set().union(*(row["place_ids"] for row in fresh))
+    ordered = []
+    while remaining:
+        best = max(remaining, key=lambda row: (len(row["place_ids"] - covered) / max(row["avg_results"], 1),
+                                               -remaining.index(row)))
+        remaining.remove(best)
+        best["marginal"] = len(best["place_ids"] - covered)
+        covered |= best["place_ids"]
+        ordered.append(best)
+
+    for row in fresh:
+        row["action"] = "keep"
+    for row in ordered:
+        redundant = row["marginal"] < min_yield and row["avg_new"] < min_yield
+        row["action"] = "drop" if redundant else "keep"
+
+    plan = fresh + ordered
+    plan.sort(key=lambda row: row["action"] != "keep")
+    return plan
+
+
+def print_plan(plan: list):
+    def fmt(value):
+        return "—" if value is None else f"{value:.1f}"
+
+    print(f"{'Action':<6} {'Runs':>4} {'Results':>8} {'New':>6} {'Marginal':>9}  Search")
+    for row in plan:
+        marginal = "—" if row["marginal"] is None else str(row["marginal"])
+        print(f"{row['action']:<6} {row['runs']:>4} {fmt(row['avg_results']):>8} "
+              f"{fmt(row['avg_new']):>6} {marginal:>9}  {search_key(row['search'])}")
+
+    dropped = [row for row in plan if row["action"] == "drop"]
+    credits = sum(row["avg_results"] for row in dropped)
+    total = sum(row["avg_results"] or 0 for row in plan)
+    print(f"\n📉 Dropping {len(dropped)}/{len(plan)} searches saves {len(dropped)} requests "
+          f"and ~{credits:.0f} of ~{total:.0f} credits per run")
+
+
+def upsert_results(existing: list, old_state: dict, new_state: dict,
+                   searches: list, result_lists: list) -> tuple:
+    """Merge fresh results into the existing raw set by place ID.
+
+    A place counts as removed only when every search that used to return it
+    was re-queried successfully this run and none returned it again. Places
+    with no recorded searches fall back to the "query" tag Outscraper puts on
+    each result. A place is changed only if one of DELTA_FIELDS differs.
+    Returns (records, delta).
+    """
+    index = {place_key(r): r for r in existing}
+    added, changed = [], []
+
+    for r in merge_results(result_lists):
+        pid = place_key(r)
+        if pid not in index:
+            added.append(r)
+        elif project_record(index[pid], DELTA_FIELDS) != project_record(r, DELTA_FIELDS):
+            changed.append(r)
+        index[pid] = r
+
+    succeeded = {search_key(s) for s, res in zip(searches, result_lists) if res is not None}
+    old_sources = {}
+    for key, entry in old_state["searches"].items():
+        for pid in entry.get("place_ids", []):
+            old_sources.setdefault(pid, set()).add(key)
+    still_listed = {pid for entry in new_state["searches"].values() for pid in entry.get("place_ids", [])}
+
+    removed = []
+    for pid, r in list(index.items()):
+        if pid in still_listed:
+            continue
+        sources = old_sources.get(pid) or ({r["query"]} if r.get("query") else set())
+        if sources and sources <= succeeded:
+            removed.append(pid)
+            del index[pid]
+
+    delta = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "searches_run": len(searches),
+        "searches_failed": len(searches) - len(succeeded),
+        "added": added,
+        "changed": changed,
+        "removed": removed,
+    }
+    return list(index.values()), delta
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Scrape Google Maps via Outscraper")
+    parser.add_argument("--rps", type=float, default=DEFAULT_RPS,
+                        help="Max requests per second (token bucket rate)")
+    parser.add_argument("--max-in-flight", type=int, default=DEFAULT_MAX_IN_FLIGHT,
+                        help="Max concurrent requests (1 = serial)")
+    parser.add_argument("--async-jobs", action="store_true",
+                        help="Submit all searches as async jobs, then poll for results")
+    parser.add_argument("--collect-timeout", type=float, default=COLLECT_TIMEOUT,
+                        help="Async jobs: stop polling after this many seconds, leaving the rest for the next run")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL_HOURS,
+                        help="Reuse cached responses younger than this many hours")
+    parser.add_argument("--refresh", action="append", default=[], metavar="REGION",
+                        help="Bypass the cache for REGION (repeatable, or 'all')")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Neither read nor write the response cache")
+    parser.add_argument("--tiles", action="store_true",
+                        help="Search the config's queries tile by tile over each country's bounding box")
+    parser.add_argument("--config", default=CONFIG_FILE,
+                        help="Search config used by --tiles")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Re-query only stale/failed searches and upsert into existing results")
+    parser.add_argument("--stale-after", type=float, default=DEFAULT_STALE_HOURS,
+                        help="Incremental mode: re-query searches older than this many hours")
+    parser.add_argument("--plan", action="store_true",
+                        help="Print the yield-ranked query plan and expected savings, then exit")
+    parser.add_argument("--prune", action="store_true",
+                        help="Skip searches the planner marks as redundant")
+    parser.add_argument("--min-yield", type=float, default=DEFAULT_MIN_YIELD,
+                        help="Planner: drop searches averaging fewer unique places than this")
+    parser.add_argument("--resume", action="store_true",
+                        help="Replay searches completed by an interrupted run from the checkpoint log")
+    parser.add_argument("--no-archive", action="store_true",
+                        help="Don't store this run as a snapshot in data/raw/archive")
+    parser.add_argument("--archive-project", action="store_true",
+                        help="Archive only the raw fields the pipeline reads")
+    parser.add_argument("--metrics-file", default=METRICS_FILE,
+                        help="Where to write the run's metrics report (JSON, plus .prom alongside)")
+    args = parser.parse_args()
+    if args.tiles and args.async_jobs:
+        parser.error("--tiles needs each level's results before the next, so it can't use --async-jobs")
+    if args.tiles and (args.incremental or args.prune):
+        # Tiles keep their own history (empty tiles are skipped), not per-search staleness or yield
+        parser.error("--tiles can't be combined with --incremental or --prune")
+    return args
 
 
 def main():
+    args = parse_args()
+
+    if args.plan:
+        print("🧭 Query plan (from past runs in outscraper-state.json)\n")
+        print_plan(plan_searches(SEARCHES, load_state(), args.min_yield))
+        return
+
     if not API_KEY:
         print("❌ OUTSCRAPER_API_KEY not set. Export it first.")
         return
 
+    state = load_state()
+    old_state = copy.deepcopy(state)
+    searches = SEARCHES
+    if args.prune:
+        plan = plan_searches(SEARCHES, state, args.min_yield)
+        searches = [row["search"] for row in plan if row["action"] == "keep"]
+        print(f"🧭 Planner pruned {len(SEARCHES) - len(searches)} redundant searches")
+    if args.incremental:
+        refresh = {r.lower() for r in args.refresh}
+        stale = stale_searches(searches, state, args.stale_after)
+        searches = [s for s in searches
+                    if s in stale or "all" in refresh or s["region"].lower() in refresh]
+
     print("🏐 Outscraper Google Maps Scraper")
-    print(f"   {len(SEARCHES)} searches queued\n")
+    if args.tiles:
+        config = load_config(args.config)
+        print(f"   Tiling {len(config['searches'])} config searches "
+              f"({args.max_in_flight} in flight, {args.rps:.2f} req/s)")
+    else:
+        print(f"   {len(searches)} searches queued "
+              f"({args.max_in_flight} in flight, {args.rps:.2f} req/s)\n")
 
-    all_results = []
-    seen_place_ids = set()
+    cache = None if args.no_cache else ResponseCache(ttl_hours=args.cache_ttl, refresh=args.refresh)
+    checkpoint = CheckpointLog(resume=args.resume)
+    if args.resume:
+        print(f"⏩ Resuming: {len(checkpoint.completed)} completed searches in {CHECKPOINT_FILE}")
 
-    for i, s in enumerate(SEARCHES, 1):
-        print(f"[{i}/{len(SEARCHES)}] Searching: {s['query']} in {s['region']}")
-        results = search_outscraper(s["query"], s["region"])
+    if args.tiles:
+        searches, result_lists = run_tiled(config, state, args.rps, args.max_in_flight, cache, checkpoint)
+    elif args.async_jobs:
+        result_lists = run_async_jobs(searches, args.rps, cache, checkpoint, args.collect_timeout)
+    else:
+        result_lists = run_searches(searches, args.rps, args.max_in_flight, cache, checkpoint)
 
-        for r in results:
-            pid = r.get("place_id") or r.get("google_id") or r.get("name", "")
-            if pid not in seen_place_ids:
-                seen_place_ids.add(pid)
-                all_results.append(r)
+    known = {pid for entry in old_state["searches"].values() for pid in entry.get("place_ids", [])}
+    METRICS.observe_searches(((search_key(s), s.get("country") or s["region"],
+                               None if results is None else [place_key(r) for r in results])
+                              for s, results in zip(searches, result_lists)), known)
+    update_state(state, searches, result_lists, cache.served if cache else ())
 
-        # Rate limit — 1 req/sec to stay within free tier
-        if i < len(SEARCHES):
-            time.sleep(1.5)
+    if args.incremental:
+        existing = load_records(stage_path(OUTPUT_FILE)) if input_exists(stage_path(OUTPUT_FILE)) else []
+        all_results, delta = upsert_results(existing, old_state, state, searches, result_lists)
+        _save_json(DELTA_FILE, delta)
+    else:
+        all_results = merge_results(result_lists)
 
     # Save raw results
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(all_results, f, indent=2, ensure_ascii=False)
+    output_file = stage_path(OUTPUT_FILE)
+    write_records(output_file, all_results)
+    save_state(state)
+    if not args.no_archive:
+        snapshot = archive_snapshot(all_results, project=args.archive_project)
+
+    if args.async_jobs:
+        clear_collected_jobs(searches, result_lists)
+
+    print(f"\n✅ Done! {len(all_results)} unique places saved to {output_file}")
+    if not args.no_archive:
+        print(f"   Snapshot: {snapshot['id']} ({snapshot['new_objects']}/{snapshot['records']} "
+              f"records new to the archive)")
+    if args.incremental:
+        print(f"   Delta: +{len(delta['added'])} added, ~{len(delta['changed'])} changed, "
+              f"-{len(delta['removed'])} removed → {DELTA_FILE}")
+    failed = sum(1 for res in result_lists if res is None)
+    if failed:
+        print(f"   ⚠️  {failed} searches failed (see {FAILURES_FILE}) — "
+              f"re-run with --resume or --incremental to retry only those")
+    else:
+        checkpoint.clear()
+    if cache:
+        print(f"   Cache: {cache.summary()}")
 
-    print(f"\n✅ Done! {len(all_results)} unique places saved to {OUTPUT_FILE}")
+    report = METRICS.write(args.metrics_file, mode="tiles" if args.tiles else
+                           "async" if args.async_jobs else "sync",
+                           rps_limit=args.rps, max_in_flight=args.max_in_flight)
+    reqs = report["requests"]
+    p95 = reqs["latency_s"]["p95"]
+    print(f"   Metrics: {reqs['total']} requests, p95 {p95 if p95 is not None else '-'}s, "
+          f"{reqs['bytes'] / 1024:.0f} KB, {sum(reqs['retries'].values())} retries, "
+          f"{reqs['status'].get('429', 0)} rate-limited → {args.metrics_file}")
 
 
 if __name__ == "__main__":
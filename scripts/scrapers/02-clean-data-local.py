@@ -4,14 +4,26 @@ Step 2: Clean and standardize scraped Outscraper data.
 No external API needed — rule-based cleaning + slug generation.
 """
 
-import json
+import argparse
+import asyncio
+import importlib.util
 import os
 import re
+import sys
 import unicodedata
-from typing import Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, tee
+from typing import Iterable, Iterator, Optional
+
+from club_dedupe import dedupe_clubs
+from keyword_matcher import FEATURE_KEYWORDS, SPORT_KEYWORDS, KeywordMatcher, fold
+from pipeline_io import add_io_args, output_path, parse_stage_args, read_records, write_records
+from reverse_geocoder import get_geocoder
 
 INPUT_FILE = os.path.join(os.path.dirname(__file__), "data", "raw", "outscraper-results.json")
 OUTPUT_FILE = os.path.join(os.path.dirname(__file__), "data", "cleaned", "clubs-cleaned.json")
+DEFAULT_CHUNK_SIZE = 500
 
 # Country code → full name mapping
 COUNTRY_MAP = {
@@ -51,6 +63,25 @@ COUNTRY_FLAGS = {
     "Luxembourg": "🇱🇺", "Slovakia": "🇸🇰",
 }
 
+# Entries named after a country are map pins, not clubs
+COUNTRY_NAMES = {fold(name) for name in COUNTRY_MAP.values()}
+
+# Must have some roundnet/spikeball relevance (the same terms step 3 looks for)
+RELEVANCE = KeywordMatcher(SPORT_KEYWORDS, boundary="substring")
+FEATURES = KeywordMatcher(FEATURE_KEYWORDS, boundary="substring")
+
+# Signals behind score_entry()'s confidence score; they add up to 100.
+# The score only steers --hybrid and never goes into the output.
+CONFIDENCE_WEIGHTS = {
+    "sport_in_name": 30,  # "roundnet"/"spikeball" in the name, not just the description
+    "country": 20,        # country resolved to a known code
+    "city": 15,           # a plausible city name
+    "coordinates": 15,
+    "contact": 10,        # website, email, phone or social link
+    "established": 10,    # has reviews or a description
+}
+DEFAULT_HYBRID_THRESHOLD = 70
+
 
 def slugify(text: str) -> str:
     """Convert text to URL-friendly slug."""
@@ -65,8 +96,20 @@ def slugify(text: str) -> str:
     return text.strip("-")
 
 
-def extract_country(raw: dict) -> tuple:
-    """Extract (country_name, country_code) from raw data."""
+def locate_all(raws: list) -> list:
+    """Nearest gazetteer city (offline, or None) to each entry's coordinates, in one batch lookup."""
+    located = [i for i, raw in enumerate(raws)
+               if raw.get("latitude") is not None and raw.get("longitude") is not None]
+    places = [None] * len(raws)
+    if located:
+        points = [(raws[i]["latitude"], raws[i]["longitude"]) for i in located]
+        for i, place in zip(located, get_geocoder().lookup_many(points)):
+            places[i] = place
+    return places
+
+
+def extract_country(raw: dict, place: Optional[dict] = None) -> tuple:
+    """Extract (country_name, country_code) from raw data, or from its nearest city `place`."""
     # Try country field
     country = raw.get("country", "") or ""
     country_code = raw.get("country_code", "") or ""
@@ -83,15 +126,23 @@ def extract_country(raw: dict) -> tuple:
     if country in COUNTRY_NAME_TO_CODE:
         return country, COUNTRY_NAME_TO_CODE[country]
 
+    # Fall back to the coordinates
+    if place and place["country_code"] in COUNTRY_MAP:
+        return COUNTRY_MAP[place["country_code"]], place["country_code"]
+
     return country, country_code
 
 
-def extract_city(raw: dict) -> str:
-    """Extract city name from raw data."""
+def extract_city(raw: dict, place: Optional[dict] = None) -> str:
+    """Extract city name from raw data, or from its nearest city `place`."""
     city = raw.get("city", "") or ""
     if city and city not in ("None", ""):
         return city
 
+    # Nearest known city to the coordinates
+    if place:
+        return place["city"]
+
     # Try from full_address
     addr = raw.get("full_address", "") or ""
     if addr:
@@ -107,44 +158,28 @@ def extract_city(raw: dict) -> str:
 
 def is_relevant(raw: dict) -> bool:
     """Filter out irrelevant results (not actual clubs)."""
-    name = (raw.get("name") or "").lower()
+    name = raw.get("name") or ""
 
     # Skip entries that are just country names
-    if name in [c.lower() for c in COUNTRY_MAP.values()]:
+    if fold(name) in COUNTRY_NAMES:
         return False
 
     # Skip entries with no name
-    if not name or name == "n/a":
+    if not name or name.lower() == "n/a":
         return False
 
-    # Must have some roundnet/spikeball relevance
-    relevant_keywords = ["roundnet", "spikeball", "spike"]
-    name_lower = name.lower()
-    desc = (raw.get("description") or "").lower()
-    category = (raw.get("category") or "").lower()
-    subtypes = " ".join(raw.get("subtypes", []) or []).lower()
-
-    all_text = f"{name_lower} {desc} {category} {subtypes}"
-    return any(kw in all_text for kw in relevant_keywords)
+    desc = raw.get("description") or ""
+    category = raw.get("category") or ""
+    subtypes = " ".join(raw.get("subtypes", []) or [])
+    return RELEVANCE.matches(f"{name} {desc} {category} {subtypes}")
 
 
 def extract_features(raw: dict) -> list:
     """Infer features from available data."""
-    features = []
-    name = (raw.get("name") or "").lower()
-    desc = (raw.get("description") or "").lower()
-    all_text = f"{name} {desc}"
-
-    if "indoor" in all_text:
-        features.append("indoor")
-    if "outdoor" in all_text:
-        features.append("outdoor")
-    if "training" in all_text or "treningi" in all_text:
-        features.append("weekly_meetups")
-    if "beginner" in all_text or "anfänger" in all_text:
-        features.append("beginner_friendly")
-    if "tournament" in all_text or "turnier" in all_text:
-        features.append("tournaments")
+    name = raw.get("name") or ""
+    desc = raw.get("description") or ""
+    found = FEATURES.find(f"{name}\n{desc}")
+    features = [f for f in FEATURE_KEYWORDS if f in found]
 
     # Default: if no indoor/outdoor specified, assume outdoor
     if "indoor" not in features and "outdoor" not in features:
@@ -153,14 +188,34 @@ def extract_features(raw: dict) -> list:
     return features
 
 
-def clean_entry(raw: dict) -> Optional[dict]:
-    """Clean a single scraped entry."""
+def plausible_city(city: str, country_name: str) -> bool:
+    return len(city) >= 2 and not re.match(r"^\d", city) and fold(city) != fold(country_name)
+
+
+def score_entry(raw: dict, club: dict) -> int:
+    """How sure the rules are about a cleaned entry, 0-100 (see CONFIDENCE_WEIGHTS)."""
+    signals = {
+        "sport_in_name": RELEVANCE.matches(club["name"]),
+        "country": club["countryCode"] in COUNTRY_MAP,
+        "city": plausible_city(club.get("city") or "", club["country"]),
+        "coordinates": club.get("latitude") is not None and club.get("longitude") is not None,
+        "contact": any(club.get(k) for k in ("website", "email", "phone", "instagram", "facebook")),
+        "established": bool(raw.get("reviews")) or bool(club.get("description")),
+    }
+    return sum(CONFIDENCE_WEIGHTS[name] for name, hit in signals.items() if hit)
+
+
+def clean_entry(raw: dict, place: Optional[dict] = None) -> Optional[dict]:
+    """Clean a single scraped entry.
+
+    `place` is the nearest city to its coordinates (see locate_all()).
+    """
     if not is_relevant(raw):
         return None
 
     name = raw.get("name", "").strip()
-    country_name, country_code = extract_country(raw)
-    city = extract_city(raw)
+    country_name, country_code = extract_country(raw, place)
+    city = extract_city(raw, place)
 
     if not country_name:
         return None
@@ -184,7 +239,7 @@ def clean_entry(raw: dict) -> Optional[dict]:
         facebook = site
         site = ""
 
-    return {
+    club = {
         "name": name,
         "slug": club_slug,
         "description": (raw.get("description") or "").strip() or None,
@@ -213,45 +268,175 @@ def clean_entry(raw: dict) -> Optional[dict]:
         "foundedYear": None,
         "trainingSchedule": raw.get("working_hours", {}).get("Monday") if isinstance(raw.get("working_hours"), dict) else None,
     }
+    return club
+
+
+def clean_chunk(chunk: list) -> list:
+    """Clean a chunk of raw entries, geocoding them in one lookup (runs in a worker process)."""
+    return [clean_entry(raw, place) for raw, place in zip(chunk, locate_all(chunk))]
+
+
+def clean_entries(raws: Iterable[dict], workers: int = 1,
+                  chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Optional[dict]]:
+    """Yield clean_entry() of every raw entry, in input order.
+
+    Entries are cleaned a chunk at a time. With workers > 1, chunks are
+    cleaned in a process pool. At most two chunks per worker are in flight,
+    so memory stays bounded on big inputs, and results are yielded chunk by
+    chunk in submission order.
+    """
+    raws = iter(raws)
+    if workers <= 1:
+        while True:
+            chunk = list(islice(raws, chunk_size))
+            if not chunk:
+                return
+            yield from clean_chunk(chunk)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        while True:
+            while len(pending) < 2 * workers:
+                chunk = list(islice(raws, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(clean_chunk, chunk))
+            if not pending:
+                return
+            yield from pending.popleft().result()
+
+
+def needs_review(raw: dict, club: Optional[dict], threshold: int = DEFAULT_HYBRID_THRESHOLD) -> bool:
+    """Whether the rules are unsure enough about an entry to ask the LLM."""
+    if club is None:
+        # Relevant, but the rules couldn't place it (no known country, or no usable name)
+        return is_relevant(raw)
+    return score_entry(raw, club) < threshold or not club.get("city") or club.get("latitude") is None
+
+
+def load_llm_cleaner():
+    """02-clean-data.py as a module (its file name can't be imported directly)."""
+    path = os.path.join(os.path.dirname(__file__), "02-clean-data.py")
+    spec = importlib.util.spec_from_file_location("llm_clean", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def merge_llm_result(raw: dict, club: Optional[dict], llm: Optional[dict]) -> Optional[dict]:
+    """Fold the LLM's cleaning of an entry into the rule-based result.
+
+    Without an LLM answer the rule-based result stands; an answer with
+    confidence below 50 drops the entry, as in 02-clean-data.py. The LLM's
+    confidence is not kept, so hybrid records match rule-cleaned ones.
+    """
+    if not llm:
+        return club
+    if (llm.get("confidence") or 0) < 50:
+        return None
 
+    merged = dict(club) if club else {
+        "placeId": raw.get("place_id") or raw.get("google_id"),
+        "rating": raw.get("rating"),
+        "reviewCount": raw.get("reviews"),
+        "photos": (raw.get("photos_sample") or [])[:5],
+    }
+    merged.update({k: v for k, v in llm.items() if k != "confidence" and v not in (None, "", [])})
 
-def main():
-    with open(INPUT_FILE, "r") as f:
-        raw_data = json.load(f)
+    country = merged.get("country") or ""
+    merged["name"] = (merged.get("name") or "").strip()
+    merged["slug"] = merged.get("slug") or slugify(merged["name"])
+    if not country or not merged["slug"]:
+        return None
+    merged["countrySlug"] = COUNTRY_SLUG_MAP.get(country, slugify(country))
+    merged["citySlug"] = slugify(merged["city"]) if merged.get("city") else None
+    merged["flag"] = COUNTRY_FLAGS.get(country, "")
+    merged.setdefault("isVerified", False)
+    return merged
 
-    print(f"📥 Loaded {len(raw_data)} raw entries")
 
-    # Clean all entries
+def review_with_llm(review: list, budget_usd: Optional[float] = None) -> list:
+    """Clean (raw, rule result) pairs with the LLM cleaner, merging its answers back."""
+    llm_cleaner = load_llm_cleaner()
+    llm_cleaner.SCHEDULER.budget_usd = budget_usd
+
+    async def collect():
+        return [result async for result in llm_cleaner.clean_entries_async([raw for raw, _ in review])]
+
+    try:
+        answers = asyncio.run(collect())
+    except llm_cleaner.BudgetExceeded as e:
+        print(f"\n💸 {e}; nothing was written.")
+        print("   Re-run to resume: finished calls are served from the LLM cache.")
+        llm_cleaner.SCHEDULER.report(llm_cleaner.USAGE.records)
+        sys.exit(1)
+    print(f"   📊 {llm_cleaner.USAGE.summary()}")
+    llm_cleaner.SCHEDULER.report(llm_cleaner.USAGE.records)
+    return [merge_llm_result(raw, club, llm) for (raw, club), llm in zip(review, answers)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rule-based cleaning of raw Outscraper data")
+    add_io_args(parser, INPUT_FILE, OUTPUT_FILE)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Clean in N worker processes (output is identical to the serial run)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                        help="Raw entries per worker task")
+    parser.add_argument("--hybrid", action="store_true",
+                        help="Send entries the rules are unsure about to Claude (needs ANTHROPIC_API_KEY)")
+    parser.add_argument("--hybrid-threshold", type=int, default=DEFAULT_HYBRID_THRESHOLD,
+                        help=f"Rule confidence below which --hybrid asks Claude (default: {DEFAULT_HYBRID_THRESHOLD})")
+    parser.add_argument("--budget-usd", type=float,
+                        help="Stop --hybrid once this much has been spent on API calls (re-run to resume)")
+    args = parse_stage_args(parser)
+    output_file = output_path(args.output, OUTPUT_FILE)
+
+    # Clean all entries, streaming the raw records
+    raws = read_records(args.input)
+    if args.hybrid:
+        raws, originals = tee(raws)
+    raw_count = 0
     cleaned = []
-    for raw in raw_data:
-        result = clean_entry(raw)
+    review = []
+    for result in clean_entries(raws, args.workers, args.chunk_size):
+        raw_count += 1
+        if args.hybrid:
+            raw = next(originals)
+            if needs_review(raw, result, args.hybrid_threshold):
+                review.append((raw, result))
+                continue
         if result:
             cleaned.append(result)
 
-    # Deduplicate by slug
-    seen_slugs = set()
-    unique = []
-    for club in cleaned:
-        if club["slug"] not in seen_slugs:
-            seen_slugs.add(club["slug"])
-            unique.append(club)
-        else:
-            print(f"  ⚠️  Duplicate skipped: {club['name']}")
+    print(f"📥 Loaded {raw_count} raw entries")
+
+    if args.hybrid:
+        print(f"🤖 Asking Claude about {len(review)}/{raw_count} entries the rules are unsure of")
+        resolved = [club for club in review_with_llm(review, args.budget_usd) if club] if review else []
+        print(f"   {len(cleaned)} cleaned by rules, {len(resolved)} by Claude")
+        cleaned += resolved
+
+    # Merge: fuzzy-deduplicate, then make slugs unique
+    unique, dedupe = dedupe_clubs(cleaned)
+    for club, sources in dedupe["sources"]:
+        for source in sources:
+            print(f"  🔗 Merged duplicate: {source['name']} → {club['name']} (score {source['score']})")
+    for old, new in dedupe["renamed"]:
+        print(f"  🏷️  Slug {old} already taken, using {new}")
+    print(f"   Dedupe: {dedupe['comparisons']} comparisons, {dedupe['merged']} duplicates merged")
 
     # Sort by country, then city, then name
     unique.sort(key=lambda c: (c["country"], c.get("city") or "", c["name"]))
 
     # Save
-    os.makedirs(os.path.dirname(OUTPUT_FILE), exist_ok=True)
-    with open(OUTPUT_FILE, "w") as f:
-        json.dump(unique, f, indent=2, ensure_ascii=False)
+    write_records(output_file, unique)
 
     # Stats
     countries = set(c["country"] for c in unique)
     cities = set(c.get("city") for c in unique if c.get("city"))
     print(f"\n✅ Cleaned: {len(unique)} clubs in {len(cities)} cities across {len(countries)} countries")
-    print(f"   Removed: {len(raw_data) - len(unique)} entries (irrelevant/duplicate)")
-    print(f"   Output: {OUTPUT_FILE}")
+    print(f"   Removed: {raw_count - len(unique)} entries (irrelevant/duplicate)")
+    print(f"   Output: {output_file}")
 
     # Print summary
     print("\n📊 By country:")
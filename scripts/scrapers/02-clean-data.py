@@ -3,21 +3,61 @@
 Step 2: Clean and standardize scraped data using Claude
 """
 
+import argparse
+import asyncio
 import json
-import os
-from anthropic import Anthropic
+import sys
+import time
+from itertools import islice
+from typing import Iterable, Optional
 
-# Initialize Claude client
-client = Anthropic()
+from anthropic import Anthropic, AsyncAnthropic
 
-CLEANING_PROMPT = """You are a data cleaning assistant for a Roundnet/Spikeball club directory.
+from llm_batches import add_batch_args, batch_request, clear_batch, parse_json, run_batch
+from llm_cache import CachedClient, add_cache_args, get_cache, invalidate
+from llm_prompts import UsageMeter, cached_system, compact_json, project
+from llm_routing import ModelRouter, add_routing_args, escalation_requests, missing, non_latin
+from llm_scheduler import BudgetExceeded, LLMScheduler, ScheduledClient, add_scheduler_args
+from pipeline_io import (
+    RecordWriter, add_io_args, input_exists, output_path, parse_stage_args, read_records,
+)
 
-Given this raw scraped data, clean and standardize it:
+# Easy entries go to the small model; see cleaning_difficulty(). Its answers
+# that don't parse or lack the required fields are asked again of the large one.
+# A low `confidence` is a verdict on the place, not on the answer, so it stands.
+ROUTER = ModelRouter("clean")
+LONG_RECORD = 2500  # characters of projected JSON
 
-{raw_data}
+# Async batch mode: entries per request, and requests in flight
+DEFAULT_BATCH_SIZE = 10
+DEFAULT_CONCURRENCY = 4
+MAX_TOKENS_PER_ENTRY = 1024
+MAX_TOKENS = 8192
 
-Return a JSON object with these fields:
-- name: Clean club name (remove "- Google Maps" etc)
+# Clients are created on first use, so the async mode can run on an injected client.
+# Both go through the shared response cache unless USE_LLM_CACHE is turned off;
+# cache misses go through SCHEDULER (rate limits, retries, budget). The SDK's own
+# retries are off, so SCHEDULER is the only retry policy.
+USE_LLM_CACHE = True
+SCHEDULER = LLMScheduler("clean", DEFAULT_CONCURRENCY)
+_client = None
+_async_client = None
+
+def get_client() -> CachedClient:
+    global _client
+    if _client is None:
+        _client = CachedClient(ScheduledClient(Anthropic(max_retries=0), SCHEDULER),
+                               get_cache() if USE_LLM_CACHE else None)
+    return _client
+
+def get_async_client() -> CachedClient:
+    global _async_client
+    if _async_client is None:
+        _async_client = CachedClient(ScheduledClient(AsyncAnthropic(max_retries=0), SCHEDULER, is_async=True),
+                                     get_cache() if USE_LLM_CACHE else None, is_async=True)
+    return _async_client
+
+CLEANING_FIELDS = """- name: Clean club name (remove "- Google Maps" etc)
 - slug: URL-friendly slug (lowercase, hyphens)
 - description: Brief description in English (translate if needed)
 - type: one of "official", "community", "university", "recreational"
@@ -46,64 +86,312 @@ Return a JSON object with these fields:
   - wheelchair_accessible
 - isVerified: false (will verify later)
 - confidence: 0-100 how confident you are this is a real roundnet club
+"""
+
+# Raw Outscraper fields the cleaner can use; the rest (reviews metadata,
+# photo links, IDs, booking links...) only costs tokens
+RAW_FIELDS = ('name', 'description', 'about', 'category', 'subtypes', 'type', 'full_address',
+              'address', 'street', 'postal_code', 'city', 'state', 'country', 'country_code',
+              'latitude', 'longitude', 'site', 'website', 'email', 'phone', 'working_hours')
+
+# Static instructions go in a cached system prompt; the user message is just the data
+CLEANING_PROMPT = """You are a data cleaning assistant for a Roundnet/Spikeball club directory.
+
+The user message is raw scraped data for one place, as JSON. Clean and
+standardize it.
 
+Return a JSON object with these fields:
+""" + CLEANING_FIELDS + """
 Only return valid JSON, no markdown.
 """
 
-def clean_single_entry(raw_entry: dict) -> dict:
-    """Clean a single scraped entry using Claude"""
+BATCH_CLEANING_PROMPT = """You are a data cleaning assistant for a Roundnet/Spikeball club directory.
+
+The user message is a JSON array of raw scraped entries, each with an
+"id". Clean and standardize every entry.
+
+Return a JSON array with one object per entry, in any order. Each object
+must have "id" (copied from its entry) and these fields:
+""" + CLEANING_FIELDS + """
+Only return the JSON array, no markdown.
+"""
+
+# Token usage of every call, reported at the end of a run
+USAGE = UsageMeter("clean")
+
+def cleaning_difficulty(raw_entry: dict) -> list:
+    """Why an entry needs the large model (empty if the small one will do)"""
+    
+    reasons = []
+    if missing(raw_entry, ('name',)):
+        reasons.append("missing name")
+    if missing(raw_entry, ('city',)) or len(missing(raw_entry, ('country', 'country_code'))) == 2:
+        reasons.append("missing location")
+    if non_latin(raw_entry.get('name'), raw_entry.get('description'), raw_entry.get('address')):
+        reasons.append("non-Latin text")
+    if len(compact_json(project(raw_entry, RAW_FIELDS))) > LONG_RECORD:
+        reasons.append("long record")
+    return reasons
+
+def valid_cleaning(result) -> bool:
+    """Whether a parsed answer has the shape write_cleaned() relies on"""
     
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
-        messages=[
+    if not isinstance(result, dict):
+        return False
+    confidence = result.get('confidence')
+    return (isinstance(result.get('name'), str)
+            and isinstance(result.get('slug'), str) and result['slug'] != ''
+            and type(confidence) in (int, float) and 0 <= confidence <= 100)
+
+def cleaning_params(raw_entry: dict) -> dict:
+    """The messages.create arguments for cleaning one entry, on the model it is routed to"""
+    
+    return {
+        "model": ROUTER.pick(cleaning_difficulty(raw_entry)),
+        "max_tokens": 1024,
+        "system": cached_system(CLEANING_PROMPT),
+        "messages": [
             {
                 "role": "user",
-                "content": CLEANING_PROMPT.format(raw_data=json.dumps(raw_entry, indent=2))
+                "content": compact_json(project(raw_entry, RAW_FIELDS))
             }
-        ]
-    )
+        ],
+    }
+
+def request_cleaning(params: dict) -> Optional[dict]:
+    """Send one cleaning request, returning the parsed answer (None if it doesn't parse)"""
+    
+    started = time.monotonic()
+    response = get_client().messages.create(**params)
+    USAGE.observe(response, started=started)
     
     try:
         return json.loads(response.content[0].text)
     except json.JSONDecodeError:
+        get_client().invalidate(params)
+        return None
+
+def clean_single_entry(raw_entry: dict) -> dict:
+    """Clean a single scraped entry using Claude"""
+    
+    params = cleaning_params(raw_entry)
+    result = request_cleaning(params)
+    escalated = None if valid_cleaning(result) else ROUTER.escalate(params)
+    if escalated:
+        print(f"   ↗️  Asking {ROUTER.large} instead")
+        result = request_cleaning(escalated)
+    
+    if result is None:
         print(f"Failed to parse response for: {raw_entry.get('name', 'unknown')}")
+    return result
+
+def parse_batch_response(text: str, ids: list) -> Optional[dict]:
+    """Map id → cleaned entry, or None unless every id came back as an object"""
+    
+    start, end = text.find("["), text.rfind("]")
+    if start < 0 or end < start:
         return None
+    try:
+        items = json.loads(text[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(items, list):
+        return None
+    
+    results = {}
+    for item in items:
+        if isinstance(item, dict) and str(item.get("id")) in ids:
+            results[str(item.pop("id"))] = item
+    return results if len(results) == len(ids) else None
 
-def clean_all_data(input_file: str, output_file: str):
-    """Clean all scraped data"""
+async def clean_batch(batch: list, aclient, semaphore: asyncio.Semaphore, model: str) -> dict:
+    """Clean (id, raw entry) pairs in one request, splitting the batch if the reply doesn't parse
+    
+    On the small model, entries whose answers are missing or invalid are
+    escalated to the large one instead. Returns id → cleaned entry, with None for entries
+    that failed on their own.
+    """
+    
+    ids = [entry_id for entry_id, _ in batch]
+    payload = [{"id": entry_id, **project(raw, RAW_FIELDS)} for entry_id, raw in batch]
+    params = {
+        "model": model,
+        "max_tokens": min(MAX_TOKENS, MAX_TOKENS_PER_ENTRY * len(batch)),
+        "system": cached_system(BATCH_CLEANING_PROMPT),
+        "messages": [
+            {
+                "role": "user",
+                "content": compact_json(payload)
+            }
+        ],
+    }
+    async with semaphore:
+        started = time.monotonic()
+        response = await aclient.messages.create(**params)
+        USAGE.observe(response, records=len(batch), started=started)
+    
+    results = parse_batch_response(response.content[0].text, ids)
+    if results is None:
+        invalidate(aclient, params)
+    rejected = [(entry_id, raw) for entry_id, raw in batch if results is None or not valid_cleaning(results[entry_id])]
+    if rejected and ROUTER.escalate(params, len(rejected)):
+        print(f"   ↗️  Asking {ROUTER.large} about {len(rejected)} of {len(batch)} entries")
+        answers = await clean_batch(rejected, aclient, semaphore, ROUTER.large)
+        return {**(results or {}), **{entry_id: a for entry_id, a in answers.items() if a is not None}}
+    if results is not None:
+        return results
+    if len(batch) == 1:
+        print(f"Failed to parse response for: {batch[0][1].get('name', 'unknown')}")
+        return {ids[0]: None}
     
-    with open(input_file, 'r') as f:
-        raw_data = json.load(f)
+    mid = len(batch) // 2
+    print(f"Splitting unparseable batch of {len(batch)}")
+    halves = await asyncio.gather(clean_batch(batch[:mid], aclient, semaphore, model),
+                                  clean_batch(batch[mid:], aclient, semaphore, model))
+    return {**halves[0], **halves[1]}
+
+async def clean_entries_async(entries: Iterable, aclient=None, batch_size: int = DEFAULT_BATCH_SIZE,
+                              concurrency: int = DEFAULT_CONCURRENCY):
+    """Clean entries several per request, with up to `concurrency` requests in flight
+    
+    Yields one result (or None) per entry, in input order. Entries are read
+    a window at a time, so memory stays bounded. `aclient` defaults to
+    AsyncAnthropic; any object with an async `messages.create` will do.
+    """
     
-    cleaned = []
-    for i, entry in enumerate(raw_data):
-        print(f"Cleaning {i+1}/{len(raw_data)}: {entry.get('name', 'unknown')}")
-        result = clean_single_entry(entry)
-        if result and result.get('confidence', 0) >= 50:
-            cleaned.append(result)
+    aclient = aclient or get_async_client()
+    semaphore = asyncio.Semaphore(concurrency)
+    entries = iter(enumerate(entries))
+    while True:
+        window = [(str(i), raw) for i, raw in islice(entries, batch_size * concurrency)]
+        if not window:
+            return
+        print(f"Cleaning {int(window[0][0]) + 1}–{int(window[-1][0]) + 1} ({len(window)} entries)")
+        by_model = {}
+        for entry_id, raw in window:
+            by_model.setdefault(ROUTER.pick(cleaning_difficulty(raw)), []).append((entry_id, raw))
+        batches = [(model, group[i:i + batch_size])
+                   for model, group in by_model.items() for i in range(0, len(group), batch_size)]
+        results = {}
+        for batch_results in await asyncio.gather(*(clean_batch(b, aclient, semaphore, model)
+                                                    for model, b in batches)):
+            results.update(batch_results)
+        for entry_id, _ in window:
+            yield results.get(entry_id)
+
+def report_usage():
+    """Print token usage, cost and cache hit rate for the run"""
+    
+    print(f"📊 {USAGE.summary()}")
+    print(f"🧭 {ROUTER.summary()}")
+    SCHEDULER.report(USAGE.records)
+    if USE_LLM_CACHE:
+        print(f"💾 {get_cache().summary()}")
+
+def write_cleaned(result: Optional[dict], writer: RecordWriter, seen_slugs: set) -> bool:
+    """Write a confident result unless its slug was already written. Returns whether it was confident"""
+    
+    if not result or result.get('confidence', 0) < 50:
+        return False
     
     # Remove duplicates by slug
+    if result['slug'] not in seen_slugs:
+        seen_slugs.add(result['slug'])
+        writer.write(result)
+    return True
+
+def clean_all_data(input_file: str, output_file: str):
+    """Clean all scraped data, streaming records from input to output"""
+    
+    cleaned = 0
     seen_slugs = set()
-    unique = []
-    for club in cleaned:
-        if club['slug'] not in seen_slugs:
-            seen_slugs.add(club['slug'])
-            unique.append(club)
+    with RecordWriter(output_file) as writer:
+        for i, entry in enumerate(read_records(input_file)):
+            print(f"Cleaning {i+1}: {entry.get('name', 'unknown')}")
+            cleaned += write_cleaned(clean_single_entry(entry), writer, seen_slugs)
+    
+    print(f"\nCleaned {writer.count} clubs (removed {cleaned - writer.count} duplicates)")
+    report_usage()
+
+async def clean_all_data_async(input_file: str, output_file: str, aclient=None,
+                               batch_size: int = DEFAULT_BATCH_SIZE, concurrency: int = DEFAULT_CONCURRENCY):
+    """Clean all scraped data with batched, concurrent requests"""
     
-    with open(output_file, 'w') as f:
-        json.dump(unique, f, indent=2)
+    cleaned = 0
+    seen_slugs = set()
+    with RecordWriter(output_file) as writer:
+        async for result in clean_entries_async(read_records(input_file), aclient, batch_size, concurrency):
+            cleaned += write_cleaned(result, writer, seen_slugs)
     
-    print(f"\nCleaned {len(unique)} clubs (removed {len(cleaned) - len(unique)} duplicates)")
+    print(f"\nCleaned {writer.count} clubs (removed {cleaned - writer.count} duplicates)")
+    report_usage()
 
-if __name__ == "__main__":
-    input_path = "data/raw/outscraper-results.json"
-    output_path = "data/cleaned/clubs-cleaned.json"
+def clean_all_data_batch(input_file: str, output_file: str, poll_seconds: float):
+    """Clean all scraped data as one Message Batches job"""
+    
+    entries = list(read_records(input_file))
+    requests = [batch_request(f"entry-{i}", **cleaning_params(entry)) for i, entry in enumerate(entries)]
+    client = get_client()
+    results = run_batch(client, "clean", requests, poll_seconds, USAGE, client.cache, SCHEDULER)
     
-    os.makedirs("data/cleaned", exist_ok=True)
+    # Small-model answers that didn't parse or were invalid go to the large model in a second batch
+    escalated = escalation_requests(ROUTER, requests, results, lambda text: valid_cleaning(parse_json(text)))
+    if escalated:
+        print(f"↗️  Asking {ROUTER.large} about {len(escalated)} entries")
+        answers = run_batch(client, "clean-escalated", escalated, poll_seconds, USAGE, client.cache, SCHEDULER)
+        results.update({custom_id: text for custom_id, text in answers.items() if text is not None})
+    params = {request["custom_id"]: request["params"] for request in requests + escalated}
+    
+    cleaned = 0
+    seen_slugs = set()
+    with RecordWriter(output_file) as writer:
+        for i, entry in enumerate(entries):
+            result = parse_json(results.get(f"entry-{i}"))
+            if result is None:
+                print(f"Failed to parse response for: {entry.get('name', 'unknown')}")
+                client.invalidate(params[f"entry-{i}"])
+            cleaned += write_cleaned(result, writer, seen_slugs)
+    clear_batch("clean")
+    clear_batch("clean-escalated")
+    
+    print(f"\nCleaned {writer.count} clubs (removed {cleaned - writer.count} duplicates)")
+    report_usage()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean raw Outscraper data with Claude")
+    add_io_args(parser, "data/raw/outscraper-results.json", "data/cleaned/clubs-cleaned.json")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Send several entries per request, with requests running concurrently")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help=f"Entries per request in --async mode (default: {DEFAULT_BATCH_SIZE})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Requests in flight in --async mode (default: {DEFAULT_CONCURRENCY})")
+    add_batch_args(parser)
+    add_cache_args(parser)
+    add_scheduler_args(parser)
+    add_routing_args(parser)
+    args = parse_stage_args(parser)
+    USE_LLM_CACHE = not args.no_llm_cache
+    ROUTER.enabled = not args.no_routing
+    SCHEDULER.budget_usd = args.budget_usd
+    SCHEDULER.max_concurrency = SCHEDULER.concurrency = max(1, args.concurrency)
     
-    if os.path.exists(input_path):
-        clean_all_data(input_path, output_path)
+    if input_exists(args.input):
+        output_file = output_path(args.output, "data/cleaned/clubs-cleaned.json")
+        try:
+            if args.batch:
+                clean_all_data_batch(args.input, output_file, args.poll_seconds)
+            elif args.use_async:
+                asyncio.run(clean_all_data_async(args.input, output_file,
+                                                 batch_size=max(1, args.batch_size),
+                                                 concurrency=max(1, args.concurrency)))
+            else:
+                clean_all_data(args.input, output_file)
+        except BudgetExceeded as e:
+            print(f"\n💸 {e}; left {output_file} untouched.")
+            print("   Re-run to resume: finished calls are served from the LLM cache.")
+            report_usage()
+            sys.exit(1)
     else:
-        print(f"Input file not found: {input_path}")
+        print(f"Input file not found: {args.input}")
         print("Run Outscraper first to generate raw data.")
@@ -9,8 +9,10 @@ import json
 import os
 import datetime
 
+from pipeline_io import load_records, stage_path
+
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
-INPUT_FILE = os.path.join(SCRIPT_DIR, "data", "cleaned", "clubs-cleaned.json")
+INPUT_FILE = stage_path(os.path.join(SCRIPT_DIR, "data", "cleaned", "clubs-cleaned.json"))
 OUTPUT_FILE = os.path.join(SCRIPT_DIR, "..", "..", "lib", "data", "scraped-data.ts")
 
 # Valid ClubFeature values from schemas.ts
@@ -32,8 +34,7 @@ def sanitize_string(val):
 
 
 def main():
-    with open(INPUT_FILE, "r") as f:
-        clubs = json.load(f)
+    clubs = load_records(INPUT_FILE)
 
     print(f"📥 Loaded {len(clubs)} clubs")
 
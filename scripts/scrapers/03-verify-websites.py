@@ -3,10 +3,22 @@
 Step 3: Verify websites are active using Crawl4AI
 """
 
-import json
+import argparse
 import asyncio
-import os
-from typing import Optional
+import html
+import re
+import socket
+import time
+from collections import deque
+from contextlib import asynccontextmanager, nullcontext
+from typing import Callable, Iterable, Optional
+from urllib.parse import urlparse
+
+from keyword_matcher import SPORT_KEYWORDS, KeywordMatcher
+from pipeline_io import (
+    RecordWriter, add_io_args, input_exists, output_path, parse_stage_args, read_records,
+)
+from record_reuse import StageReuse
 
 try:
     from crawl4ai import AsyncWebCrawler
@@ -15,6 +27,208 @@ except ImportError:
     HAS_CRAWL4AI = False
     print("Crawl4AI not installed. Run: pip install crawl4ai")
 
+try:
+    import httpx
+    HAS_HTTPX = True
+except ImportError:
+    HAS_HTTPX = False
+
+try:
+    import h2  # noqa: F401 (lets httpx speak HTTP/2)
+    HAS_H2 = True
+except ImportError:
+    HAS_H2 = False
+
+# Everything we look for in a page, matched in one pass over its text
+PAGE_SIGNALS = KeywordMatcher({
+    'relevant': SPORT_KEYWORDS,
+    'contact': ['contact', 'email'],
+    'schedule': ['schedule', 'training', 'practice', 'meetup'],
+}, boundary="substring")
+
+# Verification only looks at the website; bump VERIFY_VERSION when the checks change
+VERIFY_INPUTS = ('website',)
+VERIFY_OUTPUTS = ('website_verification', 'website_verified')
+VERIFY_VERSION = "2"
+
+# Crawls in flight overall, per host, and the pause between requests to one host
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_HOST = 2
+DEFAULT_HOST_DELAY = 1.0
+
+def host_key(url: str) -> str:
+    """The site a URL belongs to, so m.facebook.com and www.facebook.com share a limit"""
+    
+    host = urlparse(url if "//" in url else f"//{url}").hostname or url
+    labels = host.lower().split(".")
+    # Keep three labels for e.g. roundnet.org.uk, where the second-level label is generic
+    keep = 3 if len(labels) > 2 and len(labels[-1]) == 2 and labels[-2] in ("co", "com", "org", "net", "ac") else 2
+    return ".".join(labels[-keep:])
+
+class CrawlLimits:
+    """Caps crawls in flight overall and per host, and spaces out requests to the same host"""
+    
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, per_host: int = DEFAULT_PER_HOST,
+                 host_delay: float = DEFAULT_HOST_DELAY):
+        self.concurrency = concurrency
+        self.per_host = per_host
+        self.host_delay = host_delay
+        self.slots = asyncio.Semaphore(concurrency)
+        self.hosts = {}  # host → (semaphore, time of the last request)
+    
+    @asynccontextmanager
+    async def slot(self, url: str):
+        host = host_key(url)
+        if host not in self.hosts:
+            self.hosts[host] = [asyncio.Semaphore(self.per_host), 0.0]
+        limit = self.hosts[host]
+        # Take the host's slot first, so requests queued behind a busy host don't hold a global one
+        async with limit[0]:
+            while True:
+                wait = limit[1] + self.host_delay - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                await self.slots.acquire()
+                # Another request to this host may have started while we waited for a global slot
+                if limit[1] + self.host_delay <= time.monotonic():
+                    break
+                self.slots.release()
+            limit[1] = time.monotonic()
+            try:
+                yield
+            finally:
+                self.slots.release()
+
+# HTTP probe (tier 1): settles dead links and static pages without a browser
+PROBE_TIMEOUT = 5.0
+PROBE_MAX_BYTES = 1_000_000
+MIN_STATIC_TEXT = 300  # characters of visible text below which a page is probably rendered by JS
+DEAD_STATUSES = (404, 410)
+# Sites that only show content to a browser (login walls, client-side rendering)
+BROWSER_ONLY_HOSTS = ('facebook.com', 'instagram.com')
+USER_AGENT = "Mozilla/5.0 (compatible; RoundnetDirectoryBot/1.0)"
+
+SCRIPT_OR_STYLE = re.compile(r'<(script|style|noscript|template)\b.*?</\1\s*>', re.I | re.S)
+TAG = re.compile(r'<[^>]+>')
+TITLE = re.compile(r'<title[^>]*>(.*?)</title\s*>', re.I | re.S)
+# An empty mount point for a client-side app (React, Vue, Next.js, Gatsby...)
+EMPTY_APP_ROOT = re.compile(r'<div[^>]+id=["\'](?:root|app|__next|___gatsby)["\'][^>]*>\s*</div>', re.I)
+
+def page_text(markup: str) -> str:
+    """The visible text of an HTML page"""
+    
+    text = TAG.sub(" ", SCRIPT_OR_STYLE.sub(" ", markup))
+    return " ".join(html.unescape(text).split())
+
+class WebsiteProbe:
+    """A pooled HTTP client that verifies what it can without a browser
+    
+    check() returns a verification, or None when the page needs the
+    crawler: JS-rendered pages, login walls, timeouts and other
+    inconclusive answers. Connections are kept alive and reused (over
+    HTTP/2 if h2 is installed), and DNS answers are cached per host, so
+    unresolvable domains fail once and every later URL on them instantly.
+    """
+    
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, timeout: float = PROBE_TIMEOUT):
+        self.http = httpx.AsyncClient(
+            http2=HAS_H2,
+            follow_redirects=True,
+            timeout=timeout,
+            headers={"User-Agent": USER_AGENT},
+            limits=httpx.Limits(max_connections=2 * concurrency, max_keepalive_connections=concurrency),
+        )
+        self.resolved = {}  # hostname → whether it resolves
+        self.settled = 0
+        self.passed_on = 0
+    
+    async def __aenter__(self):
+        return self
+    
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+    
+    async def resolves(self, hostname: str) -> bool:
+        if hostname not in self.resolved:
+            try:
+                await asyncio.get_running_loop().getaddrinfo(hostname, 443, type=socket.SOCK_STREAM)
+                self.resolved[hostname] = True
+            except socket.gaierror:
+                self.resolved[hostname] = False
+        return self.resolved[hostname]
+    
+    async def check(self, url: str, limits: Optional[CrawlLimits] = None) -> Optional[dict]:
+        result = await self._check(url, limits)
+        if result:
+            self.settled += 1
+            result["checked_by"] = "probe"
+        else:
+            self.passed_on += 1
+        return result
+    
+    async def _check(self, url: str, limits: Optional[CrawlLimits]) -> Optional[dict]:
+        target = url if "//" in url else f"https://{url}"
+        if host_key(target) in BROWSER_ONLY_HOSTS:
+            return None
+        hostname = urlparse(target).hostname
+        if not hostname:
+            return {"url": url, "status": "error", "is_relevant": False, "error": "Invalid URL"}
+        try:
+            resolves = await self.resolves(hostname)
+        except (ValueError, OSError) as e:
+            # Malformed hostnames ("www..club.de", labels over 63 characters) raise UnicodeError
+            return {"url": url, "status": "error", "is_relevant": False, "error": f"Invalid hostname: {e}"}
+        if not resolves:
+            return {"url": url, "status": "error", "is_relevant": False, "error": f"{hostname} does not resolve"}
+        
+        try:
+            async with limits.slot(target) if limits else nullcontext():
+                async with self.http.stream("GET", target) as response:
+                    content_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+                    body = b""
+                    if response.status_code == 200 and content_type in ("text/html", "application/xhtml+xml"):
+                        async for chunk in response.aiter_bytes():
+                            body += chunk
+                            if len(body) >= PROBE_MAX_BYTES:
+                                break
+        except (httpx.TooManyRedirects, httpx.InvalidURL, httpx.UnsupportedProtocol) as e:
+            return {"url": url, "status": "error", "is_relevant": False, "error": str(e)}
+        except httpx.HTTPError:
+            # Timeouts, refused or reset connections, TLS trouble: let the browser try
+            return None
+        
+        probed = {"final_url": str(response.url), "http_status": response.status_code, "content_type": content_type}
+        if response.status_code in DEAD_STATUSES:
+            return {"url": url, "status": "error", "is_relevant": False,
+                    "error": f"HTTP {response.status_code}", **probed}
+        if response.status_code != 200:
+            # 403s and 429s are often bot protection, 5xx may be transient
+            return None
+        if content_type not in ("text/html", "application/xhtml+xml"):
+            # A PDF or image is up, but it's not a club website
+            return {"url": url, "status": "active", "is_relevant": False, "title": "",
+                    "has_contact": False, "has_schedule": False, **probed}
+        
+        try:
+            markup = body.decode(response.charset_encoding or "utf-8", errors="replace")
+        except LookupError:  # a charset Python doesn't know
+            markup = body.decode("utf-8", errors="replace")
+        text = page_text(markup)
+        signals = PAGE_SIGNALS.find(text)
+        if 'relevant' not in signals and (len(text) < MIN_STATIC_TEXT or EMPTY_APP_ROOT.search(markup)):
+            # Probably rendered by JavaScript; only a browser can see what it says
+            return None
+        title = TITLE.search(markup)
+        return {
+            "url": url,
+            "status": "active",
+            "is_relevant": 'relevant' in signals,
+            "title": " ".join(html.unescape(title.group(1)).split()) if title else "",
+            "has_contact": 'contact' in signals,
+            "has_schedule": 'schedule' in signals,
+            **probed,
+        }
+
 async def verify_website(url: str, crawler: 'AsyncWebCrawler') -> dict:
     """Verify a single website and extract relevant info"""
     
@@ -23,18 +237,15 @@ async def verify_website(url: str, crawler: 'AsyncWebCrawler') -> dict:
         
         if result.success:
             # Check if it's actually a roundnet/spikeball related site
-            content_lower = result.markdown.lower() if result.markdown else ""
-            is_relevant = any(term in content_lower for term in [
-                'roundnet', 'spikeball', 'spike ball', 'round net'
-            ])
+            signals = PAGE_SIGNALS.find(result.markdown or "")
             
             return {
                 "url": url,
                 "status": "active",
-                "is_relevant": is_relevant,
+                "is_relevant": 'relevant' in signals,
                 "title": result.metadata.get("title", ""),
-                "has_contact": "contact" in content_lower or "email" in content_lower,
-                "has_schedule": any(term in content_lower for term in ['schedule', 'training', 'practice', 'meetup']),
+                "has_contact": 'contact' in signals,
+                "has_schedule": 'schedule' in signals,
             }
         else:
             return {
@@ -51,53 +262,159 @@ async def verify_website(url: str, crawler: 'AsyncWebCrawler') -> dict:
             "error": str(e)
         }
 
-async def verify_all_websites(clubs: list) -> list:
-    """Verify all club websites"""
+async def check_website(url: str, crawler: Optional['AsyncWebCrawler'], limits: Optional[CrawlLimits] = None,
+                        probe: Optional[WebsiteProbe] = None) -> Optional[dict]:
+    """Verify a website with the HTTP probe, crawling it only if the probe can't tell
     
-    if not HAS_CRAWL4AI:
-        print("Skipping website verification - Crawl4AI not installed")
-        return clubs
+    Returns None if the site needs the crawler and there is none.
+    """
     
-    async with AsyncWebCrawler() as crawler:
-        for i, club in enumerate(clubs):
-            website = club.get('website')
-            if website:
-                print(f"Verifying {i+1}/{len(clubs)}: {website}")
-                result = await verify_website(website, crawler)
-                club['website_verification'] = result
-                
-                # Update verified status
-                if result['status'] == 'active' and result['is_relevant']:
-                    club['website_verified'] = True
-                else:
-                    club['website_verified'] = False
-            else:
-                club['website_verified'] = False
-    
-    return clubs
+    if probe:
+        result = await probe.check(url, limits)
+        if result:
+            return result
+    if crawler is None:
+        return None
+    async with limits.slot(url) if limits else nullcontext():
+        result = await verify_website(url, crawler)
+    result["checked_by"] = "crawler"
+    return result
 
-def main():
-    input_path = "data/cleaned/clubs-cleaned.json"
-    output_path = "data/verified/clubs-verified.json"
+async def verify_club(club: dict, crawler: Optional['AsyncWebCrawler'], limits: Optional[CrawlLimits] = None,
+                      probe: Optional[WebsiteProbe] = None) -> dict:
+    """Verify one club's website and record the outcome on the club"""
     
-    os.makedirs("data/verified", exist_ok=True)
+    website = club.get('website')
+    if website:
+        result = await check_website(website, crawler, limits, probe)
+        if result is None:
+            # Only a browser can tell; leave the club unverified
+            return club
+        club['website_verification'] = result
+        
+        # Update verified status
+        if result['status'] == 'active' and result['is_relevant']:
+            club['website_verified'] = True
+        else:
+            club['website_verified'] = False
+    else:
+        club['website_verified'] = False
     
-    if not os.path.exists(input_path):
-        print(f"Input file not found: {input_path}")
-        return
+    return club
+
+async def verify_all_websites(clubs: Iterable, on_verified: Optional[Callable] = None,
+                              reuse: Optional[StageReuse] = None,
+                              limits: Optional[CrawlLimits] = None, use_probe: bool = True) -> list:
+    """Verify all club websites, several at a time
     
-    with open(input_path, 'r') as f:
-        clubs = json.load(f)
+    Clubs are handed over in input order. With `on_verified`, each club is
+    handed over as soon as it and every club before it are verified, and
+    only a bounded window is kept in memory (the returned list is empty).
+    With `reuse`, clubs whose website hasn't changed since the last run
+    keep their previous verification. `limits` sets the concurrency and
+    per-host politeness (CrawlLimits defaults if omitted). Unless
+    `use_probe` is off (or httpx is missing), each site gets a plain HTTP
+    request first and is only crawled if that can't settle it. Without
+    Crawl4AI only the probe runs; the sites it can't settle are left
+    unverified and listed at the end.
+    """
     
-    print(f"Verifying {len(clubs)} club websites...")
-    verified_clubs = asyncio.run(verify_all_websites(clubs))
+    verified = []
+    needs_browser = []
+    probing = use_probe and HAS_HTTPX
     
-    with open(output_path, 'w') as f:
-        json.dump(verified_clubs, f, indent=2)
+    def emit(club: dict):
+        if on_verified:
+            on_verified(club)
+        else:
+            verified.append(club)
+    
+    if not HAS_CRAWL4AI and not probing:
+        print("Skipping website verification - Crawl4AI not installed and no HTTP probe")
+        for club in clubs:
+            if reuse:
+                reuse.reuse(club)
+            emit(club)
+        return verified
+    
+    limits = limits or CrawlLimits()
+    
+    async def check(i: int, club: dict) -> dict:
+        if reuse and reuse.reuse(club):
+            return club
+        if club.get('website'):
+            print(f"Verifying {i+1}: {club['website']}")
+        club = await verify_club(club, crawler, limits, probe)
+        verification = club.get('website_verification')
+        if club.get('website') and verification is None:
+            needs_browser.append(club['website'])
+        # Timeouts, DNS failures and dead sites stay unstamped, to be checked again next run
+        elif reuse and (verification or {}).get('status') != 'error':
+            reuse.computed(club)
+        return club
+    
+    # Clubs are checked concurrently but emitted in order; a slow site holds
+    # back at most `window` clubs behind it
+    window = 8 * limits.concurrency
+    probe = WebsiteProbe(limits.concurrency) if probing else None
+    async with AsyncWebCrawler() if HAS_CRAWL4AI else nullcontext() as crawler, probe or nullcontext():
+        pending = deque()
+        for i, club in enumerate(clubs):
+            pending.append(asyncio.create_task(check(i, club)))
+            if len(pending) >= window:
+                emit(await pending.popleft())
+        while pending:
+            emit(await pending.popleft())
+    
+    if probe:
+        print(f"⚡ HTTP probe settled {probe.settled} websites, {probe.passed_on} needed the crawler"
+              f"{' (HTTP/2)' if HAS_H2 else ''}")
+    elif use_probe:
+        print("HTTP probe skipped - httpx not installed. Run: pip install httpx[http2]")
+    if needs_browser:
+        print(f"🌐 {len(needs_browser)} websites need a browser and were left unverified "
+              f"(pip install crawl4ai, then re-run):")
+        for url in needs_browser:
+            print(f"   {url}")
+    return verified
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify club websites with Crawl4AI")
+    add_io_args(parser, "data/cleaned/clubs-cleaned.json", "data/verified/clubs-verified.json")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Re-verify every club, even if its website is unchanged since the last run")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"Websites crawled at once (default: {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST,
+                        help=f"Websites crawled at once on the same host, e.g. facebook.com (default: {DEFAULT_PER_HOST})")
+    parser.add_argument("--host-delay", type=float, default=DEFAULT_HOST_DELAY,
+                        help=f"Seconds between requests to the same host (default: {DEFAULT_HOST_DELAY:g})")
+    parser.add_argument("--no-probe", action="store_true",
+                        help="Crawl every website in the browser, without trying a plain HTTP request first")
+    args = parse_stage_args(parser)
+    
+    if not input_exists(args.input):
+        print(f"Input file not found: {args.input}")
+        return
+    
+    print("Verifying club websites...")
+    out = output_path(args.output, "data/verified/clubs-verified.json")
+    reuse = StageReuse("verify", VERIFY_INPUTS, VERIFY_OUTPUTS,
+                       None if args.no_reuse else out, VERIFY_VERSION)
+    active = 0
+    with RecordWriter(out) as writer:
+        def on_verified(club: dict):
+            nonlocal active
+            writer.write(club)
+            active += 1 if club.get('website_verified') else 0
+        
+        limits = CrawlLimits(max(1, args.concurrency), max(1, args.per_host), max(0.0, args.host_delay))
+        asyncio.run(verify_all_websites(read_records(args.input), on_verified, reuse, limits,
+                                        use_probe=not args.no_probe))
     
     # Stats
-    active = sum(1 for c in verified_clubs if c.get('website_verified'))
-    print(f"\nVerification complete: {active}/{len(verified_clubs)} websites active and relevant")
+    print(f"\nVerification complete: {active}/{writer.count} websites active and relevant")
+    print(f"♻️  Verifications: {reuse.summary()}")
 
 if __name__ == "__main__":
     main()
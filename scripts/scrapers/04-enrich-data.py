@@ -3,19 +3,41 @@
 Step 4: Enrich club data with additional information
 """
 
-import json
-import os
+import argparse
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+
 from anthropic import Anthropic
 
-client = Anthropic()
+from llm_batches import add_batch_args, batch_request, clear_batch, parse_json, run_batch
+from llm_cache import CachedClient, add_cache_args, get_cache
+from llm_prompts import UsageMeter, cached_system, compact_json, project
+from llm_routing import ModelRouter, add_routing_args, escalation_requests, non_latin
+from llm_scheduler import BudgetExceeded, LLMScheduler, ScheduledClient, add_scheduler_args
+from pipeline_io import (
+    RecordWriter, add_io_args, input_exists, output_path, parse_stage_args, read_records,
+)
+from record_reuse import StageReuse
 
-ENRICHMENT_PROMPT = """You are enriching data for a Roundnet/Spikeball club directory.
+# Calls go through the shared response cache (set client.cache = None to bypass it);
+# cache misses go through SCHEDULER (rate limits, retries, budget), the only retry policy
+SCHEDULER = LLMScheduler("enrich", max_concurrency=1)
+client = CachedClient(ScheduledClient(Anthropic(max_retries=0), SCHEDULER), get_cache())
 
-Given this club data and website content:
+# Token usage of every call, reported at the end of a run
+USAGE = UsageMeter("enrich")
 
-Club: {club_data}
+# Easy clubs go to the small model; see enrichment_difficulty(). Its invalid
+# answers are asked again of the large one.
+ROUTER = ModelRouter("enrich")
+LONG_CONTENT = 1000  # characters of website content
+LEVELS = ("all_levels", "beginners", "intermediate", "competitive")
 
-Website content (if available): {website_content}
+# Static instructions go in a cached system prompt; the user message is just the data
+ENRICHMENT_PROMPT = """You are enriching data for a Roundnet/Spikeball club directory.
+
+The user message has the club's data (JSON) and its website content, if available.
 
 Enrich the data with:
 1. trainingSchedule: Human-readable training schedule (e.g., "Tuesdays 18:00-20:00, Saturdays 10:00-12:00")
@@ -29,60 +51,184 @@ Enrich the data with:
 9. equipment: Equipment info - do they provide nets/balls?
 10. pricing: Membership or session pricing if mentioned
 
-Return only valid JSON with these fields added to the original data.
+Return only valid JSON with these fields.
 """
 
-def enrich_club(club: dict, website_content: str = "") -> dict:
-    """Enrich a single club with additional data"""
+# The club fields the prompt sees (not slugs, coordinates, photos or earlier stages' output)
+CLUB_FIELDS = ('name', 'description', 'type', 'address', 'city', 'country', 'website', 'email',
+               'phone', 'instagram', 'facebook', 'features', 'trainingSchedule', 'memberCount',
+               'foundedYear')
+
+# What the prompt sees that can change the answer, and the fields it adds
+ENRICH_INPUTS = CLUB_FIELDS + ('website_verification.content',)
+ENRICHED_FIELDS = ('trainingSchedule', 'memberCount', 'foundedYear', 'additionalFeatures',
+                   'socialMedia', 'contactPerson', 'languages', 'level', 'equipment', 'pricing')
+
+def enrichment_difficulty(club: dict, website_content: str = "") -> list:
+    """Why a club needs the large model (empty if the small one will do)"""
+    
+    reasons = []
+    if len(website_content) > LONG_CONTENT:
+        reasons.append("long website content")
+    if non_latin(club.get('name'), club.get('description'), website_content[:2000]):
+        reasons.append("non-Latin text")
+    return reasons
+
+def valid_enrichment(text: Optional[str]) -> bool:
+    """Whether an answer parses and has the expected shape"""
+    
+    answer = parse_json(text)
+    if not isinstance(answer, dict) or not any(field in answer for field in ENRICHED_FIELDS):
+        return False
+    if answer.get('level') not in (None, *LEVELS):
+        return False
+    return all(answer.get(field) is None or isinstance(answer[field], int)
+               for field in ('memberCount', 'foundedYear'))
+
+def enrichment_params(club: dict, website_content: str = "") -> dict:
+    """The messages.create arguments for enriching one club, on the model it is routed to"""
     
-    response = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=1024,
-        messages=[
+    return {
+        "model": ROUTER.pick(enrichment_difficulty(club, website_content)),
+        "max_tokens": 1024,
+        "system": cached_system(ENRICHMENT_PROMPT),
+        "messages": [
             {
                 "role": "user",
-                "content": ENRICHMENT_PROMPT.format(
-                    club_data=json.dumps(club, indent=2),
-                    website_content=website_content[:2000] if website_content else "Not available"
-                )
+                "content": (f"Club: {compact_json(project(club, CLUB_FIELDS))}\n\n"
+                            f"Website content: {website_content[:2000] if website_content else 'Not available'}")
             }
-        ]
-    )
+        ],
+    }
+
+def merge_enrichment(club: dict, text: Optional[str]) -> dict:
+    """Merge Claude's JSON answer into the club (unchanged if there is none)"""
     
-    try:
-        enriched = json.loads(response.content[0].text)
-        return {**club, **enriched}
-    except json.JSONDecodeError:
-        return club
+    enriched = parse_json(text)
+    return {**club, **enriched} if isinstance(enriched, dict) else club
 
-def main():
-    input_path = "data/verified/clubs-verified.json"
-    output_path = "data/enriched/clubs-enriched.json"
+def request_enrichment(params: dict) -> str:
+    """Send one enrichment request, returning the answer's text"""
+    
+    started = time.monotonic()
+    response = client.messages.create(**params)
+    USAGE.observe(response, started=started)
+    text = response.content[0].text
+    if not isinstance(parse_json(text), dict):
+        client.invalidate(params)
+    return text
+
+def enrich_club(club: dict, website_content: str = "") -> dict:
+    """Enrich a single club with additional data"""
     
-    os.makedirs("data/enriched", exist_ok=True)
+    params = enrichment_params(club, website_content)
+    text = request_enrichment(params)
+    escalated = None if valid_enrichment(text) else ROUTER.escalate(params)
+    if escalated:
+        print(f"   ↗️  Asking {ROUTER.large} instead")
+        text = request_enrichment(escalated)
+    return merge_enrichment(club, text)
+
+def get_website_content(club: dict) -> str:
+    """Website content if verification was done"""
     
-    if not os.path.exists(input_path):
-        print(f"Input file not found: {input_path}")
-        return
+    return (club.get('website_verification') or {}).get('content') or ""
+
+def stamp(club: dict, enriched: dict, reuse: StageReuse) -> dict:
+    """Record the fingerprint of a freshly enriched club"""
     
-    with open(input_path, 'r') as f:
-        clubs = json.load(f)
+    # Unparseable answers come back unchanged; leave those unstamped to retry next run.
+    # The answer can fill input fields (trainingSchedule...), so hash the club as it was sent
+    if enriched is not club:
+        reuse.computed(enriched, source=club)
+    return enriched
+
+def enrich_clubs(clubs: Iterable, reuse: StageReuse) -> Iterator[dict]:
+    """Enrich clubs one call at a time, yielding each as it is done"""
     
-    enriched = []
     for i, club in enumerate(clubs):
-        print(f"Enriching {i+1}/{len(clubs)}: {club.get('name', 'unknown')}")
-        
-        # Get website content if verification was done
-        website_content = ""
-        if club.get('website_verification', {}).get('content'):
-            website_content = club['website_verification']['content']
-        
-        enriched.append(enrich_club(club, website_content))
-    
-    with open(output_path, 'w') as f:
-        json.dump(enriched, f, indent=2)
-    
-    print(f"\nEnriched {len(enriched)} clubs")
+        if reuse.reuse(club):
+            yield club
+            continue
+        print(f"Enriching {i+1}: {club.get('name', 'unknown')}")
+        yield stamp(club, enrich_club(club, get_website_content(club)), reuse)
+
+def enrich_clubs_batch(clubs: Iterable, reuse: StageReuse, poll_seconds: float) -> list:
+    """Enrich every club that needs it in one Message Batches job"""
+    
+    clubs = list(clubs)
+    pending = {f"club-{i}": club for i, club in enumerate(clubs) if not reuse.reuse(club)}
+    requests = [batch_request(custom_id, **enrichment_params(club, get_website_content(club)))
+                for custom_id, club in pending.items()]
+    results = run_batch(client, "enrich", requests, poll_seconds, USAGE, client.cache, SCHEDULER)
+    
+    # Invalid small-model answers go to the large model in a second batch
+    escalated = escalation_requests(ROUTER, requests, results, valid_enrichment)
+    if escalated:
+        print(f"↗️  Asking {ROUTER.large} about {len(escalated)} clubs")
+        answers = run_batch(client, "enrich-escalated", escalated, poll_seconds, USAGE, client.cache, SCHEDULER)
+        results.update({custom_id: text for custom_id, text in answers.items() if text is not None})
+    params = {request["custom_id"]: request["params"] for request in requests + escalated}
+    
+    for custom_id in params:
+        club = pending[custom_id]
+        merged = merge_enrichment(club, results.get(custom_id))
+        if merged is club:
+            client.invalidate(params[custom_id])
+        pending[custom_id] = stamp(club, merged, reuse)
+    return [pending.get(f"club-{i}", club) for i, club in enumerate(clubs)]
+
+def report_usage():
+    """Print token usage, cost and cache hit rate for the run"""
+    
+    print(f"📊 {USAGE.summary()}")
+    print(f"🧭 {ROUTER.summary()}")
+    SCHEDULER.report(USAGE.records)
+    if client.cache:
+        print(f"💾 {client.cache.summary()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Enrich club data with Claude")
+    add_io_args(parser, "data/verified/clubs-verified.json", "data/enriched/clubs-enriched.json")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Re-enrich every club, even if its data is unchanged since the last run")
+    add_batch_args(parser)
+    add_cache_args(parser)
+    add_scheduler_args(parser)
+    add_routing_args(parser)
+    args = parse_stage_args(parser)
+    if args.no_llm_cache:
+        client.cache = None
+    ROUTER.enabled = not args.no_routing
+    SCHEDULER.budget_usd = args.budget_usd
+    
+    if not input_exists(args.input):
+        print(f"Input file not found: {args.input}")
+        return
+    
+    out = output_path(args.output, "data/enriched/clubs-enriched.json")
+    reuse = StageReuse("enrich", ENRICH_INPUTS, ENRICHED_FIELDS,
+                       None if args.no_reuse else out, ENRICHMENT_PROMPT)
+    clubs = read_records(args.input)
+    try:
+        if args.batch:
+            enriched = enrich_clubs_batch(clubs, reuse, args.poll_seconds)
+        else:
+            enriched = enrich_clubs(clubs, reuse)
+        with RecordWriter(out) as writer:
+            for club in enriched:
+                writer.write(club)
+    except BudgetExceeded as e:
+        print(f"\n💸 {e}; left {out} untouched.")
+        print("   Re-run to resume: finished calls are served from the LLM cache.")
+        report_usage()
+        sys.exit(1)
+    if args.batch:
+        clear_batch("enrich")
+        clear_batch("enrich-escalated")
+    
+    print(f"\nEnriched {writer.count} clubs ({reuse.summary()})")
+    report_usage()
 
 if __name__ == "__main__":
     main()
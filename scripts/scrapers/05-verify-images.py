@@ -3,14 +3,41 @@
 Step 5: Verify and categorize images using Claude Vision
 """
 
+import argparse
 import json
-import os
 import base64
+import sys
+import time
+from typing import Iterable, Iterator, Optional
+
 import httpx
 from anthropic import Anthropic
 
-client = Anthropic()
+from llm_batches import add_batch_args, batch_request, clear_batch, parse_json, run_batch
+from llm_cache import CachedClient, add_cache_args, get_cache
+from llm_prompts import UsageMeter, cached_system
+from llm_routing import SMALL_VISION_MODEL, ModelRouter, add_routing_args, escalation_requests
+from llm_scheduler import BudgetExceeded, LLMScheduler, ScheduledClient, add_scheduler_args
+from pipeline_io import (
+    RecordWriter, add_io_args, input_exists, output_path, parse_stage_args, read_records,
+)
+from record_reuse import StageReuse
+
+# Calls go through the shared response cache (set client.cache = None to bypass it);
+# cache misses go through SCHEDULER (rate limits, retries, budget), the only retry policy
+SCHEDULER = LLMScheduler("images", max_concurrency=1)
+client = CachedClient(ScheduledClient(Anthropic(max_retries=0), SCHEDULER), get_cache())
+
+# Token usage of every call (one record per image), reported at the end of a run
+USAGE = UsageMeter("images")
 
+# Small images (logos, thumbnails) go to a small vision model; its invalid
+# answers are asked again of the large one
+ROUTER = ModelRouter("images", small=SMALL_VISION_MODEL)
+LARGE_IMAGE_BYTES = 250_000
+IMAGE_TYPES = ("action_shot", "team_photo", "equipment", "venue", "logo", "event", "other")
+
+# Sent as a cached system prompt; the user message is just the image
 IMAGE_ANALYSIS_PROMPT = """Analyze this image for a Roundnet/Spikeball club directory.
 
 Determine:
@@ -23,97 +50,232 @@ Determine:
 Return only valid JSON.
 """
 
+MAX_PHOTOS = 5  # Limit to 5 images per club
+
+# Only the first MAX_PHOTOS photos are analysed, so only they decide the result
+IMAGE_INPUTS = ('photos',)
+IMAGE_OUTPUTS = ('verified_images',)
+
+def analysed_photos(club: dict) -> dict:
+    """The part of a club the analysis reads, for its fingerprint"""
+    
+    return {'photos': (club.get('photos') or [])[:MAX_PHOTOS]}
+
+def image_params(image_url: str) -> dict:
+    """The messages.create arguments for analyzing one image (downloads it)"""
+    
+    # Download image
+    response = httpx.get(image_url, timeout=10)
+    if response.status_code != 200:
+        raise ValueError("Failed to download")
+    
+    # Convert to base64
+    image_data = base64.standard_b64encode(response.content).decode("utf-8")
+    media_type = response.headers.get("content-type", "image/jpeg")
+    reasons = ["large image"] if len(response.content) > LARGE_IMAGE_BYTES else []
+    
+    return {
+        "model": ROUTER.pick(reasons),
+        "max_tokens": 512,
+        "system": cached_system(IMAGE_ANALYSIS_PROMPT),
+        "messages": [
+            {
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": image_data,
+                        },
+                    },
+                ],
+            }
+        ],
+    }
+
+def valid_analysis(text: Optional[str]) -> bool:
+    """Whether an answer parses and has the expected shape"""
+    
+    answer = parse_json(text)
+    if not isinstance(answer, dict):
+        return False
+    return (isinstance(answer.get('isRoundnetRelated'), bool)
+            and isinstance(answer.get('usableForDirectory'), bool)
+            and isinstance(answer.get('quality'), (int, float)) and 1 <= answer['quality'] <= 10
+            and answer.get('imageType') in IMAGE_TYPES)
+
+def request_analysis(params: dict) -> str:
+    """Send one image analysis request, returning the answer's text"""
+    
+    started = time.monotonic()
+    result = client.messages.create(**params)
+    USAGE.observe(result, started=started)
+    text = result.content[0].text
+    if not isinstance(parse_json(text), dict):
+        client.invalidate(params)
+    return text
+
 def analyze_image(image_url: str) -> dict:
     """Analyze a single image using Claude Vision"""
     
     try:
-        # Download image
-        response = httpx.get(image_url, timeout=10)
-        if response.status_code != 200:
-            return {"error": "Failed to download", "usableForDirectory": False}
-        
-        # Convert to base64
-        image_data = base64.standard_b64encode(response.content).decode("utf-8")
-        media_type = response.headers.get("content-type", "image/jpeg")
-        
-        # Analyze with Claude Vision
-        result = client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=512,
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "image",
-                            "source": {
-                                "type": "base64",
-                                "media_type": media_type,
-                                "data": image_data,
-                            },
-                        },
-                        {
-                            "type": "text",
-                            "text": IMAGE_ANALYSIS_PROMPT
-                        }
-                    ],
-                }
-            ],
-        )
-        
-        return json.loads(result.content[0].text)
+        params = image_params(image_url)
+        text = request_analysis(params)
+        escalated = None if valid_analysis(text) else ROUTER.escalate(params)
+        if escalated:
+            print(f"   ↗️  Asking {ROUTER.large} instead")
+            text = request_analysis(escalated)
+        return json.loads(text)
         
+    except BudgetExceeded:
+        raise
     except Exception as e:
         return {"error": str(e), "usableForDirectory": False}
 
-def verify_club_images(clubs: list) -> list:
-    """Verify images for all clubs"""
+def pick_images(analyses: list) -> list:
+    """The best usable images from (url, analysis) pairs"""
+    
+    verified = []
+    for photo_url, analysis in analyses:
+        if analysis.get('usableForDirectory'):
+            verified.append({
+                "url": photo_url,
+                **analysis
+            })
+    
+    # Sort by quality and take best 3
+    verified.sort(key=lambda x: x.get('quality', 0), reverse=True)
+    return verified[:3]
+
+def verify_club(club: dict) -> bool:
+    """Verify images for a single club. Returns whether every analysis succeeded"""
+    
+    photos = club.get('photos', [])
+    analyses = [(url, analyze_image(url)) for url in photos[:MAX_PHOTOS]]
+    club['verified_images'] = pick_images(analyses)
+    return not any('error' in analysis for _, analysis in analyses)
+
+def verify_club_images(clubs: Iterable, reuse: Optional[StageReuse] = None) -> Iterator[dict]:
+    """Verify images for all clubs, yielding each club as it is done
+    
+    With `reuse`, clubs whose photos haven't changed since the last run
+    keep their previous results.
+    """
     
     for i, club in enumerate(clubs):
-        photos = club.get('photos', [])
-        if not photos:
-            club['verified_images'] = []
+        if reuse and reuse.reuse(club):
+            yield club
             continue
-        
-        print(f"Analyzing images for {i+1}/{len(clubs)}: {club.get('name', 'unknown')}")
-        
-        verified = []
-        for photo_url in photos[:5]:  # Limit to 5 images per club
-            analysis = analyze_image(photo_url)
-            if analysis.get('usableForDirectory'):
-                verified.append({
-                    "url": photo_url,
-                    **analysis
-                })
-        
-        # Sort by quality and take best 3
-        verified.sort(key=lambda x: x.get('quality', 0), reverse=True)
-        club['verified_images'] = verified[:3]
+        if club.get('photos'):
+            print(f"Analyzing images for {i+1}: {club.get('name', 'unknown')}")
+        # A failed download or API error leaves the club unstamped, to retry next run
+        if verify_club(club) and reuse:
+            reuse.computed(club)
+        yield club
+
+def verify_club_images_batch(clubs: Iterable, reuse: StageReuse, poll_seconds: float) -> list:
+    """Verify every photo that needs it in one Message Batches job
+    
+    Photos are downloaded up front, since the batch carries the image data.
+    """
+    
+    clubs = list(clubs)
+    pending = [i for i, club in enumerate(clubs) if not reuse.reuse(club)]
+    requests = []
+    analyses = {}  # custom ID → analysis, for photos that never made it into the batch
+    for i in pending:
+        for j, photo_url in enumerate(clubs[i].get('photos', [])[:MAX_PHOTOS]):
+            custom_id = f"club-{i}-photo-{j}"
+            try:
+                requests.append(batch_request(custom_id, **image_params(photo_url)))
+            except Exception as e:
+                analyses[custom_id] = {"error": str(e), "usableForDirectory": False}
+    print(f"Downloaded {len(requests)} images for {len(pending)} clubs")
+    results = run_batch(client, "images", requests, poll_seconds, USAGE, client.cache, SCHEDULER)
     
+    # Invalid small-model answers go to the large model in a second batch
+    escalated = escalation_requests(ROUTER, requests, results, valid_analysis)
+    if escalated:
+        print(f"↗️  Asking {ROUTER.large} about {len(escalated)} images")
+        answers = run_batch(client, "images-escalated", escalated, poll_seconds, USAGE, client.cache, SCHEDULER)
+        results.update({custom_id: text for custom_id, text in answers.items() if text is not None})
+    params_by_id = {request["custom_id"]: request["params"] for request in requests + escalated}
+    
+    for i in pending:
+        club = clubs[i]
+        pairs = []
+        for j, photo_url in enumerate(club.get('photos', [])[:MAX_PHOTOS]):
+            custom_id = f"club-{i}-photo-{j}"
+            analysis = analyses.get(custom_id) or parse_json(results.get(custom_id))
+            if not isinstance(analysis, dict):
+                if custom_id in params_by_id:
+                    client.invalidate(params_by_id[custom_id])
+                analysis = {"error": "No usable batch result", "usableForDirectory": False}
+            pairs.append((photo_url, analysis))
+        club['verified_images'] = pick_images(pairs)
+        if not any('error' in analysis for _, analysis in pairs):
+            reuse.computed(club)
     return clubs
 
-def main():
-    input_path = "data/enriched/clubs-enriched.json"
-    output_path = "data/with-images/clubs-with-images.json"
+def report_usage():
+    """Print token usage, cost and cache hit rate for the run"""
     
-    os.makedirs("data/with-images", exist_ok=True)
+    print(f"📊 {USAGE.summary()}")
+    print(f"🧭 {ROUTER.summary()}")
+    SCHEDULER.report(USAGE.records)
+    if client.cache:
+        print(f"💾 {client.cache.summary()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Verify club images with Claude Vision")
+    add_io_args(parser, "data/enriched/clubs-enriched.json", "data/with-images/clubs-with-images.json")
+    parser.add_argument("--no-reuse", action="store_true",
+                        help="Re-analyse every club's photos, even if unchanged since the last run")
+    add_batch_args(parser)
+    add_cache_args(parser)
+    add_scheduler_args(parser)
+    add_routing_args(parser)
+    args = parse_stage_args(parser)
+    if args.no_llm_cache:
+        client.cache = None
+    ROUTER.enabled = not args.no_routing
+    SCHEDULER.budget_usd = args.budget_usd
     
-    if not os.path.exists(input_path):
-        print(f"Input file not found: {input_path}")
+    if not input_exists(args.input):
+        print(f"Input file not found: {args.input}")
         return
     
-    with open(input_path, 'r') as f:
-        clubs = json.load(f)
-    
-    clubs_with_images = verify_club_images(clubs)
-    
-    with open(output_path, 'w') as f:
-        json.dump(clubs_with_images, f, indent=2)
+    with_images = 0
+    total_images = 0
+    out = output_path(args.output, "data/with-images/clubs-with-images.json")
+    reuse = StageReuse("images", IMAGE_INPUTS, IMAGE_OUTPUTS,
+                       None if args.no_reuse else out, IMAGE_ANALYSIS_PROMPT, analysed_photos)
+    clubs = read_records(args.input)
+    try:
+        if args.batch:
+            clubs = verify_club_images_batch(clubs, reuse, args.poll_seconds)
+        else:
+            clubs = verify_club_images(clubs, reuse)
+        with RecordWriter(out) as writer:
+            for club in clubs:
+                writer.write(club)
+                with_images += 1 if club.get('verified_images') else 0
+                total_images += len(club.get('verified_images', []))
+    except BudgetExceeded as e:
+        print(f"\n💸 {e}; left {out} untouched.")
+        print("   Re-run to resume: finished calls are served from the LLM cache.")
+        report_usage()
+        sys.exit(1)
+    if args.batch:
+        clear_batch("images")
+        clear_batch("images-escalated")
     
     # Stats
-    with_images = sum(1 for c in clubs_with_images if c.get('verified_images'))
-    total_images = sum(len(c.get('verified_images', [])) for c in clubs_with_images)
     print(f"\nImage verification complete: {with_images} clubs with {total_images} verified images")
+    print(f"♻️  Image analyses: {reuse.summary()}")
+    report_usage()
 
 if __name__ == "__main__":
     main()
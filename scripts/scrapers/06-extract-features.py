@@ -3,48 +3,16 @@
 Step 6: Extract and standardize features for filtering
 """
 
-import json
-import os
+import argparse
 
-# Standard features for the directory
-STANDARD_FEATURES = {
-    'beginner_friendly': [
-        'beginner', 'anfänger', 'débutant', 'principiante', 'newbie', 
-        'all levels', 'alle niveaus', 'tous niveaux'
-    ],
-    'equipment_provided': [
-        'equipment', 'ausrüstung', 'équipement', 'nets provided', 
-        'we provide', 'balls available', 'gear'
-    ],
-    'indoor': [
-        'indoor', 'halle', 'salle', 'gym', 'gymnasium', 'sports hall',
-        'winter', 'covered'
-    ],
-    'outdoor': [
-        'outdoor', 'park', 'beach', 'strand', 'plage', 'grass', 
-        'summer', 'open air'
-    ],
-    'coaching': [
-        'coach', 'trainer', 'training', 'lessons', 'instruction',
-        'learn', 'technique', 'skills'
-    ],
-    'tournaments': [
-        'tournament', 'turnier', 'tournoi', 'competition', 'competitive',
-        'league', 'championship', 'ranked'
-    ],
-    'weekly_meetups': [
-        'weekly', 'wöchentlich', 'hebdomadaire', 'regular', 'every week',
-        'meetup', 'session', 'practice'
-    ],
-    'youth_program': [
-        'youth', 'kids', 'children', 'junior', 'kinder', 'jeunes',
-        'school', 'under 18'
-    ],
-    'wheelchair_accessible': [
-        'accessible', 'wheelchair', 'disability', 'barrier-free',
-        'rollstuhl', 'handicap'
-    ]
-}
+from keyword_matcher import FEATURE_KEYWORDS, KeywordMatcher
+from pipeline_io import (
+    RecordWriter, add_io_args, input_exists, output_path, parse_stage_args, read_records, stage_path,
+)
+
+# Standard features for the directory (keyword lists live in keyword_matcher)
+STANDARD_FEATURES = FEATURE_KEYWORDS
+MATCHER = KeywordMatcher(STANDARD_FEATURES, boundary="substring")
 
 def extract_features(club: dict) -> list:
     """Extract standardized features from club data"""
@@ -55,13 +23,11 @@ def extract_features(club: dict) -> list:
         str(club.get('trainingSchedule', '')),
         str(club.get('additionalFeatures', '')),
         str(club.get('equipment', '')),
-    ]).lower()
+    ])
     
     features = set(club.get('features', []))
     
-    for feature, keywords in STANDARD_FEATURES.items():
-        if any(keyword in text_to_search for keyword in keywords):
-            features.add(feature)
+    features |= MATCHER.find(text_to_search)
     
     # Infer some features
     if club.get('trainingSchedule'):
@@ -70,32 +36,27 @@ def extract_features(club: dict) -> list:
     return list(features)
 
 def main():
-    input_path = "data/with-images/clubs-with-images.json"
-    output_path = "data/with-features/clubs-with-features.json"
-    
-    os.makedirs("data/with-features", exist_ok=True)
+    parser = argparse.ArgumentParser(description="Extract standardized club features")
+    add_io_args(parser, "data/with-images/clubs-with-images.json", "data/with-features/clubs-with-features.json")
+    args = parse_stage_args(parser)
+    input_path = args.input
     
-    if not os.path.exists(input_path):
+    if not input_exists(input_path):
         # Try earlier stage
-        input_path = "data/enriched/clubs-enriched.json"
-        if not os.path.exists(input_path):
+        input_path = stage_path("data/enriched/clubs-enriched.json")
+        if not input_exists(input_path):
             print(f"Input file not found")
             return
     
-    with open(input_path, 'r') as f:
-        clubs = json.load(f)
-    
-    for club in clubs:
-        club['features'] = extract_features(club)
-    
-    with open(output_path, 'w') as f:
-        json.dump(clubs, f, indent=2)
-    
-    # Feature stats
     feature_counts = {}
-    for club in clubs:
-        for feature in club.get('features', []):
-            feature_counts[feature] = feature_counts.get(feature, 0) + 1
+    with RecordWriter(output_path(args.output, "data/with-features/clubs-with-features.json")) as writer:
+        for club in read_records(input_path):
+            club['features'] = extract_features(club)
+            writer.write(club)
+            
+            # Feature stats
+            for feature in club['features']:
+                feature_counts[feature] = feature_counts.get(feature, 0) + 1
     
     print("Feature distribution:")
     for feature, count in sorted(feature_counts.items(), key=lambda x: -x[1]):
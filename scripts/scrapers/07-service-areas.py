@@ -3,15 +3,20 @@
 Step 7: Map clubs to cities and generate service areas
 """
 
-import json
-import os
+import argparse
 from collections import defaultdict
+from typing import Iterable
+
+from pipeline_io import (
+    RecordWriter, add_io_args, input_exists, parse_stage_args, read_records, stage_path,
+    write_records,
+)
 
 def slugify(text: str) -> str:
     """Convert text to URL-friendly slug"""
     return text.lower().replace(' ', '-').replace('ü', 'u').replace('ö', 'o').replace('ä', 'a').replace('é', 'e').replace('è', 'e').replace('ñ', 'n')
 
-def generate_service_areas(clubs: list) -> dict:
+def generate_service_areas(clubs: Iterable) -> dict:
     """Generate countries and cities from club data"""
     
     countries = {}
@@ -74,35 +79,34 @@ def get_flag(country_code: str) -> str:
     return flags.get(country_code, '🏳️')
 
 def main():
-    input_path = "data/with-features/clubs-with-features.json"
+    parser = argparse.ArgumentParser(description="Generate countries and cities from club data")
+    add_io_args(parser, "data/with-features/clubs-with-features.json", "data/final/clubs.json")
+    args = parse_stage_args(parser)
+    input_path = args.input
     
-    if not os.path.exists(input_path):
-        input_path = "data/enriched/clubs-enriched.json"
-        if not os.path.exists(input_path):
+    if not input_exists(input_path):
+        input_path = stage_path("data/enriched/clubs-enriched.json")
+        if not input_exists(input_path):
             print(f"Input file not found")
             return
     
-    with open(input_path, 'r') as f:
-        clubs = json.load(f)
-    
-    service_areas = generate_service_areas(clubs)
+    # Stream clubs through to data/final while aggregating countries/cities
+    with RecordWriter(args.output or stage_path("data/final/clubs.json")) as writer:
+        def passthrough():
+            for club in read_records(input_path):
+                writer.write(club)
+                yield club
+        
+        service_areas = generate_service_areas(passthrough())
     
     # Save service areas
-    os.makedirs("data/final", exist_ok=True)
-    
-    with open("data/final/countries.json", 'w') as f:
-        json.dump(service_areas['countries'], f, indent=2)
-    
-    with open("data/final/cities.json", 'w') as f:
-        json.dump(service_areas['cities'], f, indent=2)
-    
-    with open("data/final/clubs.json", 'w') as f:
-        json.dump(clubs, f, indent=2)
+    write_records(stage_path("data/final/countries.json"), service_areas['countries'])
+    write_records(stage_path("data/final/cities.json"), service_areas['cities'])
     
     print(f"Generated service areas:")
     print(f"  Countries: {len(service_areas['countries'])}")
     print(f"  Cities: {len(service_areas['cities'])}")
-    print(f"  Clubs: {len(clubs)}")
+    print(f"  Clubs: {writer.count}")
 
 if __name__ == "__main__":
     main()
@@ -4,20 +4,18 @@ Step 8: Import final data into the Next.js app data provider
 """
 
 import json
-import os
+
+from pipeline_io import input_exists, load_records, stage_path
+
+FINAL_FILES = tuple(stage_path(path) for path in
+                    ("data/final/countries.json", "data/final/cities.json", "data/final/clubs.json"))
+OUTPUT_FILE = "../../lib/data/scraped-data.ts"
 
 def generate_typescript_data():
     """Generate TypeScript data file for the app"""
     
     # Load final data
-    with open("data/final/countries.json", 'r') as f:
-        countries = json.load(f)
-    
-    with open("data/final/cities.json", 'r') as f:
-        cities = json.load(f)
-    
-    with open("data/final/clubs.json", 'r') as f:
-        clubs = json.load(f)
+    countries, cities, clubs = (load_records(path) for path in FINAL_FILES)
     
     # Generate TypeScript
     ts_content = '''// Auto-generated from scraping pipeline
@@ -42,7 +40,7 @@ export const scrapedClubs: Club[] = {clubs};
     )
     
     # Write to lib/data
-    output_path = "../../lib/data/scraped-data.ts"
+    output_path = OUTPUT_FILE
     with open(output_path, 'w') as f:
         f.write(ts_content)
     
@@ -57,14 +55,8 @@ export const scrapedClubs: Club[] = {clubs};
     print("3. Test locally with npm run dev")
 
 def main():
-    required_files = [
-        "data/final/countries.json",
-        "data/final/cities.json", 
-        "data/final/clubs.json"
-    ]
-    
-    for f in required_files:
-        if not os.path.exists(f):
+    for f in FINAL_FILES:
+        if not input_exists(f):
             print(f"Missing: {f}")
             print("Run the previous steps first.")
             return
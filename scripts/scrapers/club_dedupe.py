@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Fuzzy duplicate detection for cleaned clubs.
+
+Exact slug matching misses "Roundnet Berlin e.V." vs "Roundnet Berlin"
+and wrongly collapses different clubs whose names slugify the same way in
+different cities. Instead, clubs are compared pairwise — but only within
+blocks, so the work stays near-linear:
+
+- a lat/lon grid (each club is compared with its own and the 8 adjacent cells)
+- the city, for clubs without coordinates (compared with every club there)
+- the Google place ID
+
+Each candidate pair is scored on name similarity, phone, website domain
+and distance; pairs above MATCH_THRESHOLD are merged (union-find, so
+chains of matches form one cluster). The most complete record of a
+cluster is kept and filled in from the others; what was folded into it
+is reported in the stats, not in the record. Finally, distinct clubs that
+still share a slug get the city (or a number) appended so every club URL
+stays unique.
+"""
+
+import math
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+from typing import Optional
+from urllib.parse import urlparse
+
+from keyword_matcher import SPORT_KEYWORDS, fold
+
+CELL_DEG = 0.05           # grid cell size (~5 km north-south)
+MATCH_THRESHOLD = 0.85
+NEAR_KM = 0.3             # closer than this counts as the same spot
+FAR_KM = 2.0              # further than this earns no location credit
+
+# Weights of the signals; a signal missing on either side is left out
+WEIGHTS = {"name": 0.6, "phone": 0.2, "website": 0.2, "distance": 0.2}
+
+# Legal forms and filler words that don't distinguish one club from another
+NAME_STOPWORDS = {
+    "e", "v", "ev", "asbl", "vzw", "ry", "association", "associazione", "asociacion",
+    "verein", "club", "klub", "team", "the",
+}
+# Words in nearly every club name; they alone don't identify a club
+SPORT_TOKENS = {token for keyword in SPORT_KEYWORDS for token in re.split(r"\W+", keyword) if token}
+
+
+def name_tokens(name: str) -> list:
+    tokens = re.sub(r"[^\w]+", " ", fold(name or "")).split()
+    meaningful = [t for t in tokens if t not in NAME_STOPWORDS]
+    # "Roundnet Club" and "Roundnet Team" differ only in their filler words
+    if all(t in SPORT_TOKENS for t in meaningful):
+        return tokens
+    return meaningful
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Blend of token overlap and character similarity, 0..1."""
+    ta, tb = name_tokens(a), name_tokens(b)
+    if not ta or not tb:
+        return 0.0
+    jaccard = len(set(ta) & set(tb)) / len(set(ta) | set(tb))
+    chars = SequenceMatcher(None, " ".join(sorted(ta)), " ".join(sorted(tb))).ratio()
+    return (jaccard + chars) / 2
+
+
+def normalize_phone(phone: Optional[str]) -> str:
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-9:] if len(digits) >= 6 else ""
+
+
+def website_domain(url: Optional[str]) -> str:
+    if not url:
+        return ""
+    host = urlparse(url if "://" in url else f"http://{url}").netloc.lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+def distance_km(a: dict, b: dict) -> Optional[float]:
+    if None in (a.get("latitude"), a.get("longitude"), b.get("latitude"), b.get("longitude")):
+        return None
+    lat1, lon1, lat2, lon2 = map(math.radians, (a["latitude"], a["longitude"], b["latitude"], b["longitude"]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 6371 * 2 * math.asin(math.sqrt(h))
+
+
+def match_score(a: dict, b: dict) -> float:
+    """How likely two clubs are the same, 0..1."""
+    if a.get("placeId") and a.get("placeId") == b.get("placeId"):
+        return 1.0
+
+    signals = {"name": name_similarity(a.get("name"), b.get("name"))}
+    pa, pb = normalize_phone(a.get("phone")), normalize_phone(b.get("phone"))
+    if pa and pb:
+        signals["phone"] = float(pa == pb)
+    wa, wb = website_domain(a.get("website")), website_domain(b.get("website"))
+    if wa and wb:
+        signals["website"] = float(wa == wb)
+    km = distance_km(a, b)
+    if km is not None:
+        signals["distance"] = 1.0 if km <= NEAR_KM else max(0.0, 1 - (km - NEAR_KM) / (FAR_KM - NEAR_KM))
+
+    # The same name twice in one city, backed by a shared phone, website or
+    # nearby pin, is one club with several map pins
+    if a.get("citySlug") and a.get("citySlug") == b.get("citySlug") and \
+            name_tokens(a.get("name")) == name_tokens(b.get("name")) and \
+            any(signals.get(k) for k in ("phone", "website", "distance")):
+        return 1.0
+
+    total = sum(WEIGHTS[k] for k in signals)
+    return sum(WEIGHTS[k] * v for k, v in signals.items()) / total
+
+
+def _has_coords(club: dict) -> bool:
+    return club.get("latitude") is not None and club.get("longitude") is not None
+
+
+def _block_keys(club: dict) -> list:
+    keys = [("city", club.get("countryCode"), club.get("citySlug"))]
+    if _has_coords(club):
+        keys.append(("cell", math.floor(club["latitude"] / CELL_DEG), math.floor(club["longitude"] / CELL_DEG)))
+    if club.get("placeId"):
+        keys.append(("place", club["placeId"]))
+    return keys
+
+
+def candidate_pairs(clubs: list) -> set:
+    """Index pairs (i < j) that share a block or sit in adjacent grid cells."""
+    blocks = defaultdict(list)
+    for i, club in enumerate(clubs):
+        for key in _block_keys(club):
+            blocks[key].append(i)
+
+    pairs = set()
+    for key, members in blocks.items():
+        if key[0] == "city":
+            # Located clubs are already blocked by grid cell
+            pairs.update((i, j) for i, j in combinations(members, 2)
+                         if not (_has_coords(clubs[i]) and _has_coords(clubs[j])))
+            continue
+        pairs.update(combinations(members, 2))
+        if key[0] == "cell":
+            _, row, col = key
+            for dr, dc in ((0, 1), (1, -1), (1, 0), (1, 1)):  # each neighbour pair once
+                for i in members:
+                    for j in blocks.get(("cell", row + dr, col + dc), ()):
+                        pairs.add((min(i, j), max(i, j)))
+    return pairs
+
+
+def _completeness(club: dict) -> int:
+    return sum(1 for v in club.values() if v not in (None, "", [], {}))
+
+
+def merge_cluster(members: list) -> tuple:
+    """Merge (index, club) pairs into the most complete club. Returns (club, merged-in sources)."""
+    primary_index, primary = max(members, key=lambda m: (_completeness(m[1]), -m[0]))
+    merged = dict(primary)
+    provenance = []
+    for _, club in sorted(members, key=lambda m: m[0]):
+        if club is primary:
+            continue
+        for key, value in club.items():
+            if merged.get(key) in (None, "", []) and value not in (None, "", []):
+                merged[key] = value
+        merged["features"] = list(dict.fromkeys((merged.get("features") or []) + (club.get("features") or [])))
+        merged["photos"] = list(dict.fromkeys((merged.get("photos") or []) + (club.get("photos") or [])))[:5]
+        provenance.append({"name": club.get("name"), "slug": club.get("slug"), "placeId": club.get("placeId"),
+                           "score": round(match_score(primary, club), 3)})
+    return merged, provenance
+
+
+def disambiguate_slugs(clubs: list) -> list:
+    """Give distinct clubs that share a slug unique ones. Returns (old, new) slug pairs."""
+    taken = {c["slug"] for c in clubs}
+    seen = set()
+    renamed = []
+    for club in clubs:
+        slug = club["slug"]
+        if slug not in seen:
+            seen.add(slug)
+            continue
+        candidate = f"{slug}-{club['citySlug']}" if club.get("citySlug") else None
+        n = 2
+        while candidate is None or candidate in taken:
+            candidate = f"{slug}-{n}"
+            n += 1
+        club["slug"] = candidate
+        taken.add(candidate)
+        seen.add(candidate)
+        renamed.append((slug, candidate))
+    return renamed
+
+
+def dedupe_clubs(clubs: list, threshold: float = MATCH_THRESHOLD) -> tuple:
+    """Merge duplicate clubs and make slugs unique.
+
+    Returns (clubs, stats) with clubs in first-seen order and stats
+    counting comparisons, merged records and renamed slugs. stats["sources"]
+    lists, per club that absorbed duplicates, the records folded into it.
+    """
+    parent = list(range(len(clubs)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    pairs = candidate_pairs(clubs)
+    for i, j in pairs:
+        if match_score(clubs[i], clubs[j]) >= threshold:
+            parent[find(j)] = find(i)
+
+    clusters = defaultdict(list)
+    for i, club in enumerate(clubs):
+        clusters[find(i)].append((i, club))
+
+    result, sources = [], []
+    for _, members in sorted(clusters.items(), key=lambda item: item[1][0][0]):
+        club, provenance = merge_cluster(members)
+        result.append(club)
+        if provenance:
+            sources.append((club, provenance))
+    renamed = disambiguate_slugs(result)
+    return result, {
+        "comparisons": len(pairs),
+        "merged": len(clubs) - len(result),
+        "renamed": renamed,
+        "sources": sources,
+    }
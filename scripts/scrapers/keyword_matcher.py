@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Shared keyword matching for the cleaning, verification and feature stages.
+
+A KeywordMatcher compiles labelled keyword sets (feature → keywords) into
+one combined regex, so classifying a text is a single pass over it no
+matter how many keywords or languages are added. Text and keywords are
+folded the same way (case, diacritics, ß → ss), so "Anfänger",
+"ANFANGER" and "anfanger" all match the same keyword.
+
+Boundary modes:
+
+- "substring"  match anywhere ("park" matches "Stadtpark"); the default,
+               and what the stages use
+- "prefix"     match at the start of a word ("turnier" matches "Turniere",
+               "park" doesn't match "skatepark")
+- "word"       whole words only
+
+A keyword starting with "*" may also end a word, for compounds
+("*halle" matches "Sporthalle", "*turnier" matches "Beachturnier").
+"""
+
+import re
+import unicodedata
+from typing import Dict, Iterable, Union
+
+# Terms that identify the sport itself, shared by the cleaning and verification stages
+SPORT_KEYWORDS = ("roundnet", "round net", "round-net", "spikeball", "spike ball", "spike-ball")
+
+# Standard directory features and the phrases that indicate them
+FEATURE_KEYWORDS = {
+    "beginner_friendly": [
+        "beginner", "anfänger", "débutant", "principiante", "newbie",
+        "all levels", "alle niveaus", "tous niveaux",
+    ],
+    "equipment_provided": [
+        "equipment", "ausrüstung", "équipement", "nets provided",
+        "we provide", "balls available", "gear",
+    ],
+    "indoor": [
+        "indoor", "*halle", "salle", "gym", "gymnasium", "sports hall",
+        "winter", "covered",
+    ],
+    "outdoor": [
+        "outdoor", "park", "beach", "strand", "plage", "grass",
+        "summer", "open air",
+    ],
+    "coaching": [
+        "coach", "trainer", "training", "lessons", "instruction",
+        "learn", "technique", "skills",
+    ],
+    "tournaments": [
+        "tournament", "*turnier", "tournoi", "competition", "competitive",
+        "league", "championship", "ranked",
+    ],
+    "weekly_meetups": [
+        "weekly", "wöchentlich", "hebdomadaire", "regular", "every week",
+        "meetup", "session", "practice", "training", "treningi",
+    ],
+    "youth_program": [
+        "youth", "kids", "children", "junior", "kinder", "jeunes",
+        "school", "under 18",
+    ],
+    "wheelchair_accessible": [
+        "accessible", "wheelchair", "disability", "barrier-free",
+        "rollstuhl", "handicap",
+    ],
+}
+
+BOUNDARIES = {"substring": ("", ""), "prefix": (r"\b", ""), "word": (r"\b", r"\b")}
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip diacritics, for accent-insensitive matching."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+class KeywordMatcher:
+    """Find which labels' keywords occur in a text, in one regex pass.
+
+    `keywords` maps label → keywords; a plain list of keywords uses each
+    keyword as its own label.
+    """
+
+    def __init__(self, keywords: Union[Dict[str, Iterable[str]], Iterable[str]],
+                 boundary: str = "substring"):
+        if boundary not in BOUNDARIES:
+            raise ValueError(f"boundary must be one of {', '.join(BOUNDARIES)}, got {boundary!r}")
+        if not isinstance(keywords, dict):
+            keywords = {kw: [kw] for kw in keywords}
+
+        before, after = BOUNDARIES[boundary]
+        labels_by_keyword, patterns = {}, {}
+        for label, kws in keywords.items():
+            for kw in kws:
+                folded = fold(kw.lstrip("*"))
+                labels_by_keyword.setdefault(folded, set()).add(label)
+                patterns[folded] = f"{'' if kw.startswith('*') else before}{re.escape(folded)}{after}"
+
+        # Longest first, so the alternation prefers "gymnasium" over "gym"
+        alternation = "|".join(patterns[kw] for kw in sorted(patterns, key=len, reverse=True))
+        self.boundary = boundary
+        self.pattern = re.compile(alternation)
+
+        # Matches don't overlap, so a hit on "spike ball" hides a "ball" inside it.
+        # Credit each keyword with the labels of every keyword it contains.
+        self._labels = {}
+        for kw in labels_by_keyword:
+            contained = {m for m in patterns if re.search(patterns[m], kw)}
+            self._labels[kw] = frozenset().union(*(labels_by_keyword[m] for m in contained))
+
+    def find(self, text: str) -> set:
+        """Every label with at least one keyword in `text`."""
+        labels = set()
+        for match in self.pattern.finditer(fold(text)):
+            labels |= self._labels[match.group()]
+        return labels
+
+    def matches(self, text: str) -> bool:
+        """Whether any keyword occurs in `text`."""
+        return self.pattern.search(fold(text)) is not None
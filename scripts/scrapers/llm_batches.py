@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Message Batches mode for the LLM stages (02 clean, 04 enrich, 05 images).
+
+None of those stages is latency-sensitive, so instead of one interactive
+call per item a stage can submit every request as a single batch job:
+batched requests cost half as much and don't count against the
+interactive rate limits. A batch usually finishes within the hour.
+
+The batch ID is persisted to data/batches/<stage>.json as soon as the job
+is created, together with a digest of the requests. Re-running the stage
+with the same requests (after a crash, or while the batch is still
+processing) resumes polling the same batch instead of paying again. The
+stage clears the file once its output is saved.
+
+Results are mapped back to records by custom ID. Point ANTHROPIC_BASE_URL
+at a local fake batch endpoint to exercise this without the real API.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+BATCH_DIR = os.path.join(os.path.dirname(__file__), "data", "batches")
+DEFAULT_POLL_SECONDS = 30
+
+
+def batch_file(stage: str) -> str:
+    return os.path.join(BATCH_DIR, f"{stage}.json")
+
+
+def _digest(requests: list) -> str:
+    canonical = json.dumps(requests, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _load(stage: str) -> dict:
+    path = batch_file(stage)
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def _save(stage: str, state: dict):
+    path = batch_file(stage)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, path)
+
+
+def clear_batch(stage: str):
+    """Forget the stage's batch once its results are safely written."""
+    if os.path.exists(batch_file(stage)):
+        os.remove(batch_file(stage))
+
+
+def batch_request(custom_id: str, **params) -> dict:
+    """One entry of a batch: `params` are what messages.create would get."""
+    return {"custom_id": custom_id, "params": params}
+
+
+def submit_batch(client, stage: str, requests: list) -> str:
+    """Create the batch, or resume the one already submitted for these requests."""
+    digest = _digest(requests)
+    state = _load(stage)
+    if state.get("digest") == digest:
+        print(f"♻️  Resuming batch {state['batch_id']} from {batch_file(stage)}")
+        return state["batch_id"]
+
+    batch = client.messages.batches.create(requests=requests)
+    _save(stage, {"batch_id": batch.id, "digest": digest, "requests": len(requests),
+                  "submitted_at": time.strftime("%Y-%m-%dT%H:%M:%S")})
+    print(f"📦 Submitted batch {batch.id} with {len(requests)} requests")
+    return batch.id
+
+
+def wait_for_batch(client, batch_id: str, poll_seconds: float = DEFAULT_POLL_SECONDS):
+    """Poll until the batch has ended. Returns the final batch object."""
+    while True:
+        batch = client.messages.batches.retrieve(batch_id)
+        counts = batch.request_counts
+        if batch.processing_status == "ended":
+            print(f"✅ Batch {batch_id} ended: {counts.succeeded} succeeded, {counts.errored} errored, "
+                  f"{counts.expired} expired, {counts.canceled} canceled")
+            return batch
+        print(f"⏳ Batch {batch_id}: {counts.processing} processing, "
+              f"{counts.succeeded + counts.errored} done; checking again in {poll_seconds:g}s")
+        time.sleep(poll_seconds)
+
+
+def batch_results(client, batch_id: str, meter=None, scheduler=None,
+                  truncated: Optional[set] = None) -> dict:
+    """custom ID → response text, with None for requests that didn't succeed.
+
+    `meter` (an llm_prompts.UsageMeter) is fed each succeeded message, and
+    `scheduler` (an llm_scheduler.LLMScheduler) is charged for it at batch prices.
+    The IDs of answers cut off at max_tokens are added to `truncated`.
+    """
+    results = {}
+    for entry in client.messages.batches.results(batch_id):
+        if entry.result.type == "succeeded":
+            results[entry.custom_id] = entry.result.message.content[0].text
+            if truncated is not None and getattr(entry.result.message, "stop_reason", None) == "max_tokens":
+                truncated.add(entry.custom_id)
+            if meter:
+                meter.observe(entry.result.message)
+            if scheduler:
+                message = entry.result.message
+                scheduler.record(message.model, message.usage, batch=True)
+        else:
+            results[entry.custom_id] = None
+    return results
+
+
+def run_batch(client, stage: str, requests: list,
+              poll_seconds: float = DEFAULT_POLL_SECONDS, meter=None, cache=None,
+              scheduler=None) -> dict:
+    """Submit (or resume) a stage's batch, wait for it, and return its results by custom ID.
+
+    With `cache` (an llm_cache.LLMCache), requests it already has an answer
+    for are served from it and never submitted; fresh answers are stored,
+    unless they were cut off at max_tokens.
+    With `scheduler`, its budget is checked before submitting and the
+    results are charged to it.
+    """
+    if not requests:
+        return {}
+    results = {}
+    if cache:
+        pending = []
+        for request in requests:
+            text = cache.get(request["params"])
+            if text is None:
+                pending.append(request)
+            else:
+                results[request["custom_id"]] = text
+        if results:
+            print(f"💾 {len(results)}/{len(requests)} requests answered from the LLM cache")
+        requests = pending
+    if not requests:
+        return results
+
+    if scheduler:
+        scheduler.check_budget()
+    batch_id = submit_batch(client, stage, requests)
+    wait_for_batch(client, batch_id, poll_seconds)
+    truncated = set()
+    fresh = batch_results(client, batch_id, meter, scheduler, truncated)
+    failed = sum(1 for text in fresh.values() if text is None)
+    if failed:
+        print(f"⚠️  {failed}/{len(requests)} batch requests did not succeed")
+    if cache:
+        # Truncated answers aren't worth replaying, as in the interactive path
+        for request in requests:
+            if fresh.get(request["custom_id"]) is not None and request["custom_id"] not in truncated:
+                cache.put(request["params"], fresh[request["custom_id"]])
+    results.update(fresh)
+    return results
+
+
+def add_batch_args(parser, default_poll: float = DEFAULT_POLL_SECONDS):
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit every request as one Message Batches job (half price, not interactive)")
+    parser.add_argument("--poll-seconds", type=float, default=default_poll,
+                        help=f"How often to check on the batch (default: {default_poll:g})")
+
+
+def parse_json(text: Optional[str]):
+    """A batch result's JSON, or None if it's missing or unparseable."""
+    if text is None:
+        return None
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return None
@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+On-disk cache of LLM responses shared by the LLM stages (02, 04, 05).
+
+Re-running a stage after a crash, or after an upstream change that
+leaves most records alone, would otherwise pay for every call again.
+Responses are stored in SQLite (data/cache/llm.sqlite), keyed by:
+
+- the model and max_tokens
+- the prompt template version: a hash of the system prompt, so editing
+  a prompt invalidates its answers
+- the canonicalized input messages
+
+CachedClient wraps an Anthropic (or AsyncAnthropic) client, so stages
+keep calling `client.messages.create(...)`. Hits come back with the
+stored text and no usage, since they cost nothing. Batch mode consults
+the cache before submitting; see llm_batches.run_batch.
+
+When the database grows past LLM_CACHE_MAX_MB (default 200), the least
+recently used responses are evicted. A stage that rejects an answer
+(e.g. unparseable JSON) calls invalidate() so it is asked again next time.
+
+Usage:
+    python3 llm_cache.py            # size and entry count
+    python3 llm_cache.py --clear
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional
+
+CACHE_FILE = os.path.join(os.path.dirname(__file__), "data", "cache", "llm.sqlite")
+DEFAULT_MAX_BYTES = int(float(os.environ.get("LLM_CACHE_MAX_MB", 200)) * 1024 * 1024)
+
+
+def _canonical(value) -> str:
+    return json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def cache_key(params: dict) -> str:
+    """Key of a messages.create call: (model, max_tokens, template version, input)."""
+    template = hashlib.sha256(_canonical(params.get("system")).encode()).hexdigest()[:16]
+    parts = [params.get("model"), params.get("max_tokens"), template, params.get("messages")]
+    return hashlib.sha256(_canonical(parts).encode()).hexdigest()
+
+
+def cached_response(text: str) -> SimpleNamespace:
+    """A stand-in for a Message, as much of it as the stages read."""
+    return SimpleNamespace(content=[SimpleNamespace(type="text", text=text)],
+                           usage=None, stop_reason="end_turn", cached=True)
+
+
+class LLMCache:
+    """SQLite-backed response cache with LRU eviction by total size."""
+
+    def __init__(self, path: str = CACHE_FILE, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("""CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY, model TEXT, text TEXT NOT NULL,
+            size INTEGER NOT NULL, created_at REAL NOT NULL, last_used REAL NOT NULL)""")
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+        self._db.commit()
+
+    def get(self, params: dict) -> Optional[str]:
+        key = cache_key(params)
+        with self._lock:
+            row = self._db.execute("SELECT text FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return row[0]
+
+    def put(self, params: dict, text: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                             (cache_key(params), params.get("model"), text, len(text.encode()), now, now))
+            self._evict()
+            self._db.commit()
+
+    def invalidate(self, params: dict):
+        with self._lock:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (cache_key(params),))
+            self._db.commit()
+
+    def _evict(self):
+        """Drop least recently used responses until the cache is back under 90% of max_bytes."""
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = total - int(self.max_bytes * 0.9)
+        freed = 0
+        doomed = []
+        for key, size in self._db.execute("SELECT key, size FROM responses ORDER BY last_used"):
+            doomed.append((key,))
+            freed += size
+            if freed >= target:
+                break
+        self._db.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "entries": entries, "bytes": size}
+
+    def summary(self) -> str:
+        s = self.stats()
+        rate = f"{s['hit_rate']:.0%}" if s["hit_rate"] is not None else "n/a"
+        return (f"LLM cache: {s['hits']} hits, {s['misses']} misses ({rate} hit rate), "
+                f"{s['entries']} entries, {s['bytes'] / 1024 / 1024:.1f} MB")
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+            self._db.commit()
+            self._db.execute("VACUUM")
+
+
+class _CachedMessages:
+    def __init__(self, owner: "CachedClient"):
+        self._owner = owner
+
+    def __getattr__(self, name):
+        # batches, count_tokens, ... go straight to the wrapped client
+        return getattr(self._owner.client.messages, name)
+
+    def create(self, **params):
+        cache = self._owner.cache
+        text = cache.get(params) if cache else None
+        if text is not None:
+            if self._owner.is_async:
+                return _ready(cached_response(text))
+            return cached_response(text)
+        response = self._owner.client.messages.create(**params)
+        if self._owner.is_async:
+            return self._store_async(response, params)
+        self._store(response, params)
+        return response
+
+    async def _store_async(self, pending, params: dict):
+        response = await pending
+        self._store(response, params)
+        return response
+
+    def _store(self, response, params: dict):
+        # Truncated answers aren't worth replaying
+        if self._owner.cache and getattr(response, "stop_reason", None) != "max_tokens":
+            self._owner.cache.put(params, response.content[0].text)
+
+
+async def _ready(value):
+    return value
+
+
+class CachedClient:
+    """Wraps an Anthropic client so messages.create goes through the cache.
+
+    Pass is_async=True for an AsyncAnthropic client (create then returns
+    an awaitable, hit or miss). Set `cache` to None to bypass it.
+    """
+
+    def __init__(self, client, cache: Optional[LLMCache], is_async: bool = False):
+        self.client = client
+        self.cache = cache
+        self.is_async = is_async
+        self.messages = _CachedMessages(self)
+
+    def invalidate(self, params: dict):
+        """Forget a cached answer the caller couldn't use."""
+        if self.cache:
+            self.cache.invalidate(params)
+
+
+def invalidate(client, params: dict):
+    """Forget a cached answer the caller couldn't use (no-op for unwrapped clients)."""
+    if isinstance(client, CachedClient):
+        client.invalidate(params)
+
+
+_cache = None
+
+
+def get_cache() -> LLMCache:
+    """The process-wide cache, opened on first use."""
+    global _cache
+    if _cache is None:
+        _cache = LLMCache()
+    return _cache
+
+
+def add_cache_args(parser):
+    parser.add_argument("--no-llm-cache", action="store_true",
+                        help="Always call the API, ignoring (and not filling) the response cache")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or clear the LLM response cache")
+    parser.add_argument("--clear", action="store_true", help="Delete every cached response")
+    args = parser.parse_args()
+
+    cache = get_cache()
+    if args.clear:
+        cache.clear()
+        print(f"🗑️  Cleared {cache.path}")
+    s = cache.stats()
+    print(f"💾 {cache.path}: {s['entries']} responses, {s['bytes'] / 1024 / 1024:.1f} MB "
+          f"(limit {cache.max_bytes / 1024 / 1024:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
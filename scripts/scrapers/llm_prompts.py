@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Keeping LLM stage prompts small.
+
+- project() keeps only the fields of a record that a prompt actually uses,
+  dropping empty values. A raw Outscraper record carries reviews metadata,
+  photo lists, IDs and links the cleaner never needs.
+- compact_json() serializes without indentation or ASCII escapes.
+- cached_system() turns a stage's static instructions into a system block
+  with a cache breakpoint, so repeated calls read the prefix from the
+  prompt cache instead of paying for it again. (Prefixes shorter than the
+  model's minimum cacheable length are simply not cached.)
+- UsageMeter collects the usage of every response so a stage can report
+  input, cached and output tokens per record.
+"""
+
+import json
+import threading
+import time
+from typing import Iterable, Optional
+
+EMPTY = (None, "", [], {})
+
+
+def project(record: dict, fields: Iterable[str]) -> dict:
+    """The non-empty values of `fields`, in that order."""
+    return {field: record[field] for field in fields if record.get(field) not in EMPTY}
+
+
+def compact_json(value) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+def cached_system(instructions: str) -> list:
+    """A system prompt whose static text is marked as a cache breakpoint."""
+    return [{"type": "text", "text": instructions, "cache_control": {"type": "ephemeral"}}]
+
+
+class UsageMeter:
+    """Token usage and latency of a stage's LLM calls."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.requests = 0
+        self.records = 0
+        self.input_tokens = 0
+        self.cache_write_tokens = 0
+        self.cache_read_tokens = 0
+        self.output_tokens = 0
+        self.seconds = 0.0
+        self.cached = 0
+        self._lock = threading.Lock()
+
+    def observe(self, response, records: int = 1, started: Optional[float] = None):
+        """Record one response (or batch result message) covering `records` records."""
+        usage = getattr(response, "usage", None)
+        with self._lock:
+            if getattr(response, "cached", False):
+                # Served from llm_cache; costs nothing, so kept out of the per-record figures
+                self.cached += records
+                return
+            self.requests += 1
+            self.records += records
+            if started is not None:
+                self.seconds += time.monotonic() - started
+            if usage is None:
+                return
+            self.input_tokens += getattr(usage, "input_tokens", 0) or 0
+            self.cache_write_tokens += getattr(usage, "cache_creation_input_tokens", 0) or 0
+            self.cache_read_tokens += getattr(usage, "cache_read_input_tokens", 0) or 0
+            self.output_tokens += getattr(usage, "output_tokens", 0) or 0
+
+    def summary(self) -> str:
+        from_cache = f", {self.cached} more served from the response cache" if self.cached else ""
+        if not self.records:
+            return f"{self.stage}: no LLM calls{from_cache}"
+        per = lambda n: n / self.records
+        prompt = self.input_tokens + self.cache_write_tokens + self.cache_read_tokens
+        cached = 100 * self.cache_read_tokens / prompt if prompt else 0
+        latency = f", {self.seconds / self.requests:.2f}s per request" if self.seconds else ""
+        return (f"{self.stage}: {self.records} records in {self.requests} requests, "
+                f"{per(prompt):.0f} input tokens/record ({cached:.0f}% read from the prompt cache), "
+                f"{per(self.output_tokens):.0f} output tokens/record{latency}{from_cache}")
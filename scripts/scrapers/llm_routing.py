@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Model-tier routing for the LLM stages (02, 04, 05).
+
+Most records are easy: a clean "Roundnet Club e.V." entry, a short club
+page, a logo. Those go to a small, fast model. Each stage lists the
+difficulty signals of a request (missing fields, non-Latin text, long
+website content, a large image). A request with any of them goes
+straight to the large model.
+
+A small-model answer that the stage rejects (unparseable or invalid) is
+escalated: the same request is sent again to the large model. Both
+answers land in the LLM cache under their own model, so a re-run replays
+the decision without paying twice.
+
+Models are configured via the environment:
+    LLM_SMALL_MODEL         default claude-3-5-haiku-20241022
+    LLM_SMALL_VISION_MODEL  default claude-3-haiku-20240307 (step 5 sends images)
+    LLM_LARGE_MODEL         default claude-sonnet-4-20250514
+"""
+
+import os
+import unicodedata
+from typing import Callable, Iterable, Optional
+
+from llm_batches import batch_request
+
+SMALL_MODEL = os.environ.get("LLM_SMALL_MODEL", "claude-3-5-haiku-20241022")
+SMALL_VISION_MODEL = os.environ.get("LLM_SMALL_VISION_MODEL", "claude-3-haiku-20240307")
+LARGE_MODEL = os.environ.get("LLM_LARGE_MODEL", "claude-sonnet-4-20250514")
+
+NON_LATIN_SHARE = 0.2  # share of letters outside the Latin script that marks text as hard
+
+
+def non_latin_share(text: str) -> float:
+    """Share of the letters in `text` that are not Latin script (Cyrillic, CJK, Arabic...)."""
+    letters = [c for c in text if c.isalpha()]
+    if not letters:
+        return 0.0
+    return sum(1 for c in letters if not unicodedata.name(c, "").startswith("LATIN")) / len(letters)
+
+
+def non_latin(*texts) -> bool:
+    return non_latin_share(" ".join(t for t in texts if isinstance(t, str))) > NON_LATIN_SHARE
+
+
+def missing(record: dict, fields: Iterable[str]) -> list:
+    """The fields of `record` that are absent or empty."""
+    return [field for field in fields if record.get(field) in (None, "", [], {})]
+
+
+class ModelRouter:
+    """Picks a model per request and counts how requests were routed."""
+
+    def __init__(self, stage: str, small: str = SMALL_MODEL, large: str = LARGE_MODEL):
+        self.stage = stage
+        self.small = small
+        self.large = large
+        self.enabled = True
+        self.routed = {"small": 0, "large": 0}
+        self.escalated = 0
+        self.reasons = {}
+
+    def pick(self, reasons: Iterable[str]) -> str:
+        """The small model unless the request has difficulty `reasons` (or routing is off)."""
+        reasons = list(reasons)
+        if not self.enabled:
+            return self.large
+        for reason in reasons:
+            self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        tier = "large" if reasons else "small"
+        self.routed[tier] += 1
+        return self.large if reasons else self.small
+
+    def escalate(self, params: dict, records: int = 1) -> Optional[dict]:
+        """The same request for the large model, or None if it already went there.
+
+        `records` is how many records the escalation covers, for the summary.
+        """
+        if params.get("model") == self.large:
+            return None
+        self.escalated += records
+        return {**params, "model": self.large}
+
+    def summary(self) -> str:
+        if not self.enabled:
+            return f"{self.stage}: routing off, every request sent to {self.large}"
+        reasons = ", ".join(f"{n} {reason}" for reason, n in sorted(self.reasons.items(), key=lambda r: -r[1]))
+        return (f"{self.stage}: {self.routed['small']} records to {self.small}, "
+                f"{self.routed['large']} to {self.large}" + (f" ({reasons})" if reasons else "")
+                + f", {self.escalated} escalated")
+
+
+def escalation_requests(router: ModelRouter, requests: list, results: dict,
+                        accept: Callable[[Optional[str]], bool]) -> list:
+    """Batch requests to re-submit on the large model: those whose answer `accept` rejects."""
+    escalated = []
+    for request in requests:
+        if accept(results.get(request["custom_id"])):
+            continue
+        params = router.escalate(request["params"])
+        if params:
+            escalated.append(batch_request(request["custom_id"], **params))
+    return escalated
+
+
+def add_routing_args(parser):
+    parser.add_argument("--no-routing", action="store_true",
+                        help=f"Send every request to the large model ({LARGE_MODEL})")
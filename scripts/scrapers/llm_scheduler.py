@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Rate-limit-aware, budget-capped scheduling of LLM calls, shared by the
+LLM stages (02, 04, 05).
+
+ScheduledClient wraps an Anthropic (or AsyncAnthropic) client. Every
+messages.create goes through LLMScheduler, which:
+
+- calls the API via with_raw_response, to read the
+  anthropic-ratelimit-* headers as well as the usage of each response
+- paces requests: when the remaining tokens-per-minute allowance runs
+  low, it waits for the reset instead of running into 429s
+- adapts async concurrency (AIMD): a 429/529 halves the number of requests
+  in flight, and each run of successes adds one back, up to the stage's
+  configured maximum
+- retries 429, 529 and 5xx responses, honouring retry-after, and
+  connection errors and timeouts with exponential backoff (these leave
+  the concurrency alone)
+- stops the run gracefully once the cost budget is spent: BudgetExceeded
+  is raised before the next call, the stage keeps its previous output,
+  and re-running resumes, since finished calls are served from llm_cache
+
+At the end of a run, report() prints the stage's requests, tokens, cost
+and throughput and appends them to data/llm-usage.jsonl.
+
+Wrap order is CachedClient(ScheduledClient(client)), so cache hits never
+count against rate limits or the budget. Create the wrapped client with
+max_retries=0: the SDK's own retries would otherwise sleep through 429s
+behind the scheduler's back and multiply its retry count.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+import anthropic
+
+USAGE_LOG = os.path.join(os.path.dirname(__file__), "data", "llm-usage.jsonl")
+
+# USD per million tokens: input, output, cache write, cache read
+PRICES = {
+    "claude-sonnet-4-20250514": (3.00, 15.00, 3.75, 0.30),
+    "claude-3-5-haiku-20241022": (0.80, 4.00, 1.00, 0.08),
+    "claude-3-haiku-20240307": (0.25, 1.25, 0.30, 0.03),
+}
+DEFAULT_PRICE = PRICES["claude-sonnet-4-20250514"]
+BATCH_DISCOUNT = 0.5
+
+RETRY_STATUSES = (429, 500, 502, 503, 529)
+MAX_RETRIES = 5
+SUCCESSES_PER_STEP = 10   # successes before concurrency grows by one
+LOW_TOKENS_FRACTION = 0.1  # pace when less than this share of the minute's tokens is left
+
+
+class BudgetExceeded(Exception):
+    """The run's cost budget is spent; no further calls are made."""
+
+
+def cost_usd(model: str, usage, batch: bool = False) -> float:
+    if usage is None:
+        return 0.0
+    price_in, price_out, price_write, price_read = PRICES.get(model, DEFAULT_PRICE)
+    cost = ((getattr(usage, "input_tokens", 0) or 0) * price_in
+            + (getattr(usage, "output_tokens", 0) or 0) * price_out
+            + (getattr(usage, "cache_creation_input_tokens", 0) or 0) * price_write
+            + (getattr(usage, "cache_read_input_tokens", 0) or 0) * price_read) / 1_000_000
+    return cost * (BATCH_DISCOUNT if batch else 1)
+
+
+def _reset_in(value: Optional[str]) -> float:
+    """Seconds until an RFC 3339 reset timestamp (0 if absent or past)."""
+    if not value:
+        return 0.0
+    try:
+        reset = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        return 0.0
+    return max(0.0, (reset - datetime.now(timezone.utc)).total_seconds())
+
+
+def _retry_after(error: Exception, attempt: int) -> float:
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return min(60.0, 2.0 ** attempt)
+
+
+class LLMScheduler:
+    """Pacing, retries, concurrency and budget for one stage's LLM calls."""
+
+    def __init__(self, stage: str, max_concurrency: int = 4, budget_usd: Optional[float] = None):
+        self.stage = stage
+        self.max_concurrency = max_concurrency
+        self.concurrency = max_concurrency
+        self.budget_usd = budget_usd
+        self.spent_usd = 0.0
+        self.requests = 0
+        self.retries = 0
+        self.throttled = 0
+        self.tokens = {"input": 0, "output": 0, "cache_write": 0, "cache_read": 0}
+        self.started = time.monotonic()
+        self._pause_until = 0.0
+        self._successes = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    # ── Accounting ──
+
+    def record(self, model: str, usage, batch: bool = False):
+        """Count a response's usage and cost (batch results too)."""
+        with self._lock:
+            self.requests += 1
+            if usage is None:
+                return
+            self.tokens["input"] += getattr(usage, "input_tokens", 0) or 0
+            self.tokens["output"] += getattr(usage, "output_tokens", 0) or 0
+            self.tokens["cache_write"] += getattr(usage, "cache_creation_input_tokens", 0) or 0
+            self.tokens["cache_read"] += getattr(usage, "cache_read_input_tokens", 0) or 0
+            self.spent_usd += cost_usd(model, usage, batch)
+
+    def check_budget(self):
+        if self.budget_usd is not None and self.spent_usd >= self.budget_usd:
+            raise BudgetExceeded(f"{self.stage}: budget of ${self.budget_usd:.2f} spent "
+                                 f"(${self.spent_usd:.2f} after {self.requests} requests)")
+
+    # ── Rate limits ──
+
+    def _observe_headers(self, headers):
+        limit = headers.get("anthropic-ratelimit-tokens-limit")
+        remaining = headers.get("anthropic-ratelimit-tokens-remaining")
+        if not (limit and remaining):
+            return
+        try:
+            limit, remaining = int(limit), int(remaining)
+        except ValueError:
+            return
+        if remaining < limit * LOW_TOKENS_FRACTION:
+            wait = _reset_in(headers.get("anthropic-ratelimit-tokens-reset"))
+            with self._lock:
+                self._pause_until = max(self._pause_until, time.monotonic() + wait)
+                self.concurrency = max(1, self.concurrency - 1)
+
+    def _on_success(self):
+        with self._lock:
+            self._successes += 1
+            if self._successes >= SUCCESSES_PER_STEP and self.concurrency < self.max_concurrency:
+                self.concurrency += 1
+                self._successes = 0
+
+    def _on_throttled(self, wait: float):
+        with self._lock:
+            self.throttled += 1
+            self.retries += 1
+            self._successes = 0
+            self.concurrency = max(1, self.concurrency // 2)
+            self._pause_until = max(self._pause_until, time.monotonic() + wait)
+
+    def _on_network_error(self, error: Exception, attempt: int) -> float:
+        """Count a retry after a connection error or timeout; returns the backoff."""
+        with self._lock:
+            self.retries += 1
+        return _retry_after(error, attempt)
+
+    def _pause(self) -> float:
+        return max(0.0, self._pause_until - time.monotonic())
+
+    # ── Calls ──
+
+    def call(self, client, **params):
+        """A synchronous messages.create under the scheduler."""
+        for attempt in range(MAX_RETRIES + 1):
+            self.check_budget()
+            time.sleep(self._pause())
+            try:
+                raw = client.messages.with_raw_response.create(**params)
+            except anthropic.APIStatusError as e:
+                if e.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    raise
+                print(f"⏳ {self.stage}: HTTP {e.status_code}, retrying (attempt {attempt + 1})")
+                self._on_throttled(_retry_after(e, attempt))
+                continue
+            except anthropic.APIConnectionError as e:  # timeouts included
+                if attempt == MAX_RETRIES:
+                    raise
+                print(f"⏳ {self.stage}: {e}, retrying (attempt {attempt + 1})")
+                time.sleep(self._on_network_error(e, attempt))
+                continue
+            return self._finish(raw, params)
+
+    async def acall(self, client, **params):
+        """An async messages.create under the scheduler, within the adaptive concurrency."""
+        backoff = 0.0
+        for attempt in range(MAX_RETRIES + 1):
+            await asyncio.sleep(backoff)
+            self.check_budget()
+            while self._pause() > 0 or self._in_flight >= self.concurrency:
+                await asyncio.sleep(max(self._pause(), 0.05))
+            self._in_flight += 1
+            try:
+                raw = await client.messages.with_raw_response.create(**params)
+            except anthropic.APIStatusError as e:
+                if e.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                    raise
+                print(f"⏳ {self.stage}: HTTP {e.status_code}, retrying (attempt {attempt + 1}, "
+                      f"concurrency {max(1, self.concurrency // 2)})")
+                self._on_throttled(_retry_after(e, attempt))
+                continue
+            except anthropic.APIConnectionError as e:  # timeouts included
+                if attempt == MAX_RETRIES:
+                    raise
+                print(f"⏳ {self.stage}: {e}, retrying (attempt {attempt + 1})")
+                backoff = self._on_network_error(e, attempt)
+                continue
+            finally:
+                self._in_flight -= 1
+            return self._finish(raw, params)
+
+    def _finish(self, raw, params: dict):
+        message = raw.parse()
+        self._observe_headers(raw.headers)
+        self.record(params.get("model"), getattr(message, "usage", None))
+        self._on_success()
+        return message
+
+    # ── Reporting ──
+
+    def report(self, records: Optional[int] = None) -> dict:
+        """Print and log the stage's cost and throughput."""
+        elapsed = time.monotonic() - self.started
+        report = {
+            "stage": self.stage,
+            "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seconds": round(elapsed, 1),
+            "requests": self.requests,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "final_concurrency": self.concurrency,
+            "tokens": dict(self.tokens),
+            "cost_usd": round(self.spent_usd, 4),
+            "budget_usd": self.budget_usd,
+            "requests_per_minute": round(60 * self.requests / elapsed, 1) if elapsed else None,
+        }
+        if records is not None:
+            report["records"] = records
+            report["cost_per_record_usd"] = round(self.spent_usd / records, 5) if records else None
+        os.makedirs(os.path.dirname(USAGE_LOG), exist_ok=True)
+        with open(USAGE_LOG, "a") as f:
+            f.write(json.dumps(report) + "\n")
+
+        tokens = self.tokens
+        budget = f" of ${self.budget_usd:.2f}" if self.budget_usd is not None else ""
+        print(f"💰 {self.stage}: ${self.spent_usd:.4f}{budget} for {self.requests} requests "
+              f"({tokens['input'] + tokens['cache_write'] + tokens['cache_read']:,} input / "
+              f"{tokens['output']:,} output tokens), {report['requests_per_minute'] or 0} req/min, "
+              f"{self.throttled} throttled")
+        return report
+
+
+class _ScheduledMessages:
+    def __init__(self, owner: "ScheduledClient"):
+        self._owner = owner
+
+    def __getattr__(self, name):
+        # batches, count_tokens, ... go straight to the wrapped client
+        return getattr(self._owner.client.messages, name)
+
+    def create(self, **params):
+        owner = self._owner
+        if owner.is_async:
+            return owner.scheduler.acall(owner.client, **params)
+        return owner.scheduler.call(owner.client, **params)
+
+
+class ScheduledClient:
+    """Wraps an Anthropic client so messages.create goes through an LLMScheduler.
+
+    Pass is_async=True for an AsyncAnthropic client.
+    """
+
+    def __init__(self, client, scheduler: LLMScheduler, is_async: bool = False):
+        self.client = client
+        self.scheduler = scheduler
+        self.is_async = is_async
+        self.messages = _ScheduledMessages(self)
+
+
+def add_scheduler_args(parser):
+    parser.add_argument("--budget-usd", type=float,
+                        help="Stop the run once this much has been spent on API calls (re-run to resume)")
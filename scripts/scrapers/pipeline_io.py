@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Shared record I/O for the pipeline stages.
+
+Every stage reads and writes a list of records (raw places or clubs).
+Three on-disk formats are supported, picked by file extension:
+
+- .json       pretty-printed JSON array (the original format, always readable)
+- .jsonl      newline-delimited JSON, one record per line
+- .jsonl.zst  zstd-compressed JSONL (needs `pip install zstandard`)
+
+JSONL is read and written one record at a time, so stages can run in
+constant memory. "-" means stdin/stdout (JSONL), so stages can be piped
+into each other. Set PIPELINE_FORMAT=jsonl (or jsonl.zst) to make the
+stages write that format; inputs are found in whichever format exists.
+"""
+
+import io
+import json
+import os
+import sys
+from typing import Iterable, Iterator, Optional
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+FORMATS = ("json", "jsonl", "jsonl.zst")
+PIPELINE_FORMAT = os.environ.get("PIPELINE_FORMAT", "json")
+if PIPELINE_FORMAT not in FORMATS:
+    raise ValueError(f"PIPELINE_FORMAT must be one of {', '.join(FORMATS)}, got {PIPELINE_FORMAT!r}")
+
+
+def _base(path: str) -> str:
+    for ext in sorted(FORMATS, key=len, reverse=True):
+        if path.endswith(f".{ext}"):
+            return path[:-len(ext) - 1]
+    return path
+
+
+def _format(path: str) -> str:
+    if path == "-":
+        return "jsonl"
+    for ext in sorted(FORMATS, key=len, reverse=True):
+        if path.endswith(f".{ext}"):
+            return ext
+    return "json"
+
+
+def stage_path(path: str, fmt: Optional[str] = None) -> str:
+    """Swap a stage file's extension for `fmt`, by default the configured format."""
+    if path == "-":
+        return path
+    return f"{_base(path)}.{fmt or PIPELINE_FORMAT}"
+
+
+def resolve_input(path: str) -> str:
+    """Find a stage's input: the given path if it exists, else whichever format
+    exists, preferring the configured one.
+
+    Returns the configured-format path if none exist, so callers can
+    report a sensible "not found" path.
+    """
+    if path == "-" or os.path.exists(path):
+        return path
+    candidates = [stage_path(path)] + [stage_path(path, fmt) for fmt in FORMATS]
+    for candidate in candidates:
+        if os.path.exists(candidate):
+            return candidate
+    return candidates[0]
+
+
+def input_exists(path: str) -> bool:
+    return path == "-" or os.path.exists(resolve_input(path))
+
+
+def _open_text(path: str, mode: str, fmt: Optional[str] = None):
+    """Open a stage file as text; `fmt` overrides the format implied by the name (e.g. for .tmp files)."""
+    if (fmt or _format(path)) == "jsonl.zst":
+        if not HAS_ZSTD:
+            raise RuntimeError(f"{path} is zstd-compressed. Run: pip install zstandard")
+        if "r" in mode:
+            stream = zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True)
+        else:
+            stream = zstandard.ZstdCompressor(level=10).stream_writer(open(path, "wb"), closefd=True)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def read_records(path: str) -> Iterator[dict]:
+    """Yield records from a stage file (any supported format, or "-" for stdin)."""
+    if path == "-":
+        for line in sys.stdin:
+            if line.strip():
+                yield json.loads(line)
+        return
+
+    path = resolve_input(path)
+    fmt = _format(path)
+    with _open_text(path, "r") as f:
+        if fmt == "json":
+            # Legacy arrays have to be parsed whole
+            yield from json.load(f)
+            return
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def load_records(path: str) -> list:
+    """Read a whole stage file into a list."""
+    return list(read_records(path))
+
+
+class RecordWriter:
+    """Stream records to a stage file, one at a time.
+
+    Files are written to a temporary path and moved into place on a clean
+    close, so a crashed stage never leaves a half-written output behind.
+    .json output is byte-compatible with json.dump(records, f, indent=2).
+
+    Writing to "-" sends JSONL to stdout (see reserve_stdout).
+    """
+
+    def __init__(self, path: str, ensure_ascii: bool = False):
+        self.path = path
+        self.fmt = _format(path)
+        self.ensure_ascii = ensure_ascii
+        self.count = 0
+        self._tmp = None
+
+    def __enter__(self):
+        if self.path == "-":
+            self._file = reserve_stdout()
+        else:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._tmp = f"{self.path}.tmp"
+            self._file = _open_text(self._tmp, "w", self.fmt)
+        return self
+
+    def write(self, record: dict):
+        if self.fmt == "json":
+            text = json.dumps(record, indent=2, ensure_ascii=self.ensure_ascii)
+            prefix = "[\n" if self.count == 0 else ",\n"
+            self._file.write(prefix + "\n".join(f"  {line}" for line in text.split("\n")))
+        else:
+            self._file.write(json.dumps(record, ensure_ascii=self.ensure_ascii) + "\n")
+        self.count += 1
+
+    def write_all(self, records: Iterable[dict]) -> int:
+        for record in records:
+            self.write(record)
+        return self.count
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.fmt == "json":
+            self._file.write("\n]" if self.count else "[]")
+        if self.path == "-":
+            self._file.flush()
+            return False
+        self._file.close()
+        if exc_type is None:
+            os.replace(self._tmp, self.path)
+        else:
+            os.remove(self._tmp)
+        return False
+
+
+def write_records(path: str, records: Iterable[dict], ensure_ascii: bool = False) -> int:
+    """Write records to a stage file. Returns the number written."""
+    with RecordWriter(path, ensure_ascii=ensure_ascii) as writer:
+        return writer.write_all(records)
+
+
+_records_stdout = None
+
+
+def reserve_stdout():
+    """Keep stdout for records only: print() goes to stderr from now on.
+
+    Returns the real stdout stream.
+    """
+    global _records_stdout
+    if _records_stdout is None:
+        _records_stdout = sys.stdout
+        sys.stdout = sys.stderr
+    return _records_stdout
+
+
+def add_io_args(parser, default_input: str, default_output: str):
+    """Add the standard -i/--input and -o/--output options to a stage's CLI."""
+    parser.add_argument("-i", "--input", default=stage_path(default_input),
+                        help=f"Input records, any format or - for stdin (default: {stage_path(default_input)})")
+    parser.add_argument("-o", "--output", default=None,
+                        help=f"Output records, or - for stdout (default: {stage_path(default_output)})")
+
+
+def parse_stage_args(parser):
+    """Parse a stage's CLI; when writing records to stdout, reserve it before anything prints."""
+    args = parser.parse_args()
+    if args.output == "-":
+        reserve_stdout()
+    return args
+
+
+def output_path(path: Optional[str], default: str) -> str:
+    """A stage's output path: the explicit one, or the default in the configured format."""
+    return path if path else stage_path(default)
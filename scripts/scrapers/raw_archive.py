@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Content-addressed archive of raw Outscraper snapshots.
+
+Each scrape is stored as a dated snapshot: a gzipped manifest listing the
+hashes of its records, in order. Records are stored once per distinct
+content: a snapshot only writes the records the archive hasn't seen yet,
+into its own gzipped pack (packs/<snapshot>.jsonl.gz), and index.json.gz
+maps every record hash to the pack holding it. A place that hasn't
+changed between weekly scrapes costs nothing extra on disk, and loading a
+snapshot reads a handful of packs rather than one file per place.
+
+Optionally records can be projected down to RAW_FIELDS — the fields the
+pipeline actually reads — before hashing, which drops volatile payload
+(popular times, review histograms, ...) and keeps more records identical
+across snapshots.
+
+Usage:
+    python3 raw_archive.py list
+    python3 raw_archive.py add data/raw/outscraper-results.json [--project]
+    python3 raw_archive.py restore [SNAPSHOT] -o data/raw/outscraper-results.json
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import time
+from typing import Iterable, Optional
+
+from pipeline_io import load_records, write_records
+
+ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "data", "raw", "archive")
+
+# Raw fields read by the cleaning stages and the incremental scraper
+RAW_FIELDS = (
+    "name", "place_id", "google_id", "query",
+    "full_address", "address", "street", "postal_code", "city", "country", "country_code",
+    "latitude", "longitude",
+    "site", "website", "email", "phone",
+    "description", "category", "type", "subtypes", "business_status",
+    "rating", "reviews", "photo", "photos_sample", "working_hours",
+)
+
+
+def project_record(record: dict, fields: Iterable[str] = RAW_FIELDS) -> dict:
+    """Keep only the given fields (those present) of a raw record."""
+    return {k: record[k] for k in fields if k in record}
+
+
+def record_hash(record: dict) -> str:
+    canonical = json.dumps(record, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+def _pack_path(pack_id: str, archive_dir: str) -> str:
+    return os.path.join(archive_dir, "packs", f"{pack_id}.jsonl.gz")
+
+
+def _snapshot_path(snapshot_id: str, archive_dir: str) -> str:
+    return os.path.join(archive_dir, "snapshots", f"{snapshot_id}.json.gz")
+
+
+def _read_gz_json(path: str, default=None):
+    if default is not None and not os.path.exists(path):
+        return default
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_gz_json(path: str, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with gzip.open(tmp, "wt", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp, path)
+
+
+def list_snapshots(archive_dir: str = ARCHIVE_DIR) -> list:
+    """Snapshot IDs, oldest first."""
+    directory = os.path.join(archive_dir, "snapshots")
+    if not os.path.isdir(directory):
+        return []
+    return sorted(name[:-len(".json.gz")] for name in os.listdir(directory) if name.endswith(".json.gz"))
+
+
+def archive_snapshot(records: Iterable[dict], project: bool = False,
+                     archive_dir: str = ARCHIVE_DIR, snapshot_id: Optional[str] = None) -> dict:
+    """Store records as a new snapshot. Returns the snapshot's summary."""
+    if snapshot_id is None:
+        base = snapshot_id = time.strftime("%Y-%m-%dT%H%M%S")
+        n = 1
+        while os.path.exists(_snapshot_path(snapshot_id, archive_dir)):
+            n += 1
+            snapshot_id = f"{base}-{n}"
+    index_path = os.path.join(archive_dir, "index.json.gz")
+    index = _read_gz_json(index_path, {})
+    hashes = []
+    new_objects = 0
+
+    pack_path = _pack_path(snapshot_id, archive_dir)
+    os.makedirs(os.path.dirname(pack_path), exist_ok=True)
+    with gzip.open(f"{pack_path}.tmp", "wt", encoding="utf-8") as pack:
+        for record in records:
+            if project:
+                record = project_record(record)
+            digest = record_hash(record)
+            hashes.append(digest)
+            if digest in index:
+                continue
+            pack.write(json.dumps({"h": digest, "r": record}, ensure_ascii=False,
+                                  separators=(",", ":")) + "\n")
+            index[digest] = snapshot_id
+            new_objects += 1
+
+    if new_objects:
+        os.replace(f"{pack_path}.tmp", pack_path)
+    else:
+        os.remove(f"{pack_path}.tmp")
+
+    # Pack first, then index, then manifest: a crash leaves at worst an unreferenced pack
+    _write_gz_json(index_path, index)
+    _write_gz_json(_snapshot_path(snapshot_id, archive_dir), {
+        "id": snapshot_id,
+        "created_at": time.time(),
+        "projected": project,
+        "records": hashes,
+    })
+
+    return {"id": snapshot_id, "records": len(hashes), "new_objects": new_objects}
+
+
+def load_snapshot(snapshot_id: Optional[str] = None, archive_dir: str = ARCHIVE_DIR) -> list:
+    """Load a snapshot's records (the latest one by default)."""
+    if snapshot_id is None:
+        snapshots = list_snapshots(archive_dir)
+        if not snapshots:
+            raise FileNotFoundError(f"No snapshots in {archive_dir}")
+        snapshot_id = snapshots[-1]
+    manifest = _read_gz_json(_snapshot_path(snapshot_id, archive_dir))
+    index = _read_gz_json(os.path.join(archive_dir, "index.json.gz"), {})
+
+    wanted = set(manifest["records"])
+    objects = {}
+    for pack_id in sorted({index[digest] for digest in wanted}):
+        with gzip.open(_pack_path(pack_id, archive_dir), "rt", encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                if entry["h"] in wanted:
+                    objects[entry["h"]] = entry["r"]
+    return [objects[digest] for digest in manifest["records"]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Raw Outscraper snapshot archive")
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List snapshots")
+    add = sub.add_parser("add", help="Archive a raw results file as a new snapshot")
+    add.add_argument("input")
+    add.add_argument("--project", action="store_true", help="Store only the fields the pipeline reads")
+    restore = sub.add_parser("restore", help="Write a snapshot back out as a raw results file")
+    restore.add_argument("snapshot", nargs="?", help="Snapshot ID (default: latest)")
+    restore.add_argument("-o", "--output", required=True)
+    args = parser.parse_args()
+
+    if args.command == "list":
+        for snapshot_id in list_snapshots(args.archive_dir):
+            print(snapshot_id)
+    elif args.command == "add":
+        summary = archive_snapshot(load_records(args.input), args.project, args.archive_dir)
+        print(f"📦 Snapshot {summary['id']}: {summary['records']} records, "
+              f"{summary['new_objects']} new objects")
+    elif args.command == "restore":
+        records = load_snapshot(args.snapshot, args.archive_dir)
+        write_records(args.output, records)
+        print(f"✅ Restored {len(records)} records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
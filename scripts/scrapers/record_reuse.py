@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Per-record reuse of a stage's previous output.
+
+The expensive stages (03 crawl, 04 LLM enrichment, 05 vision) each depend
+on only a few fields of a club. Each output record carries a fingerprint
+per stage — a hash of the fields that stage reads, plus a version string
+that changes with its prompt — under `fingerprints`. On the next run a
+club whose fingerprint matches the previous output's copy gets that
+copy's output fields back instead of being recomputed.
+
+Records are matched across runs by place ID, falling back to slug.
+"""
+
+import hashlib
+import json
+from typing import Callable, Iterable, Optional
+
+from pipeline_io import input_exists, read_records
+
+
+def record_key(record: dict) -> str:
+    return record.get("placeId") or record.get("slug") or record.get("name") or ""
+
+
+def _get(record: dict, path: str):
+    """A field by dotted path ("website_verification.content")."""
+    value = record
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def fingerprint(record: dict, fields: Iterable[str], version: str = "") -> str:
+    relevant = {field: _get(record, field) for field in fields}
+    canonical = json.dumps([version, relevant], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:16]
+
+
+class StageReuse:
+    """Reuses a stage's previous output record by record.
+
+    `input_fields` are what the stage reads, `output_fields` what it
+    writes. `view`, if given, narrows a record to the part the stage
+    actually reads before the input fields are hashed (e.g. only the first
+    few photos). The previous output at `previous_path` is indexed (only
+    its fingerprints and output fields are kept in memory).
+    """
+
+    def __init__(self, stage: str, input_fields: Iterable[str], output_fields: Iterable[str],
+                 previous_path: Optional[str] = None, version: str = "",
+                 view: Optional[Callable[[dict], dict]] = None):
+        self.stage = stage
+        self.input_fields = tuple(input_fields)
+        self.output_fields = tuple(output_fields)
+        self.version = version
+        self.view = view
+        self.reused = 0
+        self.recomputed = 0
+        self._previous = {}
+        if previous_path and previous_path != "-" and input_exists(previous_path):
+            for record in read_records(previous_path):
+                fp = (record.get("fingerprints") or {}).get(stage)
+                if fp:
+                    self._previous[record_key(record)] = (
+                        fp, {f: record[f] for f in self.output_fields if f in record})
+
+    def fingerprint(self, record: dict) -> str:
+        return fingerprint(self.view(record) if self.view else record, self.input_fields, self.version)
+
+    def reuse(self, record: dict) -> bool:
+        """Fill in the stage's output from the previous run if the record is unchanged."""
+        fp = self.fingerprint(record)
+        previous = self._previous.get(record_key(record))
+        if not previous or previous[0] != fp:
+            return False
+        record.update(previous[1])
+        record.setdefault("fingerprints", {})[self.stage] = fp
+        self.reused += 1
+        return True
+
+    def computed(self, record: dict, source: Optional[dict] = None) -> dict:
+        """Stamp a freshly processed record with the stage's fingerprint.
+
+        Only stamp successful results: an unstamped record is recomputed on
+        the next run. Pass the record as the stage read it as `source` if
+        the stage writes to any of its own input fields.
+        """
+        record.setdefault("fingerprints", {})[self.stage] = self.fingerprint(
+            record if source is None else source)
+        self.recomputed += 1
+        return record
+
+    def summary(self) -> str:
+        return f"{self.reused} reused, {self.recomputed} recomputed"
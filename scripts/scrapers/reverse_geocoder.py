@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Offline reverse geocoding: coordinates → nearest city, no network calls.
+
+The gazetteer is a GeoNames-format cities file (tab-separated; e.g.
+cities15000.txt from download.geonames.org/export/dump). Point
+GEONAMES_CITIES_FILE at one for full coverage; otherwise the small bundled
+data/geo/cities-seed.txt (same format, ~200 European cities) is used.
+
+Parsing the text file is the slow part, so it is cached as a compact
+zlib-compressed binary under data/cache/geo, keyed by the source file's
+path, size and mtime. Cities are indexed as 3D unit vectors, whose chord
+distance orders the same as great-circle distance with no antimeridian
+seam. The index is scipy's cKDTree when available (batch lookups are then
+vectorised with numpy), or a small pure-Python KD-tree otherwise.
+
+Usage:
+    python3 reverse_geocoder.py 52.52 13.40
+"""
+
+import argparse
+import hashlib
+import math
+import os
+import struct
+import zlib
+from array import array
+from typing import Iterable, Optional
+
+try:
+    import numpy as np
+    from scipy.spatial import cKDTree
+    HAS_SCIPY = True
+except ImportError:
+    HAS_SCIPY = False
+
+SEED_FILE = os.path.join(os.path.dirname(__file__), "data", "geo", "cities-seed.txt")
+CITIES_FILE = os.environ.get("GEONAMES_CITIES_FILE", SEED_FILE)
+CACHE_DIR = os.path.join(os.path.dirname(__file__), "data", "cache", "geo")
+CACHE_MAGIC = b"RGEO1"
+EARTH_RADIUS_KM = 6371.0
+# Points further than this from any city resolve to None. Kept tight: the
+# bundled seed only has large cities, and a town 25 km out (Louvain-la-Neuve)
+# must not become Brussels. Callers fall back to the address instead.
+DEFAULT_MAX_KM = 10.0
+
+# GeoNames column indexes
+COL_NAME, COL_LAT, COL_LON, COL_COUNTRY, COL_POPULATION = 1, 4, 5, 8, 14
+
+
+def _unit_vector(lat: float, lon: float) -> tuple:
+    lat, lon = math.radians(lat), math.radians(lon)
+    return (math.cos(lat) * math.cos(lon), math.cos(lat) * math.sin(lon), math.sin(lat))
+
+
+def _chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def _km_to_chord(km: float) -> float:
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+# ── Gazetteer loading ──
+
+def parse_cities(path: str) -> tuple:
+    """Parse a GeoNames cities file into (names, country codes, lats, lons, populations)."""
+    names, countries = [], []
+    lats, lons, populations = array("f"), array("f"), array("I")
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) <= COL_POPULATION or not cols[COL_LAT]:
+                continue
+            names.append(cols[COL_NAME])
+            countries.append((cols[COL_COUNTRY] or "--")[:2])
+            lats.append(float(cols[COL_LAT]))
+            lons.append(float(cols[COL_LON]))
+            populations.append(int(cols[COL_POPULATION] or 0))
+    return names, countries, lats, lons, populations
+
+
+def _cache_path(path: str) -> str:
+    st = os.stat(path)
+    ident = f"{os.path.abspath(path)}:{st.st_size}:{st.st_mtime_ns}"
+    return os.path.join(CACHE_DIR, f"{hashlib.sha256(ident.encode()).hexdigest()[:16]}.bin")
+
+
+def _write_cache(cache_path: str, gazetteer: tuple):
+    names, countries, lats, lons, populations = gazetteer
+    payload = b"".join([
+        struct.pack("<I", len(names)),
+        lats.tobytes(), lons.tobytes(), populations.tobytes(),
+        "".join(countries).encode("ascii", "replace"),
+        "\n".join(names).encode("utf-8"),
+    ])
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(CACHE_MAGIC + zlib.compress(payload, 6))
+    os.replace(tmp, cache_path)
+
+
+def _read_cache(cache_path: str) -> tuple:
+    with open(cache_path, "rb") as f:
+        blob = f.read()
+    if not blob.startswith(CACHE_MAGIC):
+        raise ValueError(f"not a gazetteer cache: {cache_path}")
+    payload = zlib.decompress(blob[len(CACHE_MAGIC):])
+    (count,) = struct.unpack_from("<I", payload)
+    offset = 4
+    columns = []
+    for typecode in ("f", "f", "I"):
+        column = array(typecode)
+        size = count * column.itemsize
+        column.frombytes(payload[offset:offset + size])
+        columns.append(column)
+        offset += size
+    countries = payload[offset:offset + 2 * count].decode("ascii")
+    offset += 2 * count
+    names = payload[offset:].decode("utf-8").split("\n") if count else []
+    lats, lons, populations = columns
+    return names, [countries[i:i + 2] for i in range(0, 2 * count, 2)], lats, lons, populations
+
+
+def load_gazetteer(path: str = CITIES_FILE) -> tuple:
+    """The parsed cities file, from the binary cache when it is current."""
+    cache_path = _cache_path(path)
+    try:
+        return _read_cache(cache_path)
+    except (OSError, ValueError, zlib.error, struct.error):
+        pass
+    gazetteer = parse_cities(path)
+    _write_cache(cache_path, gazetteer)
+    return gazetteer
+
+
+# ── Pure-Python KD-tree (used without scipy) ──
+
+class _KDTree:
+    """Minimal static 3D KD-tree: nodes are (point, index, axis, left, right)."""
+
+    def __init__(self, points: list):
+        self.root = self._build(list(enumerate(points)), 0)
+
+    def _build(self, items: list, depth: int):
+        if not items:
+            return None
+        axis = depth % 3
+        items.sort(key=lambda item: item[1][axis])
+        mid = len(items) // 2
+        index, point = items[mid]
+        return (point, index, axis,
+                self._build(items[:mid], depth + 1), self._build(items[mid + 1:], depth + 1))
+
+    def nearest(self, target: tuple, max_dist: float) -> tuple:
+        """(squared distance, index) of the nearest point within max_dist, or (inf, -1)."""
+        best = [max_dist * max_dist, -1]
+        tx, ty, tz = target
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if node is None:
+                continue
+            point, index, axis, left, right = node
+            d2 = (point[0] - tx) ** 2 + (point[1] - ty) ** 2 + (point[2] - tz) ** 2
+            if d2 < best[0]:
+                best[0], best[1] = d2, index
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            # Push the far side first so the near side is searched (and prunes) first
+            if diff * diff < best[0]:
+                stack.append(far)
+            stack.append(near)
+        return (best[0], best[1]) if best[1] >= 0 else (math.inf, -1)
+
+
+class ReverseGeocoder:
+    """Nearest-city lookups against an in-memory gazetteer."""
+
+    def __init__(self, path: str = CITIES_FILE, max_km: float = DEFAULT_MAX_KM):
+        self.names, self.countries, lats, lons, self.populations = load_gazetteer(path)
+        self.max_chord = _km_to_chord(max_km)
+        points = [_unit_vector(lat, lon) for lat, lon in zip(lats, lons)]
+        self._tree = cKDTree(np.array(points)) if HAS_SCIPY and points else _KDTree(points)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _result(self, index: int, chord: float) -> Optional[dict]:
+        if index < 0 or index >= len(self.names) or chord > self.max_chord:
+            return None
+        return {
+            "city": self.names[index],
+            "country_code": self.countries[index],
+            "distance_km": round(_chord_to_km(chord), 2),
+        }
+
+    def lookup(self, lat: float, lon: float) -> Optional[dict]:
+        """The nearest city to a point, or None if none is within max_km."""
+        return self.lookup_many([(lat, lon)])[0]
+
+    def lookup_many(self, points: Iterable[tuple]) -> list:
+        """Resolve many (lat, lon) points at once; one result (or None) per point."""
+        vectors = [_unit_vector(lat, lon) for lat, lon in points]
+        if not vectors:
+            return []
+        if HAS_SCIPY and isinstance(self._tree, cKDTree):
+            chords, indexes = self._tree.query(np.array(vectors), distance_upper_bound=self.max_chord)
+            return [self._result(int(i), float(d)) for d, i in zip(chords, indexes)]
+        results = []
+        for vector in vectors:
+            d2, index = self._tree.nearest(vector, self.max_chord)
+            results.append(self._result(index, math.sqrt(d2)) if index >= 0 else None)
+        return results
+
+
+_geocoder = None
+
+
+def get_geocoder() -> ReverseGeocoder:
+    """The process-wide geocoder, loaded on first use."""
+    global _geocoder
+    if _geocoder is None:
+        _geocoder = ReverseGeocoder()
+    return _geocoder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve coordinates to the nearest city, offline")
+    parser.add_argument("lat", type=float)
+    parser.add_argument("lon", type=float)
+    parser.add_argument("--max-km", type=float, default=DEFAULT_MAX_KM)
+    args = parser.parse_args()
+
+    geocoder = ReverseGeocoder(max_km=args.max_km)
+    place = geocoder.lookup(args.lat, args.lon)
+    if place:
+        print(f"📍 {place['city']}, {place['country_code']} ({place['distance_km']} km away)")
+    else:
+        print(f"❌ No city within {args.max_km:g} km of {args.lat}, {args.lon} ({len(geocoder)} cities loaded)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+"""
+Run the data pipeline (steps 2–8) as a DAG, skipping up-to-date stages.
+
+Each stage declares the files it reads and writes; a stage depends on
+whichever stages produce its inputs. Before a stage runs, its fingerprint
+is computed over the contents of its inputs, its script and every sibling
+module the script imports, and the environment variables that change its
+output. If the fingerprint matches the last successful run recorded in
+data/pipeline-state.json and the outputs still exist, the stage is
+skipped. An upstream stage that re-runs but writes identical output
+therefore doesn't invalidate anything downstream.
+
+Stages whose dependencies are done run concurrently (up to --jobs).
+
+Usage:
+    python3 run_pipeline.py                  # run what's out of date
+    python3 run_pipeline.py --from enrich    # force enrich and everything after it
+    python3 run_pipeline.py --only features  # force just one stage
+    python3 run_pipeline.py --dry-run        # show what would run
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from pipeline_io import PIPELINE_FORMAT, resolve_input, stage_path
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_FILE = os.path.join(SCRIPT_DIR, "data", "pipeline-state.json")
+APP_DATA_FILE = os.path.join("..", "..", "lib", "data", "scraped-data.ts")
+
+# Environment variables that change any stage's output; a stage's "env" lists its own
+FINGERPRINT_ENV = ("PIPELINE_FORMAT", "GEONAMES_CITIES_FILE")
+TEXT_MODEL_ENV = ["LLM_SMALL_MODEL", "LLM_LARGE_MODEL"]
+
+STAGES = [
+    {"name": "clean", "script": "02-clean-data.py",
+     "inputs": ["data/raw/outscraper-results.json"],
+     "outputs": ["data/cleaned/clubs-cleaned.json"],
+     "env": TEXT_MODEL_ENV},
+    {"name": "verify", "script": "03-verify-websites.py",
+     "inputs": ["data/cleaned/clubs-cleaned.json"],
+     "outputs": ["data/verified/clubs-verified.json"]},
+    {"name": "enrich", "script": "04-enrich-data.py",
+     "inputs": ["data/verified/clubs-verified.json"],
+     "outputs": ["data/enriched/clubs-enriched.json"],
+     "env": TEXT_MODEL_ENV},
+    {"name": "images", "script": "05-verify-images.py",
+     "inputs": ["data/enriched/clubs-enriched.json"],
+     "outputs": ["data/with-images/clubs-with-images.json"],
+     "env": ["LLM_SMALL_VISION_MODEL", "LLM_LARGE_MODEL"]},
+    {"name": "features", "script": "06-extract-features.py",
+     "inputs": ["data/with-images/clubs-with-images.json"],
+     "outputs": ["data/with-features/clubs-with-features.json"]},
+    {"name": "service-areas", "script": "07-service-areas.py",
+     "inputs": ["data/with-features/clubs-with-features.json"],
+     "outputs": ["data/final/clubs.json", "data/final/countries.json", "data/final/cities.json"]},
+    {"name": "import", "script": "08-import-to-app.py",
+     "inputs": ["data/final/clubs.json", "data/final/countries.json", "data/final/cities.json"],
+     "outputs": [APP_DATA_FILE]},
+]
+
+
+def _is_records(path: str) -> bool:
+    """Stage record files follow PIPELINE_FORMAT; anything else is used as-is."""
+    return path.startswith("data/") and path.endswith(".json")
+
+
+def input_file(path: str) -> str:
+    return resolve_input(stage_path(path)) if _is_records(path) else path
+
+
+def output_file(path: str) -> str:
+    return stage_path(path) if _is_records(path) else path
+
+
+def dependencies(stages: list) -> dict:
+    """Stage name → names of the stages producing its inputs."""
+    producers = {out: s["name"] for s in stages for out in s["outputs"]}
+    return {s["name"]: {producers[i] for i in s["inputs"] if i in producers} for s in stages}
+
+
+def downstream(stages: list, names: set) -> set:
+    """The given stages plus everything that (transitively) depends on them."""
+    deps = dependencies(stages)
+    result = set(names)
+    changed = True
+    while changed:
+        changed = False
+        for name, needs in deps.items():
+            if name not in result and needs & result:
+                result.add(name)
+                changed = True
+    return result
+
+
+# ── Fingerprints ──
+
+def _hash_file(path: str, h) -> None:
+    h.update(path.encode() + b"\0")
+    if not os.path.exists(path):
+        h.update(b"<missing>")
+        return
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+
+
+def code_files(script: str, seen: Optional[set] = None) -> list:
+    """A script plus every sibling module it imports, recursively."""
+    seen = set() if seen is None else seen
+    if script in seen:
+        return []
+    seen.add(script)
+    with open(script, "r", encoding="utf-8") as f:
+        source = f.read()
+    files = [script]
+    for module in re.findall(r"^\s*(?:from|import)\s+(\w+)", source, re.MULTILINE):
+        if os.path.exists(f"{module}.py"):
+            files += code_files(f"{module}.py", seen)
+    return files
+
+
+def fingerprint(stage: dict) -> str:
+    h = hashlib.sha256()
+    # "code" lists scripts a stage loads by path, whose imports count too
+    seen = set()
+    files = [f for script in [stage["script"], *stage.get("code", [])] for f in code_files(script, seen)]
+    for path in sorted(files):
+        _hash_file(path, h)
+    for path in stage["inputs"]:
+        _hash_file(input_file(path), h)
+    h.update(json.dumps(stage.get("args", [])).encode() + b"\0")
+    for var in (*FINGERPRINT_ENV, *stage.get("env", [])):
+        h.update(f"{var}={os.environ.get(var, '')}\0".encode())
+    return h.hexdigest()
+
+
+def load_state() -> dict:
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE, "r") as f:
+        return json.load(f)
+
+
+def save_state(state: dict):
+    os.makedirs(os.path.dirname(STATE_FILE), exist_ok=True)
+    tmp = f"{STATE_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp, STATE_FILE)
+
+
+def up_to_date(stage: dict, state: dict, fp: str) -> bool:
+    entry = state.get(stage["name"])
+    if not entry or entry.get("fingerprint") != fp:
+        return False
+    return all(os.path.exists(output_file(out)) for out in stage["outputs"])
+
+
+# ── Execution ──
+
+def run_stage(stage: dict, capture: bool) -> tuple:
+    """Run a stage's script. Returns (exit code, captured output or "", seconds)."""
+    start = time.monotonic()
+    proc = subprocess.run([sys.executable, stage["script"], *stage.get("args", [])],
+                          capture_output=capture, text=True)
+    output = (proc.stdout or "") + (proc.stderr or "") if capture else ""
+    return proc.returncode, output, time.monotonic() - start
+
+
+def missing_sources(stages: list) -> list:
+    """Inputs no stage produces and that don't exist on disk."""
+    produced = {out for s in stages for out in s["outputs"]}
+    return [i for s in stages for i in s["inputs"]
+            if i not in produced and not os.path.exists(input_file(i))]
+
+
+def run_pipeline(stages: list, forced: set, selected: set, jobs: int = 1, dry_run: bool = False) -> list:
+    """Run the selected stages in dependency order. Returns one summary row per stage."""
+    deps = dependencies(stages)
+    by_name = {s["name"]: s for s in stages}
+    state = load_state()
+    status = {}  # name → ran / skipped / failed / blocked / would run / not selected
+    fingerprints = {}
+    rows = []
+    running = {}
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        while len(status) < len(stages):
+            for name in [s["name"] for s in stages]:
+                if name in status or name in running.values():
+                    continue
+                if not deps[name] <= set(status):
+                    continue
+                stage = by_name[name]
+                if any(status[d] in ("failed", "blocked") for d in deps[name]):
+                    status[name] = "blocked"
+                    rows.append((name, "blocked", 0.0))
+                    continue
+                if name not in selected:
+                    status[name] = "not selected"
+                    continue
+                fp = fingerprint(stage)
+                upstream_pending = any(status[d] == "would run" for d in deps[name])
+                if name not in forced and not upstream_pending and up_to_date(stage, state, fp):
+                    status[name] = "skipped"
+                    rows.append((name, "skipped", 0.0))
+                    print(f"⏭️  {name}: up to date")
+                    continue
+                if dry_run:
+                    status[name] = "would run"
+                    rows.append((name, "would run", 0.0))
+                    print(f"▶️  {name}: would run {stage['script']}")
+                    continue
+                print(f"\n▶️  {name}: {stage['script']}")
+                future = pool.submit(run_stage, stage, jobs > 1)
+                running[future] = name
+                fingerprints[name] = fp
+
+            if not running:
+                if len(status) < len(stages):
+                    # Nothing runnable left (shouldn't happen with an acyclic graph)
+                    for s in stages:
+                        status.setdefault(s["name"], "blocked")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                stage = by_name[name]
+                code, output, seconds = future.result()
+                if output:
+                    print(f"\n── {name} ──\n{output.rstrip()}")
+                if code == 0:
+                    status[name] = "ran"
+                    state[name] = {"fingerprint": fingerprints[name],
+                                   "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                                   "seconds": round(seconds, 2)}
+                    save_state(state)
+                    print(f"✅ {name} finished in {seconds:.1f}s")
+                else:
+                    status[name] = "failed"
+                    print(f"❌ {name} failed (exit {code}) after {seconds:.1f}s")
+                rows.append((name, status[name], seconds))
+
+    return rows
+
+
+def print_summary(rows: list, total: float):
+    print("\n⏱️  Timing summary")
+    for name, outcome, seconds in rows:
+        timing = f"{seconds:7.1f}s" if outcome in ("ran", "failed") else "       -"
+        print(f"   {name:<15} {outcome:<10} {timing}")
+    print(f"   {'total':<15} {'':<10} {total:7.1f}s")
+
+
+def parse_args(stage_names: list):
+    parser = argparse.ArgumentParser(description="Run the data pipeline, skipping up-to-date stages")
+    parser.add_argument("--from", dest="from_stage", choices=stage_names,
+                        help="Re-run this stage and everything downstream of it")
+    parser.add_argument("--only", action="append", choices=stage_names, default=[],
+                        help="Run only this stage, even if up to date (repeatable)")
+    parser.add_argument("--force", action="store_true", help="Ignore fingerprints and run everything")
+    parser.add_argument("--jobs", type=int, default=1, help="Run up to N independent stages at once")
+    parser.add_argument("--local-clean", action="store_true",
+                        help="Clean with the rule-based 02-clean-data-local.py instead of the LLM")
+    parser.add_argument("--hybrid-clean", action="store_true",
+                        help="Clean with the rules, asking Claude only about entries they are unsure of")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run, then exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args([s["name"] for s in STAGES])
+    # Stage paths and the scripts' own data paths are relative to this directory
+    os.chdir(SCRIPT_DIR)
+    stages = [dict(s) for s in STAGES]
+    if args.local_clean or args.hybrid_clean:
+        stages[0]["script"] = "02-clean-data-local.py"
+        stages[0]["inputs"] = stages[0]["inputs"] + ["data/geo/cities-seed.txt"]
+    if args.hybrid_clean:
+        # The LLM half lives in 02-clean-data.py, loaded by path rather than imported
+        stages[0]["args"] = ["--hybrid"]
+        stages[0]["code"] = ["02-clean-data.py"]
+    names = {s["name"] for s in stages}
+
+    if args.only:
+        selected = forced = set(args.only)
+    elif args.from_stage:
+        selected = forced = downstream(stages, {args.from_stage})
+    else:
+        selected = names
+        forced = names if args.force else set()
+
+    print("🏐 Running Roundnet Data Pipeline")
+    print(f"   Format: {PIPELINE_FORMAT}, {args.jobs} job(s)")
+
+    missing = missing_sources([s for s in stages if s["name"] in selected])
+    if missing:
+        for path in missing:
+            print(f"❌ No input found at {path}")
+        if any(path.startswith("data/raw/") for path in missing):
+            print("Please run Outscraper first.")
+        else:
+            print("Run the earlier stages first (drop --only/--from).")
+        sys.exit(1)
+
+    start = time.monotonic()
+    rows = run_pipeline(stages, forced, selected, args.jobs, args.dry_run)
+    print_summary(rows, time.monotonic() - start)
+
+    if any(outcome in ("failed", "blocked") for _, outcome, _ in rows):
+        sys.exit(1)
+    if not args.dry_run:
+        print("\n✅ Pipeline complete!")
+        print("\nNext: Update lib/data/provider.ts to use the new data")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Per-request metrics for the Outscraper scraper.
+
+Every HTTP request made by 01-outscraper-scrape.py is observed here
+(endpoint, region, HTTP status, latency, response size), along with
+retries, searches replayed from the checkpoint/cache, and each search's
+yield split into new, known and duplicate places. At the end of a run
+the metrics are written as:
+
+- a JSON run report (outscraper-metrics.json)
+- Prometheus text exposition (outscraper-metrics.prom), suitable for the
+  node_exporter textfile collector
+- one summary line appended to outscraper-metrics-history.jsonl, so runs
+  can be compared over time
+"""
+
+import json
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Iterable, Optional
+
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def _percentile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(q * len(values)))], 3)
+
+
+def _bucket_counts(values: list, buckets: tuple) -> dict:
+    """Cumulative counts per upper bound, Prometheus style."""
+    counts = {str(b): sum(1 for v in values if v <= b) for b in buckets}
+    counts["+Inf"] = len(values)
+    return counts
+
+
+def _labels(**labels) -> str:
+    def escape(value) -> str:
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class ScrapeMetrics:
+    """Thread-safe collector for one scraper run."""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.requests = []  # one dict per HTTP request
+        self.retries = Counter()
+        self.replayed = {}  # search label -> "checkpoint" / "cache"
+        self.searches = []
+        self._lock = threading.Lock()
+
+    def observe_request(self, endpoint: str, label: str, region: str, status,
+                        started: float, seconds: float, nbytes: int):
+        """Record one HTTP request. `status` is the HTTP code, "timeout" or "error"."""
+        with self._lock:
+            self.requests.append({
+                "endpoint": endpoint, "search": label, "region": region, "status": str(status),
+                "started": started, "seconds": seconds, "bytes": nbytes,
+            })
+
+    def observe_retry(self, endpoint: str, label: str):
+        with self._lock:
+            self.retries[(endpoint, label)] += 1
+
+    def observe_replay(self, label: str, source: str):
+        with self._lock:
+            self.replayed[label] = source
+
+    def observe_searches(self, rows: Iterable[tuple], known: set):
+        """Record each search's yield.
+
+        `rows` holds (label, region, place_ids) per search in run order,
+        with place_ids None for a failed search. A place is a duplicate if
+        an earlier search in this run already returned it, new if no
+        previous run had seen it either, and known otherwise.
+        """
+        seen = set()
+        for label, region, place_ids in rows:
+            row = {"search": label, "region": region,
+                   "source": self.replayed.get(label, "api" if place_ids is not None else "failed"),
+                   "results": 0, "new": 0, "known": 0, "duplicate": 0}
+            for pid in place_ids or []:
+                if pid in seen:
+                    row["duplicate"] += 1
+                elif pid in known:
+                    row["known"] += 1
+                else:
+                    row["new"] += 1
+                seen.add(pid)
+                row["results"] += 1
+            self.searches.append(row)
+
+    # ── Reports ──
+
+    def report(self, **info) -> dict:
+        """The JSON run report. `info` (mode, rps limit, ...) is included as-is."""
+        finished_at = time.time()
+        reqs = self.requests
+        latencies = [r["seconds"] for r in reqs]
+        window = (max(r["started"] + r["seconds"] for r in reqs) - min(r["started"] for r in reqs)
+                  if reqs else 0)
+
+        per_search = defaultdict(lambda: {"requests": 0, "seconds": 0.0, "bytes": 0, "status": Counter()})
+        per_region = defaultdict(lambda: {"requests": 0, "errors": 0, "bytes": 0, "latencies": [],
+                                          "results": 0, "new": 0, "duplicate": 0})
+        for r in reqs:
+            agg = per_search[r["search"]]
+            agg["requests"] += 1
+            agg["seconds"] += r["seconds"]
+            agg["bytes"] += r["bytes"]
+            agg["status"][r["status"]] += 1
+            reg = per_region[r["region"]]
+            reg["requests"] += 1
+            reg["errors"] += not r["status"].startswith("2")
+            reg["bytes"] += r["bytes"]
+            reg["latencies"].append(r["seconds"])
+
+        searches = []
+        for row in self.searches:
+            agg = per_search.get(row["search"], {"requests": 0, "seconds": 0.0, "bytes": 0, "status": {}})
+            searches.append({**row,
+                             "requests": agg["requests"],
+                             "retries": sum(n for (_, label), n in self.retries.items() if label == row["search"]),
+                             "latency_s": round(agg["seconds"], 3),
+                             "bytes": agg["bytes"],
+                             "status": dict(agg["status"])})
+            reg = per_region[row["region"]]
+            for k in ("results", "new", "duplicate"):
+                reg[k] += row[k]
+
+        retries = Counter()
+        for (endpoint, _), n in self.retries.items():
+            retries[endpoint] += n
+
+        return {
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "duration_s": round(finished_at - self.started_at, 3),
+            **info,
+            "requests": {
+                "total": len(reqs),
+                "by_endpoint": dict(Counter(r["endpoint"] for r in reqs)),
+                "status": dict(Counter(r["status"] for r in reqs)),
+                "retries": dict(retries),
+                "achieved_rps": round(len(reqs) / window, 3) if window else None,
+                "bytes": sum(r["bytes"] for r in reqs),
+                "latency_s": {
+                    "p50": _percentile(latencies, 0.5),
+                    "p95": _percentile(latencies, 0.95),
+                    "max": round(max(latencies), 3) if latencies else None,
+                    "buckets": _bucket_counts(latencies, LATENCY_BUCKETS),
+                },
+            },
+            "places": {k: sum(row[k] for row in self.searches)
+                       for k in ("results", "new", "known", "duplicate")},
+            "searches_by_source": dict(Counter(row["source"] for row in self.searches)),
+            "regions": {
+                region: {
+                    "requests": reg["requests"],
+                    "errors": reg["errors"],
+                    "bytes": reg["bytes"],
+                    "latency_p50_s": _percentile(reg["latencies"], 0.5),
+                    "latency_p95_s": _percentile(reg["latencies"], 0.95),
+                    "results": reg["results"],
+                    "new": reg["new"],
+                    "duplicate": reg["duplicate"],
+                }
+                for region, reg in sorted(per_region.items())
+            },
+            "searches": searches,
+        }
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition of the run's metrics."""
+        lines = []
+
+        def histogram(name: str, help_text: str, field: str, buckets: tuple):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            groups = defaultdict(list)
+            for r in self.requests:
+                groups[(r["endpoint"], r["region"])].append(r[field])
+            for (endpoint, region), values in sorted(groups.items()):
+                for le, count in _bucket_counts(values, buckets).items():
+                    lines.append(f"{name}_bucket{_labels(endpoint=endpoint, region=region, le=le)} {count}")
+                lines.append(f"{name}_sum{_labels(endpoint=endpoint, region=region)} {sum(values):g}")
+                lines.append(f"{name}_count{_labels(endpoint=endpoint, region=region)} {len(values)}")
+
+        def counter(name: str, help_text: str, counts: Counter, *label_names: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for key, n in sorted(counts.items()):
+                key = key if isinstance(key, tuple) else (key,)
+                lines.append(f"{name}{_labels(**dict(zip(label_names, key)))} {n}")
+
+        histogram("outscraper_request_duration_seconds", "Outscraper HTTP request latency.",
+                  "seconds", LATENCY_BUCKETS)
+        histogram("outscraper_response_bytes", "Outscraper HTTP response body size.",
+                  "bytes", BYTES_BUCKETS)
+        counter("outscraper_requests_total", "Outscraper HTTP requests by status.",
+                Counter((r["endpoint"], r["region"], r["status"]) for r in self.requests),
+                "endpoint", "region", "status")
+        retries = Counter()
+        for (endpoint, _), n in self.retries.items():
+            retries[endpoint] += n
+        counter("outscraper_retries_total", "Retried Outscraper requests.", retries, "endpoint")
+        counter("outscraper_searches_total", "Searches by where their results came from.",
+                Counter(row["source"] for row in self.searches), "source")
+        places = Counter()
+        for row in self.searches:
+            for kind in ("new", "known", "duplicate"):
+                places[(row["region"], kind)] += row[kind]
+        counter("outscraper_places_total", "Places returned, split into new, known and duplicate.",
+                places, "region", "kind")
+
+        lines.append("# HELP outscraper_run_duration_seconds Wall-clock duration of the scraper run.")
+        lines.append("# TYPE outscraper_run_duration_seconds gauge")
+        lines.append(f"outscraper_run_duration_seconds {time.time() - self.started_at:.3f}")
+        lines.append("# HELP outscraper_run_timestamp_seconds When the scraper run started.")
+        lines.append("# TYPE outscraper_run_timestamp_seconds gauge")
+        lines.append(f"outscraper_run_timestamp_seconds {self.started_at:.0f}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, **info) -> dict:
+        """Write the JSON report to `path`, Prometheus text next to it, and log a history line.
+
+        Returns the report.
+        """
+        report = self.report(**info)
+        base = path[:-len(".json")] if path.endswith(".json") else path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        for target, text in ((path, json.dumps(report, indent=2, ensure_ascii=False)),
+                             (f"{base}.prom", self.prometheus())):
+            tmp = f"{target}.tmp"
+            with open(tmp, "w") as f:
+                f.write(text)
+            os.replace(tmp, target)
+
+        requests = report["requests"]
+        summary = {
+            "at": report["started_at"],
+            "duration_s": report["duration_s"],
+            "requests": requests["total"],
+            "errors": sum(n for status, n in requests["status"].items() if not status.startswith("2")),
+            "rate_limited": requests["status"].get("429", 0),
+            "retries": sum(requests["retries"].values()),
+            "bytes": requests["bytes"],
+            "latency_p50_s": requests["latency_s"]["p50"],
+            "latency_p95_s": requests["latency_s"]["p95"],
+            **report["places"],
+        }
+        with open(f"{base}-history.jsonl", "a") as f:
+            f.write(json.dumps(summary) + "\n")
+        return report
+
+
+METRICS = ScrapeMetrics()
@@ -0,0 +1,22 @@
+"""
+Shared fixtures for the scraper tests.
+
+The stages are flat scripts run from scripts/scrapers, so that directory
+goes on sys.path; load_stage() imports a numbered stage file as a module.
+"""
+
+import importlib.util
+import os
+import sys
+
+SCRAPERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SCRAPERS_DIR)
+
+
+def load_stage(filename: str, name: str = None):
+    """Import a stage script (e.g. 02-clean-data.py), whose name isn't a valid module name."""
+    path = os.path.join(SCRAPERS_DIR, filename)
+    spec = importlib.util.spec_from_file_location(name or filename.replace("-", "_")[:-3], path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,103 @@
+"""
+A local stand-in for the Outscraper API.
+
+Serves /maps/search-v3 (sync and async=true) and /requests/<id> on
+127.0.0.1 from a background thread. Each query gets a small, deterministic
+set of places unless `places` says otherwise. Responses queued in
+`failures` are served first, one per request, to script errors and retries.
+"""
+
+import hashlib
+import json
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_places(query: str, count: int = 2) -> list:
+    """Deterministic places for a query, tagged the way Outscraper tags them."""
+    places = []
+    for n in range(count):
+        pid = hashlib.sha1(f"{query}#{n}".encode()).hexdigest()[:16]
+        places.append({
+            "place_id": pid,
+            "name": f"Roundnet Club {pid[:4]}",
+            "full_address": f"Sportweg {n + 1}, {query.rsplit(', ', 1)[-1]}",
+            "latitude": 50.0 + n / 100,
+            "longitude": 8.0 + n / 100,
+            "query": query,
+        })
+    return places
+
+
+class FakeOutscraper:
+    def __init__(self):
+        self.places = {}     # "query, region" -> place list (default: fake_places)
+        self.failures = []   # (status, headers) served before any real response
+        self.requests = []   # (path, query params) of every request received
+        self.jobs = {}       # job id -> "query, region"
+        self.failed = set()  # queries whose async jobs end as "Failed"
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def searches(self) -> list:
+        return [params for path, params in self.requests if path == "/maps/search-v3"]
+
+    def _respond(self, path: str, params: dict) -> tuple:
+        with self._lock:
+            self.requests.append((path, params))
+            if self.failures:
+                return self.failures.pop(0) + (None,)
+            if path == "/maps/search-v3":
+                query = params.get("query", "")
+                if params.get("async") == "true":
+                    job_id = f"job-{len(self.jobs) + 1}"
+                    self.jobs[job_id] = query
+                    return 200, {}, {"id": job_id, "status": "Pending"}
+                return 200, {}, {"id": "sync", "status": "Success",
+                                 "data": [self.places.get(query, fake_places(query))]}
+            if path.startswith("/requests/"):
+                query = self.jobs.get(urllib.parse.unquote(path[len("/requests/"):]))
+                if query is None:
+                    return 404, {}, {"error": "unknown request"}
+                if query in self.failed:
+                    return 200, {}, {"id": path, "status": "Failed"}
+                return 200, {}, {"id": path, "status": "Success",
+                                 "data": [self.places.get(query, fake_places(query))]}
+            return 404, {}, {"error": "not found"}
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urllib.parse.urlsplit(self.path)
+                params = dict(urllib.parse.parse_qsl(parsed.query))
+                status, headers, body = fake._respond(parsed.path, params)
+                payload = json.dumps(body if body is not None else {"error": f"HTTP {status}"}).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import load_stage
+
+pytest.importorskip("anthropic")
+
+
+class StubAsyncClient:
+    """Answers batched cleaning requests with `answer(model, entries)`; records every call."""
+
+    def __init__(self, answer):
+        self.answer = answer
+        self.calls = []
+        self.messages = self
+
+    async def create(self, **params):
+        entries = json.loads(params["messages"][0]["content"])
+        self.calls.append((params["model"], [entry["id"] for entry in entries]))
+        await asyncio.sleep(0)
+        return SimpleNamespace(content=[SimpleNamespace(text=self.answer(params["model"], entries))],
+                               usage=None)
+
+
+def cleaned(entry: dict, **overrides) -> dict:
+    return {"id": entry["id"], "name": entry["name"], "slug": entry["name"].lower().replace(" ", "-"),
+            "city": entry["city"], "confidence": 90, **overrides}
+
+
+def entries(count: int) -> list:
+    return [{"name": f"Roundnet Club {n}", "city": "Berlin", "country_code": "DE"} for n in range(count)]
+
+
+@pytest.fixture
+def stage():
+    return load_stage("02-clean-data.py")
+
+
+def clean(stage, raws, client, **kwargs) -> list:
+    async def collect():
+        return [r async for r in stage.clean_entries_async(raws, client, **kwargs)]
+    return asyncio.run(collect())
+
+
+def test_results_follow_input_order(stage):
+    client = StubAsyncClient(lambda model, batch: json.dumps([cleaned(e) for e in reversed(batch)]))
+    results = clean(stage, entries(7), client, batch_size=3, concurrency=2)
+    assert [r["name"] for r in results] == [f"Roundnet Club {n}" for n in range(7)]
+    assert sorted(len(ids) for _, ids in client.calls) == [1, 3, 3]
+
+
+def test_unparseable_batch_is_split_down_to_single_entries(stage):
+    stage.ROUTER.enabled = False
+    client = StubAsyncClient(lambda model, batch: json.dumps([cleaned(e) for e in batch])
+                             if len(batch) == 1 else "Sorry, here you go: {")
+    results = clean(stage, entries(4), client, batch_size=4)
+    assert [r["name"] for r in results] == [f"Roundnet Club {n}" for n in range(4)]
+    assert sorted(len(ids) for _, ids in client.calls) == [1, 1, 1, 1, 2, 2, 4]
+
+
+def test_only_invalid_answers_are_escalated(stage):
+    def answer(model, batch):
+        if model == stage.ROUTER.large:
+            return json.dumps([cleaned(e) for e in batch])
+        # Entry 0 comes back without a slug; entry 1 is valid but a likely non-club
+        return json.dumps([cleaned(batch[0], slug=None), cleaned(batch[1], confidence=10)])
+
+    client = StubAsyncClient(answer)
+    results = clean(stage, entries(2), client, batch_size=2)
+    assert client.calls == [(stage.ROUTER.small, ["0", "1"]), (stage.ROUTER.large, ["0"])]
+    assert results[0]["slug"] == "roundnet-club-0"
+    assert results[1]["confidence"] == 10
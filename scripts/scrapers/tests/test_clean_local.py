@@ -0,0 +1,68 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from conftest import SCRAPERS_DIR, load_stage
+from pipeline_io import write_records
+
+
+@pytest.fixture(scope="module")
+def stage():
+    return load_stage("02-clean-data-local.py")
+
+
+RAW = {
+    "name": "Roundnet Berlin e.V.", "full_address": "Tempelhofer Feld, 12101 Berlin",
+    "city": "Berlin", "country_code": "DE", "latitude": 52.47, "longitude": 13.40,
+    "site": "https://roundnet-berlin.de", "reviews": 14, "place_id": "ChIJ1",
+}
+
+
+def test_rule_confidence_stays_out_of_records(stage):
+    club = stage.clean_entry(RAW)
+    assert "confidence" not in club
+    assert stage.score_entry(RAW, club) == 100
+    assert not stage.needs_review(RAW, club)
+
+
+def test_llm_confidence_is_not_merged(stage):
+    club = stage.clean_entry({**RAW, "city": None, "latitude": None, "longitude": None})
+    assert stage.needs_review(RAW, club)
+    merged = stage.merge_llm_result(RAW, club, {"city": "Berlin", "country": "Germany", "confidence": 85})
+    assert merged["city"] == "Berlin"
+    assert "confidence" not in merged
+    assert stage.merge_llm_result(RAW, club, {"city": "Berlin", "confidence": 20}) is None
+
+
+def raw_entries(count: int) -> list:
+    cities = [("Berlin", "DE", 52.52, 13.40), ("Paris", "FR", 48.86, 2.35), ("", "BE", 50.67, 4.61),
+              ("Milano", "IT", 45.46, 9.19), ("", "", 52.37, 4.90)]
+    raws = []
+    for n in range(count):
+        city, code, lat, lon = cities[n % len(cities)]
+        raws.append({
+            "name": f"{'Roundnet' if n % 3 else 'Spikeball'} Club {n // 4}",  # some names repeat
+            "full_address": f"Sportpark {n}, {city or 'Somewhere'}",
+            "city": city or None, "country_code": code or None,
+            "latitude": lat + n / 1000, "longitude": lon, "place_id": f"place-{n}",
+            "site": f"https://club{n}.example" if n % 2 else None, "reviews": n,
+        })
+    raws.append({"name": "Germany", "country_code": "DE"})
+    return raws
+
+
+def test_workers_output_matches_serial(tmp_path):
+    raw_path = tmp_path / "raw.json"
+    write_records(str(raw_path), raw_entries(40))
+    outputs = []
+    for workers in ("1", "3"):
+        out = tmp_path / f"clean-{workers}.json"
+        subprocess.run([sys.executable, os.path.join(SCRAPERS_DIR, "02-clean-data-local.py"),
+                        "-i", str(raw_path), "-o", str(out), "--workers", workers, "--chunk-size", "4"],
+                       cwd=SCRAPERS_DIR, check=True, capture_output=True)
+        outputs.append(out.read_bytes())
+    assert outputs[0] == outputs[1]
+    assert len(json.loads(outputs[0])) > 10
@@ -0,0 +1,44 @@
+from club_dedupe import MATCH_THRESHOLD, dedupe_clubs, disambiguate_slugs, match_score
+
+
+def club(name, slug, city=None, lat=None, lon=None, **extra):
+    return {"name": name, "slug": slug, "city": city, "citySlug": city.lower() if city else None,
+            "latitude": lat, "longitude": lon, **extra}
+
+
+def test_duplicates_merge_without_provenance_in_the_record():
+    clubs = [club("Roundnet Berlin e.V.", "roundnet-berlin-ev", "Berlin", 52.52, 13.40, phone="+49 30 1234"),
+             club("Roundnet Berlin", "roundnet-berlin", "Berlin", 52.5201, 13.4001, website="https://rb.de")]
+    unique, stats = dedupe_clubs(clubs)
+    assert len(unique) == 1 and stats["merged"] == 1
+    assert unique[0]["website"] == "https://rb.de"
+    assert "mergedFrom" not in unique[0]
+    (merged, sources), = stats["sources"]
+    assert merged is unique[0] and [s["slug"] for s in sources] == ["roundnet-berlin"]
+
+
+def test_numbered_slugs_start_at_two():
+    clubs = [club("Spikeball", "spikeball"), club("Spikeball", "spikeball"), club("Spikeball", "spikeball")]
+    disambiguate_slugs(clubs)
+    assert [c["slug"] for c in clubs] == ["spikeball", "spikeball-2", "spikeball-3"]
+
+
+def test_city_slug_taken_falls_back_to_two():
+    clubs = [club("Roundnet", "roundnet"), club("Roundnet Köln", "roundnet-koln"),
+             club("Roundnet", "roundnet", "Koln")]
+    disambiguate_slugs(clubs)
+    assert [c["slug"] for c in clubs] == ["roundnet", "roundnet-koln", "roundnet-2"]
+
+
+def test_names_of_sport_and_filler_words_stay_apart():
+    clubs = [club("Roundnet Club", "roundnet-club", "Berlin"), club("Roundnet Team", "roundnet-team", "Berlin")]
+    unique, stats = dedupe_clubs(clubs)
+    assert len(unique) == 2 and stats["merged"] == 0
+
+
+def test_same_name_in_different_cities_stays_apart():
+    clubs = [club("Roundnet Dragons", "roundnet-dragons", "Berlin", 52.52, 13.40),
+             club("Roundnet Dragons", "roundnet-dragons", "Potsdam", 52.39, 13.06)]
+    assert match_score(*clubs) < MATCH_THRESHOLD
+    unique, _ = dedupe_clubs(clubs)
+    assert [c["slug"] for c in unique] == ["roundnet-dragons", "roundnet-dragons-potsdam"]
@@ -0,0 +1,26 @@
+from conftest import load_stage
+from keyword_matcher import FEATURE_KEYWORDS, SPORT_KEYWORDS, KeywordMatcher
+
+
+def test_substring_matches_compounds():
+    matcher = KeywordMatcher(FEATURE_KEYWORDS)
+    assert matcher.find("Training im Stadtpark, Turniere in der Sporthalle") >= {
+        "outdoor", "indoor", "tournaments", "coaching"}
+
+
+def test_text_is_folded():
+    assert KeywordMatcher(FEATURE_KEYWORDS).find("ANFANGER willkommen") == {"beginner_friendly"}
+
+
+def test_prefix_mode_needs_a_word_start():
+    matcher = KeywordMatcher(["park"], boundary="prefix")
+    assert matcher.matches("Parkplatz") and not matcher.matches("Skatepark")
+
+
+def test_cleaning_and_verification_share_sport_keywords():
+    clean = load_stage("02-clean-data-local.py")
+    verify = load_stage("03-verify-websites.py")
+    for text in ("Spike-Ball Verein Köln", "Round Net Lyon", "ROUNDNET Milano", "Volleyball Spike Club"):
+        relevant = KeywordMatcher(SPORT_KEYWORDS).matches(text)
+        assert clean.is_relevant({"name": text}) == relevant
+        assert ("relevant" in verify.PAGE_SIGNALS.find(text)) == relevant
@@ -0,0 +1,113 @@
+from types import SimpleNamespace
+
+import pytest
+
+import llm_batches
+from llm_cache import LLMCache
+
+
+class FakeBatchAPI:
+    """Stands in for client.messages.batches: each batch ends after `polls` retrieves.
+
+    `answer(params)` gives a request's reply text, or None to have it error.
+    """
+
+    def __init__(self, answer, polls: int = 2):
+        self.answer = answer
+        self.polls = polls
+        self.created = []
+        self._batches = {}
+        self.messages = SimpleNamespace(batches=self)
+
+    def create(self, requests):
+        batch_id = f"msgbatch_{len(self.created) + 1}"
+        self.created.append(requests)
+        self._batches[batch_id] = {"requests": requests, "polls": 0}
+        return SimpleNamespace(id=batch_id)
+
+    def retrieve(self, batch_id):
+        batch = self._batches[batch_id]
+        batch["polls"] += 1
+        done = batch["polls"] >= self.polls
+        texts = [self.answer(r["params"]) for r in batch["requests"]] if done else []
+        counts = SimpleNamespace(processing=0 if done else len(batch["requests"]),
+                                 succeeded=sum(t is not None for t in texts),
+                                 errored=sum(t is None for t in texts), expired=0, canceled=0)
+        return SimpleNamespace(processing_status="ended" if done else "in_progress", request_counts=counts)
+
+    def results(self, batch_id):
+        for request in self._batches[batch_id]["requests"]:
+            text = self.answer(request["params"])
+            if text is None:
+                result = SimpleNamespace(type="errored")
+            else:
+                # One character per token: longer answers are cut off
+                stop = "max_tokens" if len(text) > request["params"]["max_tokens"] else "end_turn"
+                message = SimpleNamespace(content=[SimpleNamespace(text=text)], usage=None,
+                                          model=request["params"]["model"], stop_reason=stop)
+                result = SimpleNamespace(type="succeeded", message=message)
+            yield SimpleNamespace(custom_id=request["custom_id"], result=result)
+
+
+@pytest.fixture(autouse=True)
+def batch_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_batches, "BATCH_DIR", str(tmp_path / "batches"))
+
+
+def requests(*names):
+    return [llm_batches.batch_request(f"club-{i}", model="m", max_tokens=20,
+                                      messages=[{"role": "user", "content": name}])
+            for i, name in enumerate(names)]
+
+
+def echo(params):
+    content = params["messages"][0]["content"]
+    return None if content == "broken" else f'{{"name": "{content}"}}'
+
+
+def test_results_are_matched_by_custom_id():
+    client = FakeBatchAPI(echo)
+    results = llm_batches.run_batch(client, "enrich", requests("a", "broken", "c"), poll_seconds=0)
+    assert results == {"club-0": '{"name": "a"}', "club-1": None, "club-2": '{"name": "c"}'}
+
+
+def test_rerun_resumes_the_submitted_batch():
+    client = FakeBatchAPI(echo, polls=3)
+    batch = requests("a", "b")
+
+    def crash(batch_id):
+        raise KeyboardInterrupt
+
+    client.retrieve = crash  # interrupted while polling, after submitting
+    with pytest.raises(KeyboardInterrupt):
+        llm_batches.run_batch(client, "enrich", batch, poll_seconds=0)
+
+    del client.retrieve
+    results = llm_batches.run_batch(client, "enrich", batch, poll_seconds=0)
+    assert len(client.created) == 1
+    assert results["club-1"] == '{"name": "b"}'
+
+    # Different requests are a new batch, not a resume
+    llm_batches.run_batch(client, "enrich", requests("x"), poll_seconds=0)
+    assert len(client.created) == 2
+
+
+def test_cached_answers_are_not_submitted(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite"))
+    client = FakeBatchAPI(echo)
+    first = requests("a", "b")
+    llm_batches.run_batch(client, "enrich", first[:1], poll_seconds=0, cache=cache)
+
+    results = llm_batches.run_batch(client, "enrich", first, poll_seconds=0, cache=cache)
+    assert [r["custom_id"] for r in client.created[-1]] == ["club-1"]
+    assert results == {"club-0": '{"name": "a"}', "club-1": '{"name": "b"}'}
+
+
+def test_truncated_answers_are_not_cached(tmp_path):
+    cache = LLMCache(str(tmp_path / "llm.sqlite"))
+    client = FakeBatchAPI(echo)
+    batch = requests("a", "a much longer answer")
+    results = llm_batches.run_batch(client, "enrich", batch, poll_seconds=0, cache=cache)
+    assert results["club-1"] == '{"name": "a much longer answer"}'  # still returned to the stage
+    assert cache.get(batch[0]["params"]) is not None
+    assert cache.get(batch[1]["params"]) is None
@@ -0,0 +1,60 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+anthropic = pytest.importorskip("anthropic")
+httpx = pytest.importorskip("httpx")
+
+import llm_scheduler
+from llm_scheduler import LLMScheduler, ScheduledClient
+
+
+class FlakyClient:
+    """Raises each error in `errors` once, then answers."""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.messages = SimpleNamespace(with_raw_response=self)
+
+    def _answer(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        message = SimpleNamespace(content=[SimpleNamespace(text="{}")], usage=None)
+        return SimpleNamespace(parse=lambda: message, headers={})
+
+    def create(self, **params):
+        return self._answer()
+
+
+class AsyncFlakyClient(FlakyClient):
+    async def create(self, **params):
+        return self._answer()
+
+
+def network_errors():
+    request = httpx.Request("POST", "https://api.anthropic.com/v1/messages")
+    return [anthropic.APIConnectionError(request=request), anthropic.APITimeoutError(request=request)]
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(llm_scheduler, "_retry_after", lambda error, attempt: 0.0)
+
+
+def test_network_errors_are_retried():
+    scheduler = LLMScheduler("test", max_concurrency=4)
+    client = FlakyClient(network_errors())
+    ScheduledClient(client, scheduler).messages.create(model="m", messages=[])
+    assert client.calls == 3
+    assert (scheduler.retries, scheduler.throttled) == (2, 0)
+
+
+def test_network_errors_leave_concurrency_alone():
+    scheduler = LLMScheduler("test", max_concurrency=4)
+    client = AsyncFlakyClient(network_errors())
+    asyncio.run(ScheduledClient(client, scheduler, is_async=True).messages.create(model="m", messages=[]))
+    assert client.calls == 3
+    assert scheduler.concurrency == 4
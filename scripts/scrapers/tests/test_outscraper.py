@@ -0,0 +1,153 @@
+import os
+
+import pytest
+
+from conftest import load_stage
+from fake_outscraper import FakeOutscraper, fake_places
+
+DATA_FILES = ("OUTPUT_FILE", "JOBS_FILE", "STATE_FILE", "DELTA_FILE", "CHECKPOINT_FILE",
+              "FAILURES_FILE", "METRICS_FILE")
+
+
+@pytest.fixture
+def server():
+    fake = FakeOutscraper().start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture
+def scraper(server, tmp_path, monkeypatch):
+    """Stage 01 pointed at the fake server, with its data files under tmp_path."""
+    module = load_stage("01-outscraper-scrape.py")
+    monkeypatch.setattr(module, "BASE_URL", f"{server.url}/maps/search-v3")
+    monkeypatch.setattr(module, "REQUESTS_URL", f"{server.url}/requests")
+    for name in DATA_FILES:
+        monkeypatch.setattr(module, name, str(tmp_path / os.path.basename(getattr(module, name))))
+    monkeypatch.setattr(module, "CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setattr(module, "BACKOFF_BASE", 0.001)
+    monkeypatch.setattr(module, "POLL_INITIAL", 0.01)
+    monkeypatch.setattr(module, "BREAKER", module.CircuitBreaker())
+    return module
+
+
+class CountingBucket:
+    def __init__(self):
+        self.acquired = 0
+
+    def acquire(self):
+        self.acquired += 1
+
+
+def test_search_returns_places(scraper, server):
+    results = scraper.search_outscraper("roundnet", "Belgium")
+    assert results == fake_places("roundnet, Belgium")
+    assert server.searches()[0]["query"] == "roundnet, Belgium"
+
+
+def test_failed_search_returns_none(scraper, server):
+    server.failures.append((400, {}))
+    assert scraper.search_outscraper("roundnet", "Belgium") is None
+    assert len(server.searches()) == 1  # not transient, so no retry
+
+
+def test_every_retry_takes_a_token(scraper, server):
+    server.failures += [(500, {}), (429, {"Retry-After": "0"})]
+    bucket = CountingBucket()
+    assert scraper.search_outscraper("roundnet", "Belgium", bucket=bucket)
+    assert len(server.searches()) == 3
+    assert bucket.acquired == 3
+
+
+def test_failed_half_open_trial_reopens_breaker(scraper, server):
+    breaker = scraper.CircuitBreaker(threshold=1, cooldown=0.0)
+    scraper.BREAKER = breaker
+    breaker.record_failure()
+
+    server.failures.append((400, {}))
+    assert scraper.search_outscraper("roundnet", "Belgium") is None
+    assert not breaker._trial_in_flight
+    assert breaker._opened_at is not None
+
+    # The next request is let through as a new trial, and closes the breaker
+    assert scraper.search_outscraper("roundnet", "Belgium")
+    assert breaker._opened_at is None
+
+
+def test_open_breaker_fails_fast(scraper, server):
+    scraper.BREAKER = scraper.CircuitBreaker(threshold=1, cooldown=60.0)
+    scraper.BREAKER.record_failure()
+    assert scraper.search_outscraper("roundnet", "Belgium") is None
+    assert server.searches() == []
+
+
+def test_concurrent_searches_keep_input_order(scraper, server):
+    searches = [{"query": "roundnet", "region": region}
+                for region in ("Belgium", "France", "Italy", "Spain", "Poland")]
+    results = scraper.run_searches(searches, rps=1000, max_in_flight=4)
+    assert results == [fake_places(f"roundnet, {s['region']}") for s in searches]
+
+
+def test_async_jobs_submit_then_poll(scraper, server):
+    searches = [{"query": "roundnet", "region": "Belgium"}, {"query": "roundnet", "region": "France"}]
+    results = scraper.run_async_jobs(searches, rps=1000)
+    assert results == [fake_places("roundnet, Belgium"), fake_places("roundnet, France")]
+    assert set(server.jobs) == {"job-1", "job-2"}
+
+
+def test_upsert_ignores_volatile_fields(scraper):
+    place = fake_places("roundnet, Belgium", 1)[0]
+    state = {"searches": {}}
+    retagged = {**place, "query": "spikeball club, Europe", "reviews": 12}
+    moved = {**place, "full_address": "Elsewhere 1, Belgium"}
+
+    _, delta = scraper.upsert_results([place], state, state, [], [[retagged]])
+    assert delta["changed"] == []
+    _, delta = scraper.upsert_results([place], state, state, [], [[moved]])
+    assert delta["changed"] == [moved]
+
+
+def test_async_jobs_resume_without_resubmitting(scraper, server):
+    server.jobs["job-7"] = "roundnet, Belgium"
+    scraper.save_jobs({"roundnet, Belgium": {"id": "job-7", "submitted_at": 0}})
+    results = scraper.run_async_jobs([{"query": "roundnet", "region": "Belgium"}], rps=1000)
+    assert results == [fake_places("roundnet, Belgium")]
+    assert server.searches() == []
+
+
+def test_failed_async_job_is_dropped_for_resubmission(scraper, server):
+    server.failed.add("roundnet, France")
+    searches = [{"query": "roundnet", "region": "Belgium"}, {"query": "roundnet", "region": "France"}]
+    results = scraper.run_async_jobs(searches, rps=1000)
+    assert results == [fake_places("roundnet, Belgium"), None]
+    assert "roundnet, France" not in scraper.load_jobs()
+
+
+@pytest.mark.parametrize("flag", ["--incremental", "--prune", "--async-jobs"])
+def test_tiles_rejects_modes_it_would_ignore(scraper, monkeypatch, flag):
+    monkeypatch.setattr("sys.argv", ["01-outscraper-scrape.py", "--tiles", flag])
+    with pytest.raises(SystemExit) as exit_info:
+        scraper.parse_args()
+    assert exit_info.value.code == 2
+
+
+def test_cache_hits_add_no_planner_history(scraper, server, tmp_path):
+    searches = [{"query": "roundnet", "region": "Belgium"}]
+    state = {"searches": {}}
+    for _ in range(3):
+        cache = scraper.ResponseCache(str(tmp_path / "cache"))
+        results = scraper.run_searches(searches, rps=1000, cache=cache)
+        scraper.update_state(state, searches, results, cache.served)
+
+    entry = state["searches"]["roundnet, Belgium"]
+    assert len(server.searches()) == 1
+    assert [(h["results"], h["new"]) for h in entry["yield"]] == [(2, 2)]
+    assert entry["status"] == "ok"
+
+
+def test_expired_async_job_is_dropped_for_resubmission(scraper, server):
+    scraper.save_jobs({"roundnet, Belgium": {"id": "job-gone", "submitted_at": 0}})
+    results = scraper.run_async_jobs([{"query": "roundnet", "region": "Belgium"}], rps=1000)
+    assert results == [None]
+    assert len(server.requests) == 1  # the 404 isn't polled again
+    assert scraper.load_jobs() == {}
@@ -0,0 +1,71 @@
+import json
+
+import pytest
+
+import pipeline_io
+from conftest import load_stage
+from pipeline_io import RecordWriter, load_records, resolve_input, write_records
+
+RECORDS = [{"name": "Roundnet Zürich", "slug": "roundnet-zurich", "features": ["outdoor"]},
+           {"name": "Spikeball Köln", "latitude": 50.94, "longitude": 6.96}]
+
+
+@pytest.mark.parametrize("fmt", ["json", "jsonl", "jsonl.zst"])
+def test_round_trip(tmp_path, fmt):
+    if fmt == "jsonl.zst":
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / f"clubs.{fmt}")
+    assert write_records(path, RECORDS) == len(RECORDS)
+    assert load_records(path) == RECORDS
+    assert not (tmp_path / f"clubs.{fmt}.tmp").exists()
+
+
+def test_zst_output_is_compressed(tmp_path):
+    zstandard = pytest.importorskip("zstandard")
+    path = tmp_path / "clubs.jsonl.zst"
+    write_records(str(path), RECORDS)
+    with open(path, "rb") as f:
+        text = zstandard.ZstdDecompressor().stream_reader(f).read().decode()
+    assert [json.loads(line) for line in text.splitlines()] == RECORDS
+
+
+def test_json_matches_json_dump(tmp_path):
+    path = tmp_path / "clubs.json"
+    write_records(str(path), RECORDS)
+    assert path.read_text() == json.dumps(RECORDS, indent=2, ensure_ascii=False)
+
+
+def test_failed_write_keeps_previous_output(tmp_path):
+    path = str(tmp_path / "clubs.jsonl")
+    write_records(path, RECORDS)
+    with pytest.raises(RuntimeError):
+        with RecordWriter(path) as writer:
+            writer.write({"name": "half"})
+            raise RuntimeError("stage crashed")
+    assert load_records(path) == RECORDS
+
+
+def test_exact_path_wins_over_other_formats(tmp_path):
+    write_records(str(tmp_path / "a.json"), [{"name": "stale"}])
+    write_records(str(tmp_path / "a.jsonl"), RECORDS)
+    assert resolve_input(str(tmp_path / "a.jsonl")) == str(tmp_path / "a.jsonl")
+    assert load_records(str(tmp_path / "a.jsonl")) == RECORDS
+
+
+def test_missing_path_falls_back_to_existing_format(tmp_path):
+    write_records(str(tmp_path / "a.jsonl"), RECORDS)
+    assert resolve_input(str(tmp_path / "a.json")) == str(tmp_path / "a.jsonl")
+
+
+def test_import_reads_the_configured_format_over_a_stale_json(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline_io, "PIPELINE_FORMAT", "jsonl")
+    monkeypatch.chdir(tmp_path)
+    for name in ("countries", "cities", "clubs"):
+        write_records(f"data/final/{name}.json", [{"slug": "stale"}])
+        write_records(f"data/final/{name}.jsonl", [{"slug": f"fresh-{name}"}])
+
+    stage = load_stage("08-import-to-app.py")
+    monkeypatch.setattr(stage, "OUTPUT_FILE", str(tmp_path / "scraped-data.ts"))
+    stage.main()
+    generated = (tmp_path / "scraped-data.ts").read_text()
+    assert "fresh-clubs" in generated and "stale" not in generated
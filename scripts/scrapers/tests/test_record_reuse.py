@@ -0,0 +1,139 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import load_stage
+from pipeline_io import write_records
+from record_reuse import StageReuse
+
+
+class FakeCrawler:
+    """Stands in for crawl4ai's AsyncWebCrawler; URLs in `down` fail to load."""
+
+    down = set()
+    crawled = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def arun(self, url, timeout=None):
+        FakeCrawler.crawled.append(url)
+        if url in self.down:
+            return SimpleNamespace(success=False, error_message="net::ERR_NAME_NOT_RESOLVED")
+        return SimpleNamespace(success=True, markdown="Roundnet training every Monday",
+                               metadata={"title": "Club"}, error_message=None)
+
+
+def verify(stage, clubs, previous_path):
+    reuse = StageReuse("verify", stage.VERIFY_INPUTS, stage.VERIFY_OUTPUTS, previous_path, stage.VERIFY_VERSION)
+    return asyncio.run(stage.verify_all_websites(clubs, reuse=reuse, use_probe=False)), reuse
+
+
+def test_failed_verification_is_recomputed(tmp_path, monkeypatch):
+    stage = load_stage("03-verify-websites.py")
+    monkeypatch.setattr(stage, "HAS_CRAWL4AI", True)
+    monkeypatch.setattr(stage, "AsyncWebCrawler", FakeCrawler, raising=False)
+    monkeypatch.setattr(FakeCrawler, "down", {"https://down.example"})
+    monkeypatch.setattr(FakeCrawler, "crawled", [])
+    clubs = [{"slug": "up", "website": "https://up.example"},
+             {"slug": "down", "website": "https://down.example"}]
+    previous = str(tmp_path / "clubs-verified.json")
+
+    verified, reuse = verify(stage, [dict(c) for c in clubs], previous)
+    assert "verify" in verified[0]["fingerprints"]
+    assert "fingerprints" not in verified[1]
+    write_records(previous, verified)
+
+    FakeCrawler.down = set()
+    FakeCrawler.crawled = []
+    verified, reuse = verify(stage, [dict(c) for c in clubs], previous)
+    assert FakeCrawler.crawled == ["https://down.example"]
+    assert (reuse.reused, reuse.recomputed) == (1, 1)
+    assert verified[1]["website_verified"]
+
+
+def test_view_limits_fingerprint_to_what_is_read():
+    reuse = StageReuse("images", ("photos",), ("verified_images",),
+                       view=lambda club: {"photos": club["photos"][:2]})
+    photos = ["a.jpg", "b.jpg", "c.jpg"]
+    assert (reuse.fingerprint({"photos": photos})
+            == reuse.fingerprint({"photos": photos[:2] + ["d.jpg"]}))
+    assert reuse.fingerprint({"photos": photos}) != reuse.fingerprint({"photos": ["b.jpg", "a.jpg"]})
+
+
+class FakeProbe:
+    """Stands in for WebsiteProbe: settles URLs in `settles`, passes the rest on."""
+
+    settles = {}
+
+    def __init__(self, concurrency, timeout=5.0):
+        self.settled = self.passed_on = 0
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def check(self, url, limits=None):
+        return {"status": "active", "is_relevant": True, "checked_by": "probe"} if url in self.settles else None
+
+
+def test_probe_runs_without_crawl4ai(tmp_path, monkeypatch, capsys):
+    stage = load_stage("03-verify-websites.py")
+    monkeypatch.setattr(stage, "HAS_CRAWL4AI", False)
+    monkeypatch.setattr(stage, "HAS_HTTPX", True)
+    monkeypatch.setattr(stage, "WebsiteProbe", FakeProbe)
+    monkeypatch.setattr(FakeProbe, "settles", {"https://static.example"})
+
+    clubs = [{"name": "A", "website": "https://static.example"},
+             {"name": "B", "website": "https://facebook.com/b"}]
+    reuse = StageReuse("verify", stage.VERIFY_INPUTS, stage.VERIFY_OUTPUTS,
+                       str(tmp_path / "clubs-verified.json"), stage.VERIFY_VERSION)
+    verified = asyncio.run(stage.verify_all_websites(clubs, reuse=reuse))
+    assert verified[0]["website_verified"] and "verify" in verified[0]["fingerprints"]
+    assert "website_verification" not in verified[1] and "fingerprints" not in verified[1]
+    assert "   https://facebook.com/b" in capsys.readouterr().out.splitlines()
+
+
+def test_enriched_input_fields_do_not_break_reuse(tmp_path, monkeypatch):
+    pytest.importorskip("anthropic")
+    stage = load_stage("04-enrich-data.py")
+    calls = []
+
+    def answer(params):
+        calls.append(params)
+        return '{"trainingSchedule": "Mondays 18:00", "memberCount": 20}'
+
+    monkeypatch.setattr(stage, "request_enrichment", answer)
+    club = {"slug": "a", "name": "Roundnet Berlin", "city": "Berlin"}
+    previous = str(tmp_path / "clubs-enriched.json")
+
+    def enrich():
+        reuse = StageReuse("enrich", stage.ENRICH_INPUTS, stage.ENRICHED_FIELDS, previous,
+                           stage.ENRICHMENT_PROMPT)
+        return list(stage.enrich_clubs([dict(club)], reuse)), reuse
+
+    enriched, _ = enrich()
+    assert enriched[0]["memberCount"] == 20
+    write_records(previous, enriched)
+
+    enriched, reuse = enrich()
+    assert len(calls) == 1 and reuse.reused == 1
+    assert enriched[0]["trainingSchedule"] == "Mondays 18:00"
+
+
+def test_malformed_hostname_is_an_error_not_a_crash(tmp_path):
+    pytest.importorskip("httpx")
+    stage = load_stage("03-verify-websites.py")
+    clubs = [{"name": "A", "website": "https://www..club.de"},
+             {"name": "B", "website": f"https://{'x' * 64}.club.de"}]
+    reuse = StageReuse("verify", stage.VERIFY_INPUTS, stage.VERIFY_OUTPUTS,
+                       str(tmp_path / "clubs-verified.json"), stage.VERIFY_VERSION)
+    verified = asyncio.run(stage.verify_all_websites(clubs, reuse=reuse))
+    assert [club["website_verification"]["status"] for club in verified] == ["error", "error"]
+    assert not any("fingerprints" in club for club in verified)
@@ -0,0 +1,42 @@
+import pytest
+
+import reverse_geocoder
+from conftest import load_stage
+
+
+@pytest.fixture
+def geocoder(tmp_path, monkeypatch):
+    monkeypatch.setattr(reverse_geocoder, "CACHE_DIR", str(tmp_path))
+    return reverse_geocoder.ReverseGeocoder(reverse_geocoder.SEED_FILE)
+
+
+def test_town_far_from_any_seed_city_is_unresolved(geocoder):
+    # Louvain-la-Neuve is ~25 km from Brussels, the nearest seed city
+    assert geocoder.lookup(50.668, 4.612) is None
+
+
+def test_point_inside_a_city_resolves(geocoder):
+    place = geocoder.lookup(52.50, 13.30)
+    assert (place["city"], place["country_code"]) == ("Berlin", "DE")
+
+
+def test_lookup_many_matches_lookup(geocoder):
+    points = [(52.50, 13.30), (50.668, 4.612), (48.86, 2.35)]
+    assert geocoder.lookup_many(points) == [geocoder.lookup(lat, lon) for lat, lon in points]
+
+
+def test_cleaning_geocodes_a_chunk_in_one_lookup(monkeypatch):
+    stage = load_stage("02-clean-data-local.py")
+    calls = []
+
+    class CountingGeocoder:
+        def lookup_many(self, points):
+            calls.append(list(points))
+            return [{"city": "Berlin", "country_code": "DE", "distance_km": 1.0} for _ in calls[-1]]
+
+    monkeypatch.setattr(stage, "get_geocoder", CountingGeocoder)
+    raws = [{"name": f"Roundnet Club {n}", "latitude": 52.5, "longitude": 13.4} for n in range(3)]
+    raws.append({"name": "Spikeball Verein", "city": "Köln", "country_code": "DE"})
+    clubs = stage.clean_chunk(raws)
+    assert len(calls) == 1 and len(calls[0]) == 3
+    assert [club["city"] for club in clubs] == ["Berlin", "Berlin", "Berlin", "Köln"]
@@ -0,0 +1,24 @@
+import run_pipeline
+
+
+def test_fingerprint_covers_code_loaded_by_path(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "02-clean-data-local.py").write_text("import helper\n")
+    (tmp_path / "helper.py").write_text("")
+    (tmp_path / "02-clean-data.py").write_text("from llm_thing import x\n")
+    (tmp_path / "llm_thing.py").write_text("x = 1\n")
+    stage = {"name": "clean", "script": "02-clean-data-local.py", "inputs": [],
+             "outputs": [], "code": ["02-clean-data.py"]}
+
+    before = run_pipeline.fingerprint(stage)
+    (tmp_path / "llm_thing.py").write_text("x = 2\n")
+    assert run_pipeline.fingerprint(stage) != before
+
+
+def test_model_choice_invalidates_llm_stages_only(monkeypatch):
+    monkeypatch.chdir(run_pipeline.SCRIPT_DIR)
+    stages = {stage["name"]: stage for stage in run_pipeline.STAGES}
+    before = {name: run_pipeline.fingerprint(stage) for name, stage in stages.items()}
+    monkeypatch.setenv("LLM_SMALL_MODEL", "claude-other")
+    changed = {name for name, stage in stages.items() if run_pipeline.fingerprint(stage) != before[name]}
+    assert changed == {"clean", "enrich"}